@@ -0,0 +1,90 @@
+import argparse
+import time
+import numpy as np
+from collections.abc import Mapping
+
+from combat_simulator import Grid
+from combat_simulator.astar import astar
+from combat_simulator.hpa import _local_path
+from combat_simulator.jps import JumpPointSearch
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--grid_shape", nargs=2, type=int, default=[100, 100],
+                        help="Shape of the benchmark maps.")
+    parser.add_argument("--clutter", nargs='+', type=float,
+                        default=[0.0, 0.1, 0.3],
+                        help="Fraction of cells blocked in each map.")
+    parser.add_argument("--num_paths", type=int, default=50,
+                        help="Number of random paths per map.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Random seed.")
+    return parser.parse_args()
+
+
+class CountingAdjacency(Mapping):
+    """
+    Counts how many nodes a pathfinder expands,
+    i.e. how often it looks up their neighbors.
+    """
+
+    def __init__(self, adj):
+        self.adj = adj
+        self.expanded = 0
+
+    def __getitem__(self, pos):
+        self.expanded += 1
+        return self.adj[pos]
+
+    def __iter__(self):
+        return iter(self.adj)
+
+    def __len__(self):
+        return len(self.adj)
+
+
+def make_grid(shape, clutter):
+    grid = Grid(tuple(shape))
+    grid._grid[np.random.rand(*shape) < clutter] = 1
+    return grid
+
+
+def benchmark(grid, num_paths):
+    free = np.argwhere(grid._grid == 0)
+    bounds = (0, 0) + grid.shape
+    stats = {name: {"expanded": 0, "length": 0, "time": 0.0}
+             for name in ["astar", "A* (optimal)", "jps"]}
+    for _ in range(num_paths):
+        (i, j) = np.random.choice(len(free), size=2, replace=False)
+        (start, end) = (tuple(free[i].tolist()), tuple(free[j].tolist()))
+        grid._grid[end] = 1
+        for name in stats:
+            adj = CountingAdjacency(grid.to_adjacency())
+            t0 = time.time()
+            if name == "astar":
+                path = astar(start, end, adj)
+                expanded = adj.expanded
+            elif name == "A* (optimal)":
+                path = _local_path(start, end, adj, bounds, adjacent=True)
+                expanded = adj.expanded
+            else:
+                search = JumpPointSearch(grid, end)
+                path = search.search(start)
+                expanded = search.expanded
+            stats[name]["time"] += time.time() - t0
+            stats[name]["expanded"] += expanded
+            stats[name]["length"] += len(path or [start]) - 1
+        grid._grid[end] = 0
+    return stats
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    np.random.seed(args.seed)
+    print("map\tpathfinder\tmean expanded\tmean length\tmean ms")
+    for clutter in args.clutter:
+        grid = make_grid(args.grid_shape, clutter)
+        stats = benchmark(grid, args.num_paths)
+        for (name, s) in stats.items():
+            print(f"{clutter:.0%} blocked\t{name}\t{s['expanded'] / args.num_paths:.1f}\t{s['length'] / args.num_paths:.1f}\t{1000 * s['time'] / args.num_paths:.2f}")  # noqa
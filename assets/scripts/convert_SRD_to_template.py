@@ -49,8 +49,36 @@ def parse_speed(monster_data):
     return int(speeds[0])
 
 
-# TODO: Implement this.
+NUMBERS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+           "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+
+
 def parse_multiattack(monster_data):
+    """
+    The number of attacks a monster makes per turn, from the
+    description of its Multiattack action. E.g. "The dragon ...
+    makes three attacks: one with its bite and two with its claws." -> 3
+    Monsters without Multiattack make one attack. Where the number
+    depends on the monster's state, e.g. the hydra's heads, this
+    returns 1; where it is rolled, its average, rounded down.
+    """
+    for action in monster_data.get("actions", []):
+        if not action["name"].startswith("Multiattack"):
+            continue
+        match = re.search(r"\bmakes? (?:either )?(\w+) (?:[\w-]+ )*?attacks?\b",  # noqa
+                          action["desc"], flags=re.IGNORECASE)
+        if match is None:
+            return 1
+        num = match.group(1).lower()
+        if num in NUMBERS:
+            return NUMBERS[num]
+        if num.isdigit():
+            return int(num)
+        dice = re.fullmatch(r"([0-9]+)d([0-9]+)", num)
+        if dice is not None:
+            (n, d) = (int(dice.group(1)), int(dice.group(2)))
+            return n * (d + 1) // 2
+        return 1
     return 1
 
 
@@ -0,0 +1,18 @@
+import argparse
+
+from combat_simulator.mapfile import convert_npy
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--infile", type=str, required=True,
+                        help="""Map to convert, either a .npy map or a
+                                map in the binary map format.""")
+    parser.add_argument("--outfile", type=str, required=True,
+                        help="Where to save the converted map.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    convert_npy(args.infile, args.outfile)
@@ -0,0 +1,102 @@
+import argparse
+import os
+import json
+import numpy as np
+from fractions import Fraction
+
+from combat_simulator import Engine
+from combat_simulator.balance import Balancer
+from combat_simulator.scenario import (load_character_sheets, load_monsters,
+                                       load_grid, build_teams)
+from combat_simulator.sweep import expand_sweep
+from combat_simulator.logger import log
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario_file", type=str, required=True,
+                        help="""Path to JSON file specifying
+                                the scenario to balance.""")
+    parser.add_argument("--member", type=str, required=True,
+                        help="""The team member whose count to search over,
+                                e.g. 'team2:monster.Zombie'.""")
+    parser.add_argument("--team", type=str, default="team1",
+                        choices=["team1", "team2"],
+                        help="""The team whose win rate to balance.""")
+    parser.add_argument("--target", type=float, default=0.5,
+                        help="""The target win rate.""")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="""Stop once the win rate is known to within
+                                this much.""")
+    parser.add_argument("--range", nargs=2, type=int, default=[1, 50],
+                        help="""Smallest and largest count to consider.""")
+    parser.add_argument("--batch_size", type=int, default=20,
+                        help="""Encounters per batch.""")
+    parser.add_argument("--max_encounters", type=int, default=2000,
+                        help="""Maximum number of encounters per count.""")
+    parser.add_argument("--grid_shape", nargs=2, type=int, default=[20, 20],
+                        help="""Width and height of the battle grid.""")
+    parser.add_argument("--map", type=str, default=None,
+                        help="""Path to saved map file.""")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="""Random seed.""")
+    return parser.parse_args()
+
+
+def load_challenge_ratings(infile):
+    srd_data = json.load(open(infile))
+    # Challenge ratings are strings such as "1/4".
+    return {m["name"].lower(): float(Fraction(m["challenge_rating"]))
+            for m in srd_data if "name" in m}
+
+
+def run(scenario_file, member, team, target, tolerance, count_range,
+        batch_size, max_encounters, grid_shape, map_file, seed=None):
+    curdir = os.path.dirname(__file__)
+    char_sheets_dir = os.path.join(curdir, "assets/character_sheets")
+    chars_by_name = load_character_sheets(char_sheets_dir)
+    monsters_file = os.path.join(curdir,
+                                 "assets/5e_SRD_monsters_formatted.jsonl")
+    monsters_by_name = load_monsters(monsters_file)
+    scenario_data = json.load(open(scenario_file))
+    team_idx = ["team1", "team2"].index(team)
+    if seed is not None:
+        np.random.seed(seed)
+
+    engines = {}
+
+    def run_batch(count, n):
+        if count not in engines:
+            job = expand_sweep(scenario_data, {member: [count]})[0]
+            teams = build_teams(job["scenario"], chars_by_name,
+                                monsters_by_name)
+            grid = load_grid(map_file, grid_shape)
+            engines[count] = Engine(*teams, grid=grid)
+        engine = engines[count]
+        results = engine.run(num_encounters=n, progress=False)
+        return results.wins[engine.teams[team_idx].name]
+
+    increasing = member.split(':')[0] == team
+    balancer = Balancer(run_batch, target=target, tolerance=tolerance,
+                        increasing=increasing, batch_size=batch_size,
+                        max_encounters=max_encounters)
+    log.debug(f"Balancing {member} in {scenario_file}")
+    (count, p, (low, high)) = balancer.search(*count_range)
+
+    for c in sorted(balancer.evaluations):
+        (wins, n) = balancer.evaluations[c]
+        print(f"{c}: {wins} / {n} ({wins / n:.2f})")
+    team_name = scenario_data[team]["name"]
+    print(f"{member.split(':')[1]} x {count}: {team_name} wins {p:.2f} (95% CI {low:.2f}-{high:.2f})")  # noqa
+    (source, name) = member.split(':')[1].split('.')
+    if source == "monster":
+        srd_file = os.path.join(curdir, "assets/5e-SRD-Monsters.json")
+        cr = load_challenge_ratings(srd_file)[name.lower()]
+        print(f"CR budget: {count * cr:g}")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.scenario_file, args.member, args.team, args.target,
+        args.tolerance, args.range, args.batch_size, args.max_encounters,
+        args.grid_shape, args.map, seed=args.seed)
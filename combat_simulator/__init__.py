@@ -1,8 +1,11 @@
+__version__ = "0.0.2"
+
 from .engine import Engine
 from .token import Token, Character
 from .player import Player
 from .grid import Grid
 from .encounter import Team, Encounter
+from .results import Results
 
 __all__ = ["Engine", "Token", "Character",
-           "Player", "Grid", "Team", "Encounter"]
+           "Player", "Grid", "Team", "Encounter", "Results"]
@@ -0,0 +1,110 @@
+import numpy as np
+
+from .stats import wilson_interval
+
+
+class Balancer(object):
+    """
+    Finds the member count at which a team wins at a target rate,
+    assuming the win rate changes monotonically with the count.
+    Counts are searched by bisection. At each count, encounters are run
+    in batches only until the confidence interval of the win rate
+    excludes the target or is narrower than the tolerance.
+
+    :param callable run_batch: run_batch(count, n) runs n encounters
+                               with the given member count and returns
+                               the number of wins of the team of interest.
+    :param float target: The target win rate.
+    :param float tolerance: Stop sampling a count once the half width of
+                            its confidence interval is below this.
+    :param bool increasing: Whether the win rate increases with the
+                            count, e.g. when adding to the team of interest.
+    :param int batch_size: Number of encounters per batch.
+    :param int max_encounters: Maximum number of encounters per count.
+    :param float z: Standard normal quantile of the confidence intervals.
+    """
+
+    def __init__(self, run_batch, target=0.5, tolerance=0.05,
+                 increasing=False, batch_size=20, max_encounters=2000,
+                 z=1.96):
+        if not 0 < target < 1:
+            raise ValueError("target must be between 0 and 1.")
+        self.run_batch = run_batch
+        self.target = target
+        self.tolerance = tolerance
+        self.increasing = increasing
+        self.batch_size = batch_size
+        self.max_encounters = max_encounters
+        self.z = z
+        self.evaluations = {}  # count: [wins, encounters]
+
+    def estimate(self, count):
+        """
+        The win rate estimate and confidence interval at count.
+
+        :param int count: The member count.
+        :returns: (win rate, (low, high))
+        :rtype: (float, (float, float))
+        """
+        (wins, n) = self.evaluations[count]
+        (low, high) = wilson_interval(wins, n, z=self.z)
+        return (wins / n, (float(low), float(high)))
+
+    def _evaluate(self, count):
+        """
+        Sample count until its win rate is known to be above or
+        below the target, or known to within the tolerance.
+
+        :returns: 1 if the win rate is above the target, -1 if below,
+                  and 0 if it is indistinguishable from the target.
+        :rtype: int
+        """
+        stats = self.evaluations.setdefault(count, [0, 0])
+        while True:
+            if stats[1] > 0:
+                (p, (low, high)) = self.estimate(count)
+                if low > self.target:
+                    return 1
+                if high < self.target:
+                    return -1
+                if (high - low) / 2 < self.tolerance:
+                    return 0
+                if stats[1] >= self.max_encounters:
+                    return int(np.sign(p - self.target))
+            n = min(self.batch_size, self.max_encounters - stats[1])
+            stats[0] += self.run_batch(count, n)
+            stats[1] += n
+
+    def search(self, low, high):
+        """
+        Find the count in [low, high] whose win rate is closest to the target.
+
+        :param int low: Smallest count to consider.
+        :param int high: Largest count to consider.
+        :returns: The count, its win rate estimate and confidence interval.
+        :rtype: (int, float, (float, float))
+        """
+        if low > high:
+            raise ValueError("low must not be greater than high.")
+        # Bisect for the boundary between counts that are above
+        # and below the target.
+        lo, hi = low, high
+        while lo < hi:
+            mid = (lo + hi) // 2
+            side = self._evaluate(mid)
+            if side == 0:
+                lo = hi = mid
+                break
+            above = side == 1
+            if above != self.increasing:
+                lo = mid + 1
+            else:
+                hi = mid
+        # The boundary lies between lo - 1 and lo.
+        candidates = [c for c in [lo - 1, lo] if low <= c <= high]
+        for count in candidates:
+            self._evaluate(count)
+        best = min(candidates,
+                   key=lambda c: abs(self.estimate(c)[0] - self.target))
+        (p, interval) = self.estimate(best)
+        return (best, p, interval)
@@ -0,0 +1,110 @@
+import os
+import glob
+import json
+import time
+import multiprocessing
+
+from .results import Results
+from .service import init_worker, parse_job, run_chunk
+
+
+def find_scenarios(pattern):
+    """
+    The scenario files in a directory, or matching a glob pattern.
+
+    :param str pattern: A directory or a glob pattern.
+    :returns: The scenario files, sorted.
+    :rtype: list(str)
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.json")
+    scenario_files = sorted(glob.glob(pattern))
+    if scenario_files == []:
+        raise ValueError(f"No scenario files found in '{pattern}'.")
+    return scenario_files
+
+
+def summarize(results):
+    """
+    The outcome of a scenario as a JSON serializable dict.
+
+    :param Results results: The scenario's results.
+    :rtype: dict
+    """
+    attackers = []
+    for ((name, cid), stats) in sorted(results.attackers.items()):
+        dpr = Results._dpr(stats)
+        attackers.append({"attacker_name": name,
+                          "attacker_id": cid,
+                          "team": stats["team"],
+                          "attacks": stats["attacks"],
+                          "hits": stats["hits"],
+                          "dmg": stats["dmg"],
+                          # NaN is not valid JSON.
+                          "dpr": None if dpr != dpr else dpr,
+                          "hit_ratio": stats["hits"] / stats["attacks"]})
+    return {"num_encounters": results.num_encounters,
+            "wins": {name: results.wins[name]
+                     for name in results.team_names},
+            "draws": results.draws,
+            "rounds": results.rounds,
+            "mean_rounds": results.rounds / max(results.num_encounters, 1),
+            "attackers": attackers}
+
+
+def run_scenario_file(scenario_file, options):
+    """
+    Run one scenario of a batch using the worker's catalog.
+
+    :param str scenario_file: The scenario.
+    :param dict options: Run options, as taken by service.parse_job().
+    :returns: The summary of its results, or the error it raised.
+    :rtype: dict
+    """
+    start = time.time()
+    line = {"scenario_file": scenario_file}
+    try:
+        job = parse_job(dict(options, scenario_file=scenario_file))
+        (results, _) = run_chunk(job, job["num_encounters"])
+        line["name"] = job["scenario"].get("name")
+        line.update(summarize(Results.from_dict(results)))
+    except Exception as e:
+        line["error"] = f"{type(e).__name__}: {e}"
+    line["seconds"] = time.time() - start
+    return line
+
+
+def _run_scenario_file_star(args):
+    return run_scenario_file(*args)
+
+
+def run_batch(scenario_files, outF, char_sheets_dir, monsters_file,
+              processes=None, seed=None, **options):
+    """
+    Run scenarios on a pool of worker processes, writing one JSON
+    line per scenario to outF as soon as it is finished.
+
+    :param list scenario_files: The scenarios to run.
+    :param file outF: Where to write the results.
+    :param str char_sheets_dir: Directory of character sheets.
+    :param str monsters_file: Formatted SRD monsters file.
+    :param int processes: Number of workers. Defaults to the CPU count.
+    :param int seed: (Optional) Base random seed.
+                     Scenario i uses seed + i.
+    :param options: Run options for every scenario, e.g. num_encounters,
+                    as taken by service.parse_job().
+    :returns: The number of scenarios that raised an error.
+    :rtype: int
+    """
+    args = [(scenario_file,
+             dict(options, seed=None if seed is None else seed + i))
+            for (i, scenario_file) in enumerate(scenario_files)]
+    num_errors = 0
+    with multiprocessing.Pool(processes, initializer=init_worker,
+                              initargs=(char_sheets_dir,
+                                        monsters_file)) as pool:
+        for line in pool.imap_unordered(_run_scenario_file_star, args):
+            num_errors += "error" in line
+            outF.write(json.dumps(line) + '\n')
+            outF.flush()
+    return num_errors
@@ -0,0 +1,178 @@
+import os
+import json
+import hashlib
+import functools
+import numpy as np
+
+from . import __version__
+from .results import Results
+
+
+@functools.lru_cache(maxsize=None)
+def source_hash():
+    """
+    Hash of the simulator's source files, so that any change to the
+    code invalidates cached results without a version bump.
+
+    :returns: Hex digest.
+    :rtype: str
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    sha = hashlib.sha256()
+    for fname in sorted(os.listdir(package_dir)):
+        if fname.endswith(".py"):
+            sha.update(fname.encode("utf-8"))
+            with open(os.path.join(package_dir, fname), 'rb') as inF:
+                sha.update(inF.read())
+    return sha.hexdigest()
+
+
+def make_key(scenario_data, chars_by_name, monsters_by_name, grid, seed=None,
+             pathfinder="astar", attacker_stats=True, fast_forward=False):
+    """
+    Hash all the inputs that determine the outcome of a scenario run:
+    the scenario, the character and monster data it uses, the grid,
+    the random seed, the pathfinder and the simulator version and
+    source code.
+    The number of encounters is deliberately left out, so that cached
+    runs can be extended.
+
+    :param dict scenario_data: The scenario, as loaded from JSON.
+    :param dict chars_by_name: Output of load_character_sheets.
+    :param dict monsters_by_name: Output of load_monsters.
+    :param Grid grid: The grid, before any characters are added.
+    :param int seed: The random seed.
+    :param str pathfinder: The name of the pathfinder in player.PATHFINDERS.
+    :param bool attacker_stats: False if the results only have
+                                wins and rounds, i.e. log_level "none".
+    :param bool fast_forward: Whether the Engine fast-forwards encounters
+                              locked in melee, which rolls the dice in a
+                              different order.
+    :returns: Hex digest.
+    :rtype: str
+    """
+    sources = {"character": chars_by_name, "monster": monsters_by_name}
+    used = {}
+    for team_id in ["team1", "team2"]:
+        for (char_type, num) in scenario_data[team_id]["members"]:
+            (source, name) = char_type.split('.')
+            used[char_type.lower()] = sources[source][name.lower()]
+    start_positions = {team: sorted(positions) for (team, positions)
+                       in grid._start_positions.items()}
+    grid_key = [str(grid), str(sorted(start_positions.items()))]
+    inputs = {"version": __version__,
+              "source": source_hash(),
+              "scenario": scenario_data,
+              "characters": used,
+              "grid": grid_key,
+              "seed": seed,
+              "pathfinder": pathfinder}
+    if attacker_stats is False:
+        inputs["attacker_stats"] = False
+    if fast_forward is True:
+        inputs["fast_forward"] = True
+    encoded = json.dumps(inputs, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ResultCache(object):
+    """
+    On-disk cache of scenario results, evicting the least recently
+    used entries once the cache grows beyond max_bytes.
+
+    :param str cache_dir: Directory to store entries in.
+    :param int max_bytes: Maximum total size of the cache.
+    """
+
+    def __init__(self, cache_dir, max_bytes=100 * 2**20):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """
+        Look up a cache entry and mark it as recently used.
+
+        :param str key: Output of make_key().
+        :returns: (results, engine_state) or None if key is not cached.
+        :rtype: (Results, dict)
+        """
+        path = self._path(key)
+        try:
+            with open(path) as inF:
+                entry = json.load(inF)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        os.utime(path)
+        return (Results.from_dict(entry["results"]), entry["state"])
+
+    def put(self, key, results, state):
+        """
+        Store results along with the Engine state after producing them.
+
+        :param str key: Output of make_key().
+        :param Results results: The results to store.
+        :param dict state: Output of Engine.get_state().
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as outF:
+            json.dump({"results": results.to_dict(), "state": state}, outF)
+        os.replace(tmp_path, path)
+        self._evict(keep=path)
+
+    def _evict(self, keep=None):
+        entries = []
+        for fname in os.listdir(self.cache_dir):
+            if not fname.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, fname)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for (_, size, _) in entries)
+        for (_, size, path) in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            os.remove(path)
+            total -= size
+
+
+def cached_run(engine, cache, key, num_encounters, seed=None):
+    """
+    Run the engine, reusing cached results where possible.
+    If fewer encounters are cached than requested, the cached run
+    is extended by the difference, giving the same results as running
+    all encounters at once. Unseeded runs are not reproducible, so
+    they neither read nor write the cache.
+
+    :param Engine engine: The engine to run.
+    :param ResultCache cache: The cache.
+    :param str key: Output of make_key() for this engine's inputs.
+    :param int num_encounters: The number of encounters requested.
+    :param int seed: The random seed used for a fresh run.
+    :rtype: Results
+    """
+    if seed is None:
+        return engine.run(num_encounters=num_encounters)
+    entry = cache.get(key)
+    if entry is not None:
+        (results, state) = entry
+        if results.num_encounters == num_encounters:
+            return results
+        if results.num_encounters < num_encounters:
+            engine.set_state(state)
+            remaining = num_encounters - results.num_encounters
+            results = engine.run(num_encounters=remaining, results=results)
+            cache.put(key, results, engine.get_state())
+            return results
+    np.random.seed(seed)
+    results = engine.run(num_encounters=num_encounters)
+    # Keep the larger of the cached and the new run.
+    if entry is None:
+        cache.put(key, results, engine.get_state())
+    return results
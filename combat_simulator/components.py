@@ -0,0 +1,214 @@
+import numpy as np
+from collections import deque
+
+
+# Flood fills after a cell is occupied give up after this fraction
+# of the grid's cells, as labelling the whole grid is then cheaper.
+_MAX_FILL = 1 / 64
+
+# The 8 cells around a cell, in order around it.
+_RING = [(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)]
+
+
+def label_components(occupied):
+    """
+    Label the 4-connected components of the free cells.
+
+    :param numpy.ndarray occupied: Non-zero where cells are occupied.
+    :returns: The label of each cell: the flat index of the first free
+              cell of its component, or its own index if it is occupied.
+    :rtype: numpy.ndarray
+    """
+    free = occupied == 0
+    index = np.arange(occupied.size).reshape(occupied.shape)
+    vertical = free[1:, :] & free[:-1, :]
+    horizontal = free[:, 1:] & free[:, :-1]
+    # The pairs of neighboring free cells.
+    u = np.r_[index[:-1, :][vertical], index[:, :-1][horizontal]]
+    v = np.r_[index[1:, :][vertical], index[:, 1:][horizontal]]
+    labels = index.ravel().copy()
+    # Hook the larger root of each pair that is not yet joined onto the
+    # smaller one, then point every cell at its root, until all pairs
+    # are joined. Walking along long corridors one cell at a time
+    # instead would take as many steps as the corridors are long.
+    while True:
+        (lu, lv) = (labels[u], labels[v])
+        apart = lu != lv
+        if not apart.any():
+            break
+        np.minimum.at(labels, np.maximum(lu, lv)[apart],
+                      np.minimum(lu, lv)[apart])
+        while True:
+            roots = labels[labels]
+            if (roots == labels).all():
+                break
+            labels = roots
+        (u, v) = (u[apart], v[apart])
+    return labels
+
+
+class Components(object):
+    """
+    The connected components of the free cells of a grid, kept in a
+    union-find structure. Freeing a cell joins the components around
+    it. Occupying a cell can split its component, which union-find
+    cannot undo, so unless the cells around it stay connected, the
+    parts it may have split into are flood filled from its neighbors
+    at once. The fill stops once at most one part is still growing,
+    and only the parts that were filled all the way get new labels,
+    so a split costs in proportion to the smaller parts. Fills that
+    grow past a fraction of the grid without finishing, as when the
+    neighbors are only joined far away, give up, and the components
+    are labelled again the next time they are looked up.
+
+    :param numpy.ndarray occupied: The grid's occupancy.
+    """
+
+    def __init__(self, occupied):
+        self.occupied = occupied
+        self.version = 0
+        self._relabel()
+
+    def _relabel(self):
+        # Each free cell is a node. Nodes are never reused, as other
+        # nodes may still point to them, so a cell that is freed again
+        # gets a new node.
+        self._parent = label_components(self.occupied).tolist()
+        self._node = list(range(self.occupied.size))
+        self._dirty = False
+        self.version += 1
+
+    def _find(self, node):
+        parent = self._parent
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def _neighbors(self, pos):
+        (ny, nx) = self.occupied.shape
+        (y, x) = pos
+        for (dy, dx) in _RING[::2]:
+            if 0 <= y + dy < ny and 0 <= x + dx < nx:
+                yield (y + dy, x + dx)
+
+    def _free(self, pos):
+        (ny, nx) = self.occupied.shape
+        return (0 <= pos[0] < ny and 0 <= pos[1] < nx and
+                self.occupied[pos] == 0)
+
+    def _flat(self, pos):
+        return pos[0] * self.occupied.shape[1] + pos[1]
+
+    def freed(self, pos):
+        """
+        Join the components around a cell that was just freed.
+        """
+        if self._dirty:
+            return
+        node = len(self._parent)
+        self._parent.append(node)
+        self._node[self._flat(pos)] = node
+        for n in self._neighbors(pos):
+            if self.occupied[n] == 0:
+                root = self._find(self._node[self._flat(n)])
+                self._parent[root] = self._find(node)
+        # Compact the nodes that are no longer used now and then.
+        if len(self._parent) > 2 * self.occupied.size:
+            self._dirty = True
+
+    def occupied_cell(self, pos):
+        """
+        Note that a cell was just occupied, which may split its component.
+        """
+        if self._dirty:
+            return
+        (y, x) = pos
+        ring = [self._free((y + dy, x + dx)) for (dy, dx) in _RING]
+        # The free neighbors stay connected if they are all part of one
+        # run of free cells around the occupied one.
+        runs = 0
+        for i in range(0, 8, 2):
+            if ring[i] and not (ring[i - 1] and ring[i - 2]):
+                runs += 1
+        if runs > 1:
+            self._split(pos)
+
+    def _split(self, pos):
+        starts = [n for n in self._neighbors(pos) if self.occupied[n] == 0]
+        # One fill per free neighbor. Fills that meet are joined.
+        joined = list(range(len(starts)))
+        owner = {n: i for (i, n) in enumerate(starts)}  # cell: fill
+        cells = [[n] for n in starts]
+        frontiers = [deque([n]) for n in starts]
+        growing = list(range(len(starts)))
+        finished = []
+        budget = max(int(_MAX_FILL * self.occupied.size), 64)
+
+        def root(i):
+            while joined[i] != i:
+                i = joined[i]
+            return i
+
+        while len(growing) > 1:
+            budget -= len(growing)
+            if budget < 0:
+                self._dirty = True
+                return
+            for i in list(growing):
+                if joined[i] != i:
+                    continue
+                if len(frontiers[i]) == 0:
+                    growing.remove(i)
+                    finished.append(i)
+                    continue
+                for n in self._neighbors(frontiers[i].popleft()):
+                    if self.occupied[n] != 0:
+                        continue
+                    j = owner.get(n)
+                    if j is None:
+                        owner[n] = i
+                        cells[i].append(n)
+                        frontiers[i].append(n)
+                    elif root(j) != i:
+                        # Still one part.
+                        j = root(j)
+                        joined[j] = i
+                        cells[i].extend(cells[j])
+                        frontiers[i].extend(frontiers[j])
+                        growing.remove(j)
+        if len(finished) == 0:
+            return
+        for i in finished:
+            node = len(self._parent)
+            self._parent.append(node)
+            for cell in cells[i]:
+                self._node[self._flat(cell)] = node
+        self.version += 1
+        if len(self._parent) > 2 * self.occupied.size:
+            self._dirty = True
+
+    def invalidate(self):
+        self._dirty = True
+
+    def component(self, pos):
+        """
+        The component label of a free cell. Labels are only
+        comparable while the version stays the same.
+        """
+        if self._dirty:
+            self._relabel()
+        return self._find(self._node[self._flat(pos)])
+
+    def reachable(self, start, goal):
+        """
+        Whether a token at start can get next to one at goal.
+        """
+        if abs(start[0] - goal[0]) + abs(start[1] - goal[1]) <= 1:
+            return True
+        if self._dirty:
+            self._relabel()
+        goal_labels = {self.component(n) for n in self._neighbors(goal)
+                       if self.occupied[n] == 0}
+        return any(self.component(n) in goal_labels
+                   for n in self._neighbors(start) if self.occupied[n] == 0)
@@ -40,3 +40,42 @@ def roll_die(d=20, n=1, advantage=0):
         return np.min(rolls)
     else:
         return rolls[0]
+
+
+def roll_dice(d=20, num=1, advantage=0):
+    """
+    Roll a die num times at once, e.g. the attack rolls of a
+    multiattack.
+
+    :param int d: The die. E.g. 20 for a d20
+    :param int num: The number of rolls.
+    :param int advantage: 1=advantage, -1=disadvantage, 0=regular roll
+    :returns: The result of each roll.
+    :rtype: numpy.ndarray
+    """
+    if d == 1:
+        return np.ones(num, dtype=np.int64)
+    if advantage in [1, -1]:
+        rolls = np.random.randint(1, d+1, size=(num, 2))
+        return rolls.max(axis=1) if advantage == 1 else rolls.min(axis=1)
+    return np.random.randint(1, d+1, size=num)
+
+
+def roll_dice_sums(d, counts):
+    """
+    Roll counts[i] dice for each i in a single draw and sum them
+    for each i, e.g. the damage dice of the hits of a multiattack.
+    For d > 1, roll_dice_sums(d, [n]) is the same roll as roll_die(d, n).
+
+    :param int d: The die. E.g. 6 for a d6
+    :param numpy.ndarray counts: The number of dice to sum for each i.
+    :returns: The sums.
+    :rtype: numpy.ndarray
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    if d == 1:
+        return counts
+    rolls = np.random.randint(1, d+1, size=counts.sum())
+    groups = np.repeat(np.arange(len(counts)), counts)
+    return np.bincount(groups, weights=rolls,
+                       minlength=len(counts)).astype(np.int64)
@@ -0,0 +1,187 @@
+import heapq
+
+from .astar import astar, distance
+
+
+_INF = float("inf")
+
+# Replan from scratch if more cells than this changed since the last plan.
+_MAX_REPAIR = 64
+
+
+class DStarLite(object):
+    """
+    D* Lite (Koenig and Likhachev, 2002) incremental pathfinding.
+    The search runs backwards from the goal, so that when the start
+    moves or a few cells change occupancy, only the part of the search
+    they affect is repaired.
+
+    The start and goal cells are always traversable, as they are
+    occupied by the pursuer and its target.
+
+    :param Grid grid: The grid.
+    :param tuple start: (y, x) start position.
+    :param tuple goal: (y, x) goal position.
+    """
+
+    def __init__(self, grid, start, goal):
+        self.grid = grid
+        self.start = start
+        self.goal = goal
+        self.version = grid._version
+        self.expanded = 0
+        self._km = 0
+        self._g = {}
+        self._rhs = {goal: 0}
+        self._queue = []
+        self._queued = {}  # node: key, of the entries in _queue
+        self._push(goal)
+
+    def _blocked(self, pos):
+        if pos == self.start or pos == self.goal:
+            return False
+        return self.grid._grid[pos] != 0
+
+    def _neighbors(self, pos):
+        return self.grid._get_adjacent_indices(pos)
+
+    def _cost(self, u, v):
+        if self._blocked(u) or self._blocked(v):
+            return _INF
+        return 1
+
+    def _key(self, pos):
+        g_rhs = min(self._g.get(pos, _INF),
+                    self._rhs.get(pos, _INF))
+        return (g_rhs + distance(self.start, pos) + self._km, g_rhs)
+
+    def _push(self, pos):
+        key = self._key(pos)
+        self._queued[pos] = key
+        heapq.heappush(self._queue, (key, pos))
+
+    def _top(self):
+        # Entries that were removed or re-queued are skipped.
+        while self._queue:
+            (key, pos) = self._queue[0]
+            if self._queued.get(pos) == key:
+                return (key, pos)
+            heapq.heappop(self._queue)
+        return ((_INF, _INF), None)
+
+    def _update_vertex(self, u):
+        g = self._g
+        if u != self.goal:
+            rhs = _INF
+            if not self._blocked(u):
+                for v in self._neighbors(u):
+                    if v in g and g[v] + 1 < rhs and not self._blocked(v):
+                        rhs = g[v] + 1
+            self._rhs[u] = rhs
+        self._queued.pop(u, None)
+        if g.get(u, _INF) != self._rhs.get(u, _INF):
+            self._push(u)
+
+    def _compute_shortest_path(self):
+        while True:
+            (key, u) = self._top()
+            g_start = self._g.get(self.start, _INF)
+            rhs_start = self._rhs.get(self.start, _INF)
+            if u is None or (key >= self._key(self.start) and
+                             rhs_start == g_start):
+                return
+            self.expanded += 1
+            new_key = self._key(u)
+            if key < new_key:
+                self._push(u)
+                continue
+            del self._queued[u]
+            if self._g.get(u, _INF) > self._rhs[u]:
+                self._g[u] = self._rhs[u]
+                for v in self._neighbors(u):
+                    self._update_vertex(v)
+            else:
+                self._g[u] = _INF
+                for v in self._neighbors(u) + [u]:
+                    self._update_vertex(v)
+
+    def replan(self, start):
+        """
+        Move the start and repair the search for the
+        cells that changed occupancy since the last plan.
+
+        :param tuple start: (y, x) new start position.
+        :returns: False if too much changed to repair the search.
+        :rtype: bool
+        """
+        changed = self.grid.changes_since(self.version)
+        if changed is None or len(set(changed)) > _MAX_REPAIR:
+            return False
+        # The old start cell counts as blocked again if it is occupied.
+        changed = set(changed) | {self.start, start}
+        self._km += distance(self.start, start)
+        self.start = start
+        self.version = self.grid._version
+        for pos in changed:
+            for u in self._neighbors(pos) + [pos]:
+                self._update_vertex(u)
+        return True
+
+    def path(self, moves=-1):
+        """
+        The shortest path from the start to a cell next to the goal.
+
+        :param int moves: number of grid spaces to move towards goal.
+                          If -1, returns the entire path.
+        :returns: The path, or None if the goal cannot be reached.
+        :rtype: list
+        """
+        self._compute_shortest_path()
+        if self._g.get(self.start, _INF) == _INF:
+            return None
+        path = [self.start]
+        current = self.start
+        while distance(current, self.goal) > 1:
+            if moves != -1 and len(path) > moves:
+                break
+            current = min(self._neighbors(current),
+                          key=lambda v: (self._cost(current, v) +
+                                         self._g.get(v, _INF)))
+            path.append(current)
+        return path
+
+
+def dstar_lite(start, end, adj_matrix, moves=-1):
+    """
+    Incremental pathfinding, with the same interface as astar.astar().
+    A D* Lite planner is kept for each pursuer, i.e. the token at
+    start, and is repaired rather than replanned from scratch
+    while its target stays put. If there is no path to end,
+    falls back to astar.astar().
+
+    :param tuple start: (y, x) start position.
+    :param tuple end: (y, x) goal position.
+    :param Adjacency adj_matrix: The grid's adjacency, from
+        Grid.to_adjacency(). Plain adjacency dicts are passed
+        on to astar.astar().
+    :param int moves: number of grid spaces to move towards end.
+                      If -1, returns the entire path.
+    :returns: The path from start towards end.
+    :rtype: list
+    """
+    moves = int(moves)
+    grid = getattr(adj_matrix, "grid", None)
+    pursuer = grid.get(start) if grid is not None else None
+    if pursuer is None:
+        return astar(start, end, adj_matrix, moves=moves)
+    # Planners are kept on the grid, so that they go when it does.
+    planners = grid._planners
+    planner = planners.get(pursuer)
+    if (planner is None or planner.goal != end or
+            planner.replan(start) is False):
+        planner = DStarLite(grid, start, end)
+        planners[pursuer] = planner
+    path = planner.path(moves=moves)
+    if path is None:
+        return astar(start, end, adj_matrix, moves=moves)
+    return path
@@ -4,7 +4,12 @@ import pandas as pd
 from .token import Character
 from .grid import Grid
 from .player import Player
+from .registry import EntityRegistry
+from .scheduler import TurnScheduler
 from .astar import distance
+from .stats import wilson_interval
+from .melee import (roll_swings, first_drop, FIRST_BLOCK,
+                    MAX_BLOCK_ATTACKS)
 
 
 class Team(object):
@@ -61,20 +66,49 @@ class Encounter(object):
     A combat encounter between two or more teams of characters.
 
     :param list teams: A list of Team instances.
+    :param Grid grid: The grid the teams are on.
+    :param Player player: Moves the characters and rolls the dice.
+    :param EntityRegistry registry: (Optional) The registry of the
+        engine running this encounter. If None, the combatants
+        are registered with a new one.
+    :param str log_level: How much of the encounter to log.
+        "none": Only the winner and the number of rounds.
+        "summary": Also the attacks, hits and damage of each attacker.
+        "full": Also every attack, in Encounter.log.
+    :param bool fast_forward: Once every combatant is next to its goal,
+        roll the rounds until someone drops at once. See melee.py.
+        Encounters that are recorded are played turn by turn.
     """
 
     _id_counter = 0
+    _log_levels = ["none", "summary", "full"]
 
-    def __init__(self, teams, grid, player):
+    def __init__(self, teams, grid, player, registry=None, log_level="full",
+                 fast_forward=False):
         self._check_params(teams, grid, player)
-        self._log = []
+        if log_level not in self._log_levels:
+            raise ValueError(f"log_level must be one of {self._log_levels}.")  # noqa
+        self.log_level = log_level
+        self.fast_forward = fast_forward
+        self._log = []  # [(attacker id, victim id, hit, dmg)]
         self.id = self._get_id()
         self.teams = teams
         self.grid = grid
         self.player = player
         self.combatants = [m for t in self.teams for m in t.members()]
         self.winner = None
-        self._team_lookup = self._get_team_lookup()
+        if registry is None:
+            registry = EntityRegistry(self.teams)
+        else:
+            registry.claim()
+        self.registry = registry
+        # Registered characters that were left out of this encounter.
+        self._active = np.zeros(len(registry), dtype=bool)
+        self._active[[c.eid for c in self.combatants]] = True
+        # Attacks, hits and damage by attacker id.
+        self._attacks = [0] * len(registry)
+        self._hits = [0] * len(registry)
+        self._dmg = [0] * len(registry)
         self._enemy_lookup = self._get_enemy_lookup()
 
     def _check_params(self, teams, grid, player):
@@ -86,18 +120,11 @@ class Encounter(object):
     @classmethod
     def _get_id(cls):
         cls._id_counter += 1
-        return f"ENC{cls._id_counter:015d}"
+        return cls._id_counter
 
     def __str__(self):
         return ' vs. '.join([t.name for t in self.teams])
 
-    def _get_team_lookup(self):
-        tm = {}
-        for team in self.teams:
-            for character in team.members():
-                tm[character.id] = team
-        return tm
-
     def _get_enemy_lookup(self):
         enemy_lookup = {}
         for team in self.teams:
@@ -106,15 +133,27 @@ class Encounter(object):
         return enemy_lookup
 
     def _set_combatants_goals(self):
+        # Each character goes after the closest enemy.
+        closest = self.registry.closest_enemies(self._active)
         for c in self.combatants:
-            if not c.is_alive:
-                continue
-            team = self._team_lookup[c.id]
-            enemies = self._enemy_lookup[team.name]
-            # Choose an enemy to attack.
-            distances = [distance(self.grid[c], self.grid[e])
-                         for e in enemies]
-            c.goal = enemies[np.argmin(distances)]
+            if c.is_alive and closest[c.eid] != -1:
+                c.goal = self.registry[closest[c.eid]]
+
+    def _retarget(self, character):
+        """
+        If the character can't get to its goal, e.g. because it is
+        walled off or surrounded, go after the closest enemy it can
+        get to instead. If there is none, keep the goal.
+        """
+        pos = self.grid[character]
+        if self.grid.reachable(pos, self.grid[character.goal]):
+            return
+        team = self.get_team(character)
+        reachable = [e for e in self._enemy_lookup[team.name]
+                     if self.grid.reachable(pos, self.grid[e])]
+        if reachable != []:
+            distances = [distance(pos, self.grid[e]) for e in reachable]
+            character.goal = reachable[np.argmin(distances)]
 
     def _roll_initiative(self):
         """
@@ -127,26 +166,120 @@ class Encounter(object):
         return order
 
     def _fight(self, attacker, victim):
+        """
+        The attacker's turn of attacks against the victim. All attack
+        and damage rolls are made at once. Attacks after the victim
+        drops are not made.
 
-        def _hit(roll, bonus, ac):
-            if roll == 20:
-                return True
-            elif roll + bonus >= ac:
-                return True
-            else:
+        :returns: Whether each attack hit and was a critical hit,
+                  and its damage.
+        :rtype: (list, list, list)
+        """
+        atk = self.player.choose_attack(attacker, target=victim)
+        rolls, bonus = self.player.roll_attacks(attacker, atk)
+        is_crit = rolls == 20
+        is_hit = is_crit | (rolls + bonus >= victim.ac)
+        dmg = np.zeros(len(rolls), dtype=np.int64)
+        if is_hit.any():
+            dmg_rolls, dmg_bonus = self.player.roll_damages(
+                attacker, atk, crits=is_crit[is_hit])
+            dmg[is_hit] = dmg_rolls + dmg_bonus
+        # The first attack that drops the victim is the last.
+        num = min(np.searchsorted(np.cumsum(dmg), victim.HP) + 1, len(dmg))
+        victim.HP -= int(dmg[:num].sum())
+        return (is_hit[:num].tolist(), is_crit[:num].tolist(),
+                dmg[:num].tolist())
+
+    def _is_locked(self):
+        """
+        Whether every combatant is next to its goal, so that nobody
+        moves or changes goal until someone drops.
+        """
+        combatants = self.scheduler.this_round()
+        for c in combatants:
+            if c.goal is None or not c.goal.is_alive:
+                return False
+            if not self.grid.is_adjacent(c, c.goal):
                 return False
+        # Otherwise nobody ever drops.
+        return any(c.get_attack() is not None for c in combatants)
 
-        is_crit = False
-        dmg = 0
-        atk = self.player.choose_attack(attacker, target=victim)
-        roll, bonus = self.player.roll_attack(attacker, atk)
-        is_hit = _hit(roll, bonus, victim.ac)
-        if is_hit is True:
-            if roll == 20:
-                is_crit = True
-            dmg = sum(self.player.roll_damage(attacker, atk, crit=is_crit))
-            victim.HP -= dmg
-        return (is_hit, is_crit, dmg)
+    def _fast_forward(self):
+        """
+        Roll the rounds of a locked melee at once, until the first
+        attack that drops its target.
+
+        :returns: The number of whole rounds played, the combatants
+                  who already had their turn in the round in which
+                  someone dropped, and whether a team won.
+        :rtype: (int, list, bool)
+        """
+        order = self.scheduler.this_round()
+        (swings, attackers, victims) = ([], [], [])
+        for c in order:
+            atk = self.player.choose_attack(c, target=c.goal)
+            for _ in range(c.num_attacks):
+                swings.append((atk, c.goal.ac))
+                attackers.append(c.eid)
+                victims.append(c.goal.eid)
+        (attackers, victims) = (np.array(attackers), np.array(victims))
+        hp = np.array([c.HP for c in self.registry.entities])
+        (rounds, block) = (0, FIRST_BLOCK)
+        while True:
+            (hits, dmg) = roll_swings(swings, block)
+            first = first_drop(victims, dmg, hp)
+            num = min(first + 1, dmg.size)
+            self._add_swings(np.tile(attackers, block)[:num],
+                             np.tile(victims, block)[:num],
+                             hits.ravel()[:num], dmg.ravel()[:num], hp)
+            if first < dmg.size:
+                break
+            rounds += block
+            block = min(2 * block, max(MAX_BLOCK_ATTACKS // len(swings), 1))
+        rounds += first // len(swings)
+        killer = self.registry[attackers[first % len(swings)]]
+        dead = self.registry[victims[first % len(swings)]]
+        acted = order[:order.index(killer) + 1]
+        won = self._drop(dead, self.get_team(killer))
+        return (rounds, acted, won)
+
+    def _add_swings(self, attackers, victims, hits, dmg, hp):
+        """
+        Apply rolled attacks to the victims' hit points and log them.
+        """
+        np.subtract.at(hp, victims, dmg)
+        for eid in np.unique(victims):
+            self.registry[eid].HP = int(hp[eid])
+            self.registry.hp[eid] = hp[eid]
+        if self.log_level != "none":
+            for eid in np.unique(attackers):
+                mine = attackers == eid
+                self._attacks[eid] += int(mine.sum())
+                self._hits[eid] += int(hits[mine].sum())
+                self._dmg[eid] += int(dmg[mine].sum())
+        if self.log_level == "full":
+            self._log.extend(zip(attackers.tolist(), victims.tolist(),
+                                 hits.tolist(), dmg.tolist()))
+
+    def _drop(self, enemy, team, recorder=None):
+        """
+        Remove a combatant that dropped from the encounter.
+
+        :param Character enemy: The combatant.
+        :param Team team: The team that dropped it.
+        :returns: Whether that team has won.
+        :rtype: bool
+        """
+        self._enemy_lookup[team.name].remove(enemy)
+        self.scheduler.remove(enemy)
+        self.grid.rm_token(enemy)
+        if recorder is not None:
+            recorder.death(enemy)
+        if self._enemy_lookup[team.name] == []:
+            self.winner = team
+            return True
+        self._set_combatants_goals()
+        return False
 
     def get_team(self, character):
         """
@@ -156,57 +289,98 @@ class Encounter(object):
         :returns: The team of this character.
         :rtype: Team
         """
-        return self._team_lookup[character.id]
+        return self.registry.get_team(character)
 
     def init_combat(self):
         # Who will attack who.
+        self.registry.sync(self.grid)
         self._set_combatants_goals()
         self.turn_order = self._roll_initiative()
+        self.scheduler = TurnScheduler(self.turn_order)
 
     # TODO: Actually implement verbose
-    def run_combat(self, random_seed=None, verbose=0):
+    def run_combat(self, random_seed=None, verbose=0, recorder=None):
         """
         Run simulated combat among all the teams.
 
+        :param ReplayRecorder recorder: (Optional) Record the events
+                                        of this encounter.
         :returns: The winning team.
         :rtype: Team
         """
+        if recorder is not None:
+            recorder.start(self)
         rounds = 0
         won = False
         while won is False:
-            for (character, _) in self.turn_order:
-                if not character.is_alive:
+            acted = []
+            if self.fast_forward is True and recorder is None and \
+                    self._is_locked():
+                (num_rounds, acted, won) = self._fast_forward()
+                rounds += num_rounds
+            turns = self.scheduler.turns() if won is False else []
+            for character in turns:
+                if character in acted:
                     continue
+                self._retarget(character)
                 new_pos = self.player.move_character(character, self.grid)  # noqa
+                if new_pos is not None:
+                    self.registry.pos[character.eid] = new_pos
+                    if recorder is not None:
+                        recorder.move(character, new_pos)
                 enemy = character.goal
                 if self.grid.is_adjacent(character, enemy):
-                    is_hit, is_crit, dmg = self._fight(character, enemy)
-                    atk = {"encounter_id": self.id,
-                           "attacker_id": character.id,
-                           "attacker_name": character.name,
-                           "victim_id": enemy.id,
-                           "victim_name": enemy.name,
-                           "hit": is_hit,
-                           "dmg": dmg}
-                    self._log.append(atk)
-                team = self._team_lookup[character.id]
+                    hits, crits, dmgs = self._fight(character, enemy)
+                    self.registry.hp[enemy.eid] = enemy.HP
+                    if self.log_level != "none":
+                        self._attacks[character.eid] += len(hits)
+                        self._hits[character.eid] += sum(hits)
+                        self._dmg[character.eid] += sum(dmgs)
+                    if self.log_level == "full":
+                        self._log.extend((character.eid, enemy.eid, hit, dmg)
+                                         for (hit, dmg) in zip(hits, dmgs))
+                    if recorder is not None:
+                        for (hit, crit, dmg) in zip(hits, crits, dmgs):
+                            recorder.attack(character, enemy, hit, crit, dmg)
+                team = self.get_team(character)
                 if not enemy.is_alive:
-                    self._enemy_lookup[team.name].remove(enemy)
-                    self.grid.rm_token(enemy)
-                    if self._enemy_lookup[team.name] == []:
-                        self.winner = team
-                        won = True
+                    won = self._drop(enemy, team, recorder=recorder)
+                    if won is True:
                         break
-                    self._set_combatants_goals()
             rounds += 1
+            if recorder is not None:
+                recorder.end_round(rounds)
+                if won is True:
+                    recorder.end(self)
             yield rounds
 
     @property
     def log(self):
-        return pd.DataFrame(self._log)
+        log = pd.DataFrame(self._log, columns=["attacker_id", "victim_id",
+                                               "hit", "dmg"])
+        names = np.array(self.registry.names, dtype=object)
+        log.insert(0, "encounter_id", self.id)
+        log.insert(2, "attacker_name", names[log["attacker_id"]])
+        log.insert(4, "victim_name", names[log["victim_id"]])
+        return log
+
+    def summary(self, confidence=None):
+        """
+        Print the DPR and hit ratio of each attacker.
 
-    def summary(self):
-        for ((name, cid), group) in self.log.groupby(["attacker_name", "attacker_id"]):  # noqa
-            dpr = group[group["hit"] == True]["dmg"].mean()  # noqa
-            hit_ratio = group["hit"].sum() / group.shape[0]
-            print(f"{name} ({cid}): DPR ({dpr:.2f}), hit ratio ({hit_ratio:.2f})")  # noqa
+        :param float confidence: (Optional) Also print Wilson intervals
+                                 of the hit ratios at this level.
+        """
+        if self.log_level == "none":
+            raise ValueError("Attacks are not logged with log_level 'none'.")  # noqa
+        for (eid, name) in enumerate(self.registry.names):
+            if self._attacks[eid] == 0:
+                continue
+            dpr = self._dmg[eid] / self._hits[eid] if self._hits[eid] else float("nan")  # noqa
+            hit_ratio = self._hits[eid] / self._attacks[eid]
+            if confidence is None:
+                print(f"{name} ({eid}): DPR ({dpr:.2f}), hit ratio ({hit_ratio:.2f})")  # noqa
+            else:
+                (low, high) = wilson_interval(self._hits[eid],
+                                              self._attacks[eid], confidence)
+                print(f"{name} ({eid}): DPR ({dpr:.2f}), hit ratio ({hit_ratio:.2f} [{low:.2f}, {high:.2f}])")  # noqa
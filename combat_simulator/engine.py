@@ -1,23 +1,58 @@
+import os
+import json
 import curses
-import time
-import pandas as pd
+import asyncio
+import numpy as np
 from tqdm import trange
-from collections import defaultdict
 
 from .grid import Grid
 from .player import Player
+from .astar import astar
 from .encounter import Encounter
+from .registry import EntityRegistry
+from .results import Results
+from .stats import confidence_intervals, format_intervals
+
+
+# How much of each encounter the Engine logs. "sampled" logs
+# every attack of one in log_every encounters, and the attack
+# statistics of the others, as "full" and "summary" do. The
+# attack logs of "sampled" and "full" are kept in Engine.logs.
+LOG_LEVELS = ["none", "summary", "sampled", "full"]
 
 
 class Engine(object):
+    """
+    Runs encounters between teams on a grid.
+
+    :param Team teams: The teams.
+    :param Grid grid: The grid.
+    :param function pathfinder: (Optional) Finds paths on the grid.
+    :param str log_level: One of LOG_LEVELS. See Encounter.
+    :param int log_every: Log every attack of one in this many
+                          encounters, if log_level is "sampled".
+                          The attack logs are kept in logs.
+    :param bool fast_forward: Fast-forward encounters once they are
+                              locked in melee. See Encounter.
+    """
 
-    def __init__(self, *teams, grid=None):
+    def __init__(self, *teams, grid=None, pathfinder=astar,
+                 log_level="summary",
+                 log_every=100, fast_forward=False):
         if grid is None:
             raise ValueError("grid must be specified.")
+        if log_level not in LOG_LEVELS:
+            raise ValueError(f"log_level must be one of {LOG_LEVELS}.")
+        self.log_level = log_level
+        self.log_every = log_every
+        self.fast_forward = fast_forward
+        self.logs = []
+        self._num_started = 0
         self.teams = teams
-        self.player = Player()
+        self.player = Player(pathfinder=pathfinder)
         assert(isinstance(grid, Grid))
         self.grid = grid
+        self.registry = EntityRegistry(self.teams)
 
     # TODO: Check if the first team(s) will fill up the grid.
     # If this happens then the last team will not be added at all.
@@ -39,90 +74,429 @@ class Engine(object):
                     team.rm_member(character)
 
         # Start the encounter
+        log_level = self.log_level
+        if log_level == "sampled":
+            sampled = self._num_started % self.log_every == 0
+            log_level = "full" if sampled else "summary"
+        self._num_started += 1
         enc = Encounter(teams=self.teams, grid=self.grid,
-                        player=self.player)
+                        player=self.player, registry=self.registry,
+                        log_level=log_level,
+                        fast_forward=self.fast_forward and not visual)
         enc.init_combat()
         return enc
 
+    def get_state(self):
+        """
+        Everything that is carried over from one encounter to the next:
+        the random number generator state, the characters' hit points,
+        the number of encounters started, which picks the sampled
+        logs, and the start areas, which grow when they fill up.
+        Running the same encounters from the same state gives the same
+        results.
+
+        :returns: A JSON serializable snapshot.
+        :rtype: dict
+        """
+        (name, keys, pos, has_gauss, cached_gaussian) = np.random.get_state()
+        return {"random_state": [name, keys.tolist(), int(pos),
+                                 int(has_gauss), float(cached_gaussian)],
+                "hp": [[int(c.HP) for c in team.members()]
+                       for team in self.teams],
+                "num_started": self._num_started,
+                "start_positions": [
+                    [team, [list(pos) for pos in positions]]
+                    for (team, positions)
+                    in self.grid._start_positions.items()]}
+
+    def set_state(self, state):
+        """
+        Restore a snapshot taken by get_state().
+
+        :param dict state: The snapshot.
+        """
+        (name, keys, pos, has_gauss, cached_gaussian) = state["random_state"]
+        np.random.set_state((name, np.array(keys, dtype=np.uint32), pos,
+                             has_gauss, cached_gaussian))
+        # Older snapshots don't have it.
+        self._num_started = state.get("num_started", self._num_started)
+        if "start_positions" in state:
+            self.grid._start_positions = {
+                team: [tuple(pos) for pos in positions]
+                for (team, positions) in state["start_positions"]}
+        for (team, hps) in zip(self.teams, state["hp"]):
+            # Members that did not fit on the grid were removed
+            # from the end of the team.
+            for character in team.members()[len(hps):]:
+                team.rm_member(character)
+            for (character, hp) in zip(team.members(), hps):
+                character.HP = hp
+
     def initialize_windows(self):
-        gamewin = GameWindow(self.grid, pos=(0, 0))
+        viewport = GameWindow.fit_viewport(self.grid.shape)
+        gamewin = GameWindow(self.grid, pos=(0, 0), viewport=viewport)
         gamewin.redraw()
         msgwin_size = (30, 50)
         msgwin_pos = (gamewin.shape[0] + 2, 0)
         msgwin = MessageWindow(size=msgwin_size, pos=msgwin_pos)
         return gamewin, msgwin
 
-    def gameloop(self, visual=True, num_encounters=10, speed=0.3):
+    def save_checkpoint(self, checkpoint_file, results):
+        """
+        Save the results so far and the Engine state, so that the run
+        can be resumed with load_checkpoint().
+
+        :param str checkpoint_file: Where to save the checkpoint.
+        :param Results results: The results so far.
+        """
+        tmp_file = f"{checkpoint_file}.tmp"
+        with open(tmp_file, 'w') as outF:
+            json.dump({"results": results.to_dict(),
+                       "state": self.get_state()}, outF)
+        # Never leave a half written checkpoint behind.
+        os.replace(tmp_file, checkpoint_file)
+
+    def load_checkpoint(self, checkpoint_file):
+        """
+        Restore the Engine state saved by save_checkpoint().
+
+        :param str checkpoint_file: The checkpoint to load.
+        :returns: The results saved with the checkpoint.
+        :rtype: Results
+        """
+        with open(checkpoint_file) as inF:
+            checkpoint = json.load(inF)
+        self.set_state(checkpoint["state"])
+        return Results.from_dict(checkpoint["results"])
+
+    def run(self, num_encounters=10, results=None, progress=True,
+            checkpoint_file=None, checkpoint_every=1000, recorder=None):
+        """
+        Run a number of encounters without visualization.
+
+        :param int num_encounters: The number of encounters to run.
+        :param Results results: (Optional) Existing results to add to.
+        :param bool progress: Whether to display a progress bar.
+        :param str checkpoint_file: (Optional) Where to save checkpoints.
+        :param int checkpoint_every: Save a checkpoint after this
+                                     many encounters.
+        :param ReplayRecorder recorder: (Optional) Record every encounter.
+        :returns: The aggregated results.
+        :rtype: Results
+        """
+        if results is None:
+            results = Results(team_names=[t.name for t in self.teams])
+        if progress is True and num_encounters > 1:
+            enc_loop = trange(num_encounters)
+        else:
+            enc_loop = range(num_encounters)
+        for i in enc_loop:
+            enc = self.initialize_encounter(visual=False)
+            rounds = 0
+            for rounds in enc.run_combat(recorder=recorder):
+                pass
+            results.add_encounter(enc, rounds=rounds)
+            if enc.log_level == "full":
+                self.logs.append(enc.log)
+            del enc
+            if checkpoint_file is not None:
+                if (i + 1) % checkpoint_every == 0 or i + 1 == num_encounters:
+                    self.save_checkpoint(checkpoint_file, results)
+        return results
+
+    async def _simulate(self, enc, frames, controls):
+        """
+        Run the encounter, putting a snapshot of the grid into
+        frames after every round. If the renderer falls behind,
+        the oldest frame is dropped.
+        """
+        rounds = 0
+        for rounds in enc.run_combat():
+            if frames.full():
+                frames.get_nowait()
+            frames.put_nowait(self.grid.frame())
+            if controls.stepping is True:
+                controls.stepping = False
+                controls.running.clear()
+            # Always yield to the renderer, even at full speed.
+            await asyncio.sleep(controls.delay)
+            await controls.running.wait()
+        return rounds
+
+    async def _render(self, gamewin, msgwin, frames, controls, fps):
+        """
+        Draw the most recent frame at a fixed frame rate
+        and handle keyboard controls.
+        """
+        gamewin.win.nodelay(True)
+        while not (controls.done and frames.empty()):
+            key = gamewin.getch()
+            if key != -1:
+                controls.handle_key(chr(key) if key < 256 else key)
+                msgwin.redraw(str(controls))
+            if controls.quit is True:
+                break
+            frame = None
+            while not frames.empty():
+                frame = frames.get_nowait()
+            if frame is not None:
+                gamewin.redraw(frame)
+            await asyncio.sleep(1 / fps)
+        gamewin.win.nodelay(False)
+
+    async def _visual_combat(self, enc, gamewin, msgwin, speed, fps):
+        controls = VisualControls(delay=speed)
+        msgwin.redraw(str(controls))
+        frames = asyncio.Queue(maxsize=2)
+        renderer = asyncio.ensure_future(
+            self._render(gamewin, msgwin, frames, controls, fps))
+        simulation = asyncio.ensure_future(
+            self._simulate(enc, frames, controls))
+        await asyncio.wait([renderer, simulation],
+                           return_when=asyncio.FIRST_COMPLETED)
+        if renderer.done():
+            # The user quit before the encounter finished.
+            simulation.cancel()
+            return None
+        controls.done = True
+        rounds = simulation.result()
+        await renderer
+        return rounds
+
+    def gameloop(self, visual=True, num_encounters=10, speed=0.3, fps=30,
+                 checkpoint_file=None, checkpoint_every=1000, resume=False,
+                 recorder=None, confidence=None, ci_method="analytic"):
 
         def main(curses_scr=None):
-            if visual is True:
-                curses.curs_set(0)
-                num_encounters = 1
-            if num_encounters == 1:
-                enc_loop = range(num_encounters)
-            else:
-                enc_loop = trange(num_encounters)
-
-            log = None
-            winners = defaultdict(int)
-            for _ in enc_loop:
-                enc = self.initialize_encounter(visual=visual)
-                gamewin, msgwin = self.initialize_windows()
-                msgwin.redraw(str(enc))
-                msgwin.getch()
-                for round in enc.run_combat():
-                    if visual is True:
-                        gamewin.redraw()
-                        time.sleep(speed)
-                msgwin.redraw(f"Winner: {str(enc.winner)}")
-                msgwin.getch()
-                winners[enc.winner.name] += 1
-                log = pd.concat([log, enc.log])
-                del enc
-            return log, winners
+            curses.curs_set(0)
+            results = Results(team_names=[t.name for t in self.teams])
+            enc = self.initialize_encounter(visual=visual)
+            gamewin, msgwin = self.initialize_windows()
+            msgwin.redraw(str(enc))
+            msgwin.getch()
+            rounds = asyncio.run(
+                self._visual_combat(enc, gamewin, msgwin, speed, fps))
+            if rounds is None:
+                return results
+            msgwin.redraw(f"Winner: {str(enc.winner)}")
+            msgwin.getch()
+            results.add_encounter(enc, rounds=rounds)
+            return results
 
         if visual is True:
-            log, winners = curses.wrapper(main)
+            results = curses.wrapper(main)
         else:
-            log, winners = main()
+            # Confidence intervals need the statistics of each encounter,
+            # which would make every checkpoint as big as the run so far.
+            if confidence is not None and checkpoint_file is not None:
+                raise ValueError("Confidence intervals are not supported with checkpoints.")  # noqa
+            results = Results(team_names=[t.name for t in self.teams],
+                              keep_encounters=confidence is not None)
+            if resume is True and os.path.exists(checkpoint_file):
+                results = self.load_checkpoint(checkpoint_file)
+                num_encounters -= results.num_encounters
+            results = self.run(num_encounters=num_encounters, results=results,
+                               checkpoint_file=checkpoint_file,
+                               checkpoint_every=checkpoint_every,
+                               recorder=recorder)
+            if confidence is not None:
+                (attackers, teams) = confidence_intervals(
+                    results, confidence=confidence, method=ci_method)
+                return str(results) + '\n' + \
+                    format_intervals(attackers, teams, confidence)
+        return str(results)
+
 
-        outstr = ""
-        for ((name, cid), group) in log.groupby(["attacker_name", "attacker_id"]):  # noqa
-            dpr = group[group["hit"] == True]["dmg"].mean()  # noqa
-            hit_ratio = group["hit"].sum() / group.shape[0]
-            outstr += f"{name} ({cid}): DPR ({dpr:.2f}), hit ratio ({hit_ratio:.2f})\n"  # noqa
-        outstr += "Wins\n"
-        for team in self.teams:
-            percentage = winners[team.name] / num_encounters
-            outstr += f"{team.name}: {winners[team.name]} / {num_encounters} ({percentage:.2f})\n"  # noqa
-        return outstr
+class VisualControls(object):
+    """
+    Keyboard controls of the visual mode.
+      p or space: pause/resume
+      n: advance one round while paused
+      +: speed up, -: slow down
+      q: quit
+
+    :param float delay: Seconds to wait between rounds. 0 is full speed.
+    """
+
+    def __init__(self, delay=0.3):
+        self.delay = delay
+        self.running = asyncio.Event()
+        self.running.set()
+        self.stepping = False
+        self.quit = False
+        self.done = False
+
+    def __str__(self):
+        if not self.running.is_set():
+            state = "paused"
+        elif self.delay == 0:
+            state = "full speed"
+        else:
+            state = f"{self.delay:.3f}s / round"
+        return f"{state}\n[p]ause [n]ext [+] faster [-] slower [q]uit"
+
+    def handle_key(self, key):
+        if key in ['p', ' ']:
+            if self.running.is_set():
+                self.running.clear()
+            else:
+                self.running.set()
+        elif key == 'n':
+            self.stepping = True
+            self.running.set()
+        elif key in ['+', '=']:
+            # Below a millisecond per round, just run at full speed.
+            self.delay = self.delay / 2 if self.delay > 0.001 else 0
+        elif key == '-':
+            self.delay = self.delay * 2 if self.delay > 0 else 0.001
+        elif key == 'q':
+            self.quit = True
+
+
+def diff_frames(old, new, empty='·'):
+    """
+    Find the cells that changed between two frames.
+
+    :param dict old: The previous {(y, x): icon} frame.
+    :param dict new: The current {(y, x): icon} frame.
+    :param str empty: The icon of an empty cell.
+    :returns: [((y, x), icon)] of the cells to repaint.
+    :rtype: list
+    """
+    changed = [(pos, icon) for (pos, icon) in new.items()
+               if old.get(pos) != icon]
+    changed.extend((pos, empty) for pos in old if pos not in new)
+    return changed
 
 
 class GameWindow(object):
+    """
+    Draws the grid. After the first frame only the cells that
+    changed are repainted. The whole window is redrawn only
+    when the terminal is resized or invalidate() is called.
+
+    Grids larger than the viewport are drawn in part. The
+    viewport follows the tokens as they move.
 
-    def __init__(self, grid, pos=(0, 0)):
+    :param Grid grid: The grid to draw.
+    :param tuple pos: (y, x) screen position of the window.
+    :param tuple viewport: (Optional) (y, x) number of cells to show.
+                           Defaults to the whole grid.
+    """
+
+    def __init__(self, grid, pos=(0, 0), viewport=None):
         self._check_params(grid)
         self.pos = pos
         self.grid = grid
+        if viewport is None:
+            viewport = grid.shape
+        self.viewport = (min(viewport[0], grid.shape[0]),
+                         min(viewport[1], grid.shape[1]))
+        self.origin = (0, 0)
+        self._frame = None
         self._create_window()
 
     def _check_params(self, grid):
         assert(isinstance(grid, Grid))
 
+    @staticmethod
+    def fit_viewport(shape, reserved_rows=12):
+        """
+        The largest viewport onto a grid of the given shape that fits
+        in the terminal, leaving reserved_rows for other windows.
+        """
+        rows = max(1, curses.LINES - 2 - reserved_rows)
+        cols = max(1, (curses.COLS - 2) // 2)
+        return (min(shape[0], rows), min(shape[1], cols))
+
     def _create_window(self):
         # Curses uses (y,x) coordinates
-        y = self.grid.screen_size[0]
-        x = self.grid.screen_size[1]
+        y = self.viewport[0] + 2
+        x = (2 * self.viewport[1]) + 2
         self.shape = (y, x)
         self.win = curses.newwin(y, x, *self.pos)
+        self._term_size = (curses.LINES, curses.COLS)
 
-    def redraw(self):
-        self.win.erase()
-        self.win.addstr(str(self.grid))
+    def _blank_board(self):
+        (y0, x0) = self.origin
+        (ny, nx) = self.viewport
+        hline = ''.join(['━'] * ((2 * nx) - 1))
+        # Walls loaded from a map never change, so are part of the board.
+        walls = self.grid._walls[y0:y0 + ny, x0:x0 + nx]
+        cells = np.where(walls, '#', '·')
+        rows = [f"┃{' '.join(row)}┃" for row in cells]
+        lines = ['┏' + hline + '┓'] + rows + ['┗' + hline + '┛']
+        return '\n'.join(lines)
+
+    def _follow(self, frame):
+        """
+        Center the viewport on the tokens in frame if
+        they have drifted out of its middle half.
+
+        :returns: Whether the viewport moved.
+        """
+        positions = [pos for pos in frame if not self.grid._walls[pos]]
+        if self.viewport == tuple(self.grid.shape) or positions == []:
+            return False
+        center = np.mean(positions, axis=0)
+        origin = []
+        for (c, o, size, limit) in zip(center, self.origin,
+                                       self.viewport, self.grid.shape):
+            if o + size // 4 <= c < o + size - size // 4:
+                origin.append(o)
+            else:
+                origin.append(int(min(max(c - size // 2, 0), limit - size)))
+        origin = tuple(origin)
+        moved = origin != self.origin
+        self.origin = origin
+        return moved
+
+    def _visible(self, frame):
+        (y0, x0) = self.origin
+        (ny, nx) = self.viewport
+        return {pos: icon for (pos, icon) in frame.items()
+                if y0 <= pos[0] < y0 + ny and x0 <= pos[1] < x0 + nx}
+
+    def _draw_cell(self, pos, icon):
+        (y, x) = pos
+        (y0, x0) = self.origin
+        self.win.addch(y - y0 + 1, (2 * (x - x0)) + 1, icon)
+
+    def invalidate(self):
+        """
+        Redraw the whole window on the next call to redraw().
+        """
+        self._frame = None
+
+    def redraw(self, frame=None):
+        """
+        Draw a frame.
+
+        :param dict frame: (Optional) {(y, x): icon} to draw.
+                           Defaults to the grid's current tokens.
+        """
+        if frame is None:
+            frame = self.grid.frame()
+        if curses.is_term_resized(*self._term_size):
+            curses.update_lines_cols()
+            self._term_size = (curses.LINES, curses.COLS)
+            self._frame = None
+        if self._follow(frame) is True:
+            self._frame = None
+        frame = self._visible(frame)
+        if self._frame is None:
+            self.win.erase()
+            self.win.addstr(0, 0, self._blank_board())
+            changed = frame.items()
+        else:
+            changed = diff_frames(self._frame, frame)
+        for (pos, icon) in changed:
+            self._draw_cell(pos, icon)
+        self._frame = dict(frame)
         self.win.refresh()
 
     def getch(self):
-        self.win.getch()
+        return self.win.getch()
 
 
 class MessageWindow(object):
@@ -144,4 +518,4 @@ class MessageWindow(object):
         self.win.refresh()
 
     def getch(self):
-        self.win.getch()
+        return self.win.getch()
@@ -0,0 +1,222 @@
+"""
+Exact win probabilities of small melees, without Monte Carlo.
+
+Everyone is taken to be in melee from the first turn, as on a small
+grid, and to attack the first living enemy in team order with their
+main attack, num_attacks times a turn, with the rules of
+Encounter._fight(). The outcome is then a Markov chain over the hit
+points of the combatants and whose turn it is, which is solved by
+dynamic programming for each initiative order.
+"""
+
+import itertools
+import numpy as np
+
+from .player import Player
+
+
+# Solving takes time and memory in proportion to the number of
+# (hit points, turn, initiative order) states.
+MAX_STATES = 10**7
+# Initiative orders are found by enumerating all 20**n rolls.
+MAX_COMBATANTS = 5
+
+
+def _dice_pmf(dmg_rolls, times=1):
+    """
+    The distribution of the sum of the damage dice, rolled times times.
+    """
+    pmf = np.ones(1)
+    for (d, n) in dmg_rolls:
+        die = np.r_[0.0, np.full(d, 1 / d)]
+        for _ in range(n * times):
+            pmf = np.convolve(pmf, die)
+    return pmf
+
+
+def turn_damage_pmf(attack, ac, num_attacks=1):
+    """
+    The distribution of the damage of a turn of attacks. A natural 20
+    always hits and doubles the damage dice, as in Encounter._fight().
+
+    :param Attack attack: The attack, or None.
+    :param int ac: The armor class of the target.
+    :param int num_attacks: The number of attacks.
+    :returns: The probability of each amount of damage.
+    :rtype: numpy.ndarray
+    """
+    if attack is None or num_attacks == 0:
+        return np.ones(1)
+    p_crit = 1 / 20
+    p_hit = sum(roll + attack.atk_bonus >= ac for roll in range(1, 20)) / 20
+    hit = _dice_pmf(attack.dmg_rolls)
+    swing = p_crit * _dice_pmf(attack.dmg_rolls, times=2)
+    swing[:len(hit)] += p_hit * hit
+    # Damage is never negative.
+    if attack.dmg_bonus >= 0:
+        swing = np.r_[np.zeros(attack.dmg_bonus), swing]
+    else:
+        shift = -attack.dmg_bonus
+        swing = np.r_[swing[:shift + 1].sum(), swing[shift + 1:]]
+    swing[0] += 1 - p_hit - p_crit
+    pmf = np.ones(1)
+    for _ in range(num_attacks):
+        pmf = np.convolve(pmf, swing)
+    return pmf
+
+
+def initiative_orders(combatants):
+    """
+    The probability of each turn order, with initiative rolled as in
+    Encounter._roll_initiative(). Ties keep the order of combatants.
+
+    :param list combatants: The Characters.
+    :returns: {(index of the first, second, ...): probability}
+    :rtype: dict
+    """
+    n = len(combatants)
+    if n > MAX_COMBATANTS:
+        raise ValueError(f"Exact solutions are limited to {MAX_COMBATANTS} combatants.")  # noqa
+    mods = np.array([c.ability_modifier["dex"] for c in combatants])
+    rolls = np.indices((20,) * n).reshape(n, -1).T + 1
+    orders = np.argsort(-(rolls + mods), axis=1, kind="stable")
+    (orders, counts) = np.unique(orders, axis=0, return_counts=True)
+    return {tuple(int(i) for i in order): count / len(rolls)
+            for (order, count) in zip(orders, counts)}
+
+
+def _solve_order(order, hp0, team, pmfs, num_teams):
+    """
+    Solve the chain for one turn order.
+
+    :returns: The probability that each team wins,
+              and the expected number of rounds.
+    :rtype: (numpy.ndarray, float)
+    """
+    n = len(hp0)
+    turns = len(order)
+    shape = tuple(int(h) + 1 for h in hp0)
+    strides = np.array([int(np.prod(shape[i + 1:])) for i in range(n)])
+    hp = np.indices(shape).reshape(n, -1).T
+    alive = hp > 0
+    teams_alive = np.stack([alive[:, team == k].any(axis=1)
+                            for k in range(num_teams)], axis=1)
+    terminal = teams_alive.sum(axis=1) < 2
+    # The first living enemy of each combatant in each state.
+    targets = np.full(hp.shape, -1)
+    for i in range(n):
+        for j in range(n - 1, -1, -1):
+            if team[j] != team[i]:
+                targets[alive[:, j], i] = j
+    # The chance that each team wins and the expected number of
+    # further rounds, from the start of each turn in each state.
+    values = np.zeros((len(hp), turns, num_teams + 1))
+    values[terminal, :, :num_teams] = teams_alive[terminal, None, :]
+    level = hp.sum(axis=1)
+    for states in _levels(level, ~terminal):
+        # values[s, t] = a[t] * values[s, t + 1] + b[t]
+        a = np.ones((len(states), turns))
+        b = np.zeros((len(states), turns, num_teams + 1))
+        for (t, i) in enumerate(order):
+            (t_next, wrap) = ((t + 1) % turns, t == turns - 1)
+            # Another round starts if nobody won.
+            b[:, t, -1] += wrap
+            attacks = alive[states, i]
+            for j in range(n):
+                mine = attacks & (targets[states, i] == j)
+                if not mine.any() or len(pmfs[i][j]) == 1:
+                    continue
+                s = states[mine]
+                pmf = pmfs[i][j]
+                dmg = np.minimum(np.arange(1, len(pmf)), hp[s, j][:, None])
+                nxt = s[:, None] - dmg * strides[j]
+                after = values[nxt, t_next]
+                after[..., -1] += wrap * ~terminal[nxt]
+                a[mine, t] = pmf[0]
+                b[mine, t] = pmf[0] * b[mine, t] + \
+                    np.einsum("d,sdk->sk", pmf[1:], after)
+        # Solve the cycle of turns in which everybody misses.
+        (coef, acc) = (np.ones(len(states)), np.zeros(b[:, 0].shape))
+        for t in range(turns):
+            acc += coef[:, None] * b[:, t]
+            coef *= a[:, t]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x = acc / (1 - coef)[:, None]
+        x[coef >= 1] = np.nan
+        values[states, 0] = x
+        for t in range(turns - 1, 0, -1):
+            x = a[:, t, None] * x + b[:, t]
+            values[states, t] = x
+    start = values[-1, 0]
+    # The first round is counted too, as in Encounter.run_combat().
+    return (start[:num_teams], 1 + start[-1])
+
+
+def _levels(level, mask):
+    """
+    The states with each total of hit points, from the lowest total.
+    Damage always lowers the total, so each level only depends on
+    the levels before it.
+    """
+    states = np.flatnonzero(mask)
+    states = states[np.argsort(level[states], kind="stable")]
+    bounds = np.flatnonzero(np.diff(level[states])) + 1
+    return np.split(states, bounds)
+
+
+def win_probabilities(teams, player=None, max_states=MAX_STATES):
+    """
+    The exact chance that each team wins a melee between the living
+    members of teams, from their current hit points, and its expected
+    number of rounds.
+
+    :param list teams: The Teams.
+    :param Player player: (Optional) Chooses the attacks.
+    :param int max_states: Raise a ValueError rather than solve
+                           a chain with more states than this.
+    :returns: {"wins": {team name: probability}, "rounds": float}
+    :rtype: dict
+    """
+    if player is None:
+        player = Player()
+    combatants = [c for t in teams for c in t.members(alive_only=True)]
+    team = np.array([k for (k, t) in enumerate(teams)
+                     for _ in t.members(alive_only=True)])
+    hp0 = np.array([c.HP for c in combatants])
+    num_states = int(np.prod(hp0 + 1, dtype=float)) * len(combatants)
+    if len(combatants) > MAX_COMBATANTS or num_states > max_states:
+        raise ValueError(f"Too many states to solve exactly ({len(combatants)} combatants, {num_states} states).")  # noqa
+    orders = initiative_orders(combatants)
+    if num_states * len(orders) > max_states:
+        raise ValueError(f"Too many states to solve exactly ({num_states * len(orders)}).")  # noqa
+    pmfs = [[None] * len(combatants) for _ in combatants]
+    for (i, j) in itertools.product(range(len(combatants)), repeat=2):
+        if team[i] != team[j]:
+            atk = player.choose_attack(combatants[i], target=combatants[j])
+            pmf = turn_damage_pmf(atk, combatants[j].ac,
+                                  combatants[i].num_attacks)
+            # Damage beyond the target's hit points drops it all the same.
+            pmf = np.r_[pmf[:hp0[j]], pmf[hp0[j]:].sum()]
+            pmfs[i][j] = np.trim_zeros(pmf, 'b') if pmf[0] < 1 else pmf[:1]
+    wins = np.zeros(len(teams))
+    rounds = 0.0
+    for (order, prob) in orders.items():
+        (order_wins, order_rounds) = _solve_order(order, hp0, team, pmfs,
+                                                  len(teams))
+        wins += prob * order_wins
+        rounds += prob * order_rounds
+    if np.isnan(rounds):
+        raise ValueError("Nobody can drop their target, so the melee never ends.")  # noqa
+    return {"wins": {t.name: float(w) for (t, w) in zip(teams, wins)},
+            "rounds": float(rounds)}
+
+
+def format_exact(solution):
+    """
+    Format the output of win_probabilities() like str(Results).
+    """
+    outstr = "Exact win probabilities\n"
+    for (name, prob) in solution["wins"].items():
+        outstr += f"{name}: {prob:.4f}\n"
+    outstr += f"Expected rounds: {solution['rounds']:.2f}\n"
+    return outstr
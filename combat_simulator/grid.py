@@ -1,7 +1,20 @@
 import numpy as np
-from collections import defaultdict
+from collections import deque
+from collections.abc import Mapping
 
 from .token import Token
+from .components import Components
+from .mapfile import WALL, START, codes_to_matrix
+
+
+# How many occupancy changes the grid keeps a log of.
+_MAX_CHANGES = 4096
+
+# Offsets within a 10ft (two square) walk of a position,
+# starting with the position itself.
+_START_OFFSETS = np.array(
+    [(0, 0)] + [(dy, dx) for dy in range(-2, 3) for dx in range(-2, 3)
+                if 0 < abs(dy) + abs(dx) <= 2])
 
 
 class Grid(object):
@@ -13,26 +26,89 @@ class Grid(object):
 
     def __init__(self, shape=(10, 10)):
         self.shape = shape
-        self._grid = np.zeros(shape, dtype=int)
-        self._tok2pos = {}  # Token.id: (y, x)
+        # One byte per cell, so a 1000x1000 map takes 1MB.
+        self._grid = np.zeros(shape, dtype=np.uint8)
+        # Walls loaded from a map are kept as a mask rather than as tokens.
+        self._walls = np.zeros(shape, dtype=bool)
+        self._wall_token = None
+        # Incremented whenever the walls change, so that anything
+        # precomputed from them (e.g. pathfinding) can be rebuilt.
+        self._static_version = 0
+        # Incremented whenever the occupancy of a cell changes. The
+        # recent changes are logged for incremental pathfinding.
+        self._version = 0
+        self._changes = deque(maxlen=_MAX_CHANGES)  # (version, (y, x))
+        # Connected components of the free cells, built when first needed.
+        self._components = None
+        # D* Lite planners of the tokens, see dstar.dstar_lite().
+        self._planners = {}  # Token: DStarLite
+        self._tok2pos = {}  # Token: (y, x)
         self._pos2tok = {}  # (y, x): Token
         self._start_positions = {}  # team number: list(tuple) of positions
 
     def __str__(self):
-        hline = ''.join(['━'] * ((2 * self.shape[1]) - 1))
+        return self.render()
+
+    def __repr__(self):
+        return f"{self.shape}"
+
+    def _viewport(self, origin, shape):
+        """
+        Clip the viewport at origin with the given shape to the grid.
+        """
+        (y0, x0) = self._enforce_boundaries(origin)
+        if shape is None:
+            shape = self.shape
+        y1 = min(y0 + shape[0], self.shape[0])
+        x1 = min(x0 + shape[1], self.shape[1])
+        return (y0, x0, y1, x1)
+
+    def _in_viewport(self, pos, viewport):
+        (y0, x0, y1, x1) = viewport
+        return y0 <= pos[0] < y1 and x0 <= pos[1] < x1
+
+    def render(self, origin=(0, 0), shape=None):
+        """
+        Draw part of the grid.
+
+        :param tuple origin: (y, x) top left cell of the viewport.
+        :param tuple shape: (Optional) (y, x) size of the viewport.
+                            Defaults to the whole grid.
+        :rtype: str
+        """
+        viewport = self._viewport(origin, shape)
+        (y0, x0, y1, x1) = viewport
+        hline = ''.join(['━'] * ((2 * (x1 - x0)) - 1))
         topline = '┏' + hline + '┓'
         bottomline = '┗' + hline + '┛'
-        str_grid = self._grid.astype(str)
+        str_grid = self._grid[y0:y1, x0:x1].astype(str)
         str_grid[np.where(str_grid == '0')] = '·'
+        str_grid[self._walls[y0:y1, x0:x1]] = '#'
         for (pos, tok) in self._pos2tok.items():
-            str_grid[pos] = tok.icon
+            if self._in_viewport(pos, viewport):
+                str_grid[(pos[0] - y0, pos[1] - x0)] = tok.icon
         lines = [f"┃{' '.join(row)}┃" for row in str_grid]
         lines.insert(0, topline)
         lines.append(bottomline)
         return '\n'.join(lines)
 
-    def __repr__(self):
-        return f"{self.shape}"
+    def frame(self, origin=None, shape=None):
+        """
+        The icons of all tokens currently on the grid.
+        Walls loaded from a map are part of the background
+        and are not included.
+
+        :param tuple origin: (Optional) (y, x) top left cell of a viewport.
+                             If given, only tokens in it are included.
+        :param tuple shape: (Optional) (y, x) size of the viewport.
+        :returns: {(y, x): icon}
+        :rtype: dict
+        """
+        if origin is None:
+            return {pos: tok.icon for (pos, tok) in self._pos2tok.items()}
+        viewport = self._viewport(origin, shape)
+        return {pos: tok.icon for (pos, tok) in self._pos2tok.items()
+                if self._in_viewport(pos, viewport)}
 
     @classmethod
     def from_map_matrix(cls, map_matrix):
@@ -45,48 +121,151 @@ class Grid(object):
         :returns: Grid from the specified matrix
         :rtype: Grid
         """
-        grid = cls(map_matrix.shape)
-        WALL = '#'
-        START_POS = ['1', '2']
-        # [(pos, team_number)]
-        start_positions = []
-        for col in range(map_matrix.shape[0]):
-            for row in range(map_matrix.shape[1]):
-                icon = map_matrix[(col, row)]
-                if icon == '.':
-                    continue
-                elif icon in START_POS:
-                    start_positions.append(((col, row), int(icon)))
-                    continue
-                elif icon == WALL:
-                    name = "wall"
-                else:
-                    name = "unk"
-                t = Token(name=name, icon=icon)
-                grid.add_token(t, pos=(col, row))
-
-        for (pos, team) in start_positions:
-            grid._set_start_positions(pos, team=team)
+        starts = {team: map_matrix == str(team) for team in [1, 2]}
+        other = ~np.isin(map_matrix, ['.', '#', '1', '2'])
+        others = [(tuple(pos), map_matrix[tuple(pos)])
+                  for pos in np.argwhere(other).tolist()]
+        return cls._from_layers(map_matrix == '#', starts, others)
+
+    @classmethod
+    def from_map_codes(cls, codes):
+        """
+        Instantiate the Grid from a matrix of map cell codes,
+        e.g. the cells of a map loaded with mapfile.load_map().
+
+        :param numpy.ndarray codes: uint8 cell code matrix.
+        :returns: Grid from the specified codes.
+        :rtype: Grid
+        """
+        codes = np.asarray(codes)
+        teams = np.unique(codes[(codes > START) & (codes < 32)]) - START
+        starts = {int(team): codes == START + team for team in teams}
+        others = [(tuple(pos), codes_to_matrix(codes[tuple(pos)]).item())
+                  for pos in np.argwhere(codes >= 32).tolist()]
+        return cls._from_layers(codes == WALL, starts, others)
+
+    @classmethod
+    def _from_layers(cls, walls, starts, others):
+        """
+        :param numpy.ndarray walls: Boolean wall mask.
+        :param dict starts: {team number: boolean start position mask}
+        :param list others: [(pos, icon)] of any other tokens.
+        """
+        grid = cls(walls.shape)
+        grid._walls = np.array(walls, dtype=bool)
+        grid._grid[grid._walls] = 1
+        grid._static_version += 1
+        grid._changed_all()
+        for (pos, icon) in others:
+            grid.add_token(Token(name="unk", icon=icon), pos=pos)
+        for (team, mask) in starts.items():
+            marked = np.argwhere(mask)
+            # A team has a single start area. If more than
+            # one is marked, the last one is used.
+            if len(marked) > 0:
+                grid._set_start_positions(tuple(marked[-1]), team=team)
         return grid
 
     def change_shape(self, shape):
         self.shape = shape
-        self._grid = np.zeros(shape, dtype=int)
+        self._grid = np.zeros(shape, dtype=np.uint8)
+        self._walls = np.zeros(shape, dtype=bool)
+        self._static_version += 1
+        self._changed_all()
+
+    def _changed(self, *positions):
+        for pos in positions:
+            self._version += 1
+            self._changes.append((self._version, pos))
+            if self._components is None:
+                continue
+            if self._grid[pos] == 0:
+                self._components.freed(pos)
+            else:
+                self._components.occupied_cell(pos)
+
+    def _changed_all(self):
+        self._version += 1
+        self._changes.clear()
+        self._components = None
+
+    def reachable(self, pos1, pos2):
+        """
+        Whether a token at pos1 can get next to one at pos2, going
+        around walls and other tokens. After the first call, this
+        takes constant time until tokens cut off part of the grid.
+
+        :param tuple pos1: (y, x) position.
+        :param tuple pos2: (y, x) position.
+        :rtype: bool
+        """
+        if self._components is None:
+            self._components = Components(self._grid)
+        return self._components.reachable(pos1, pos2)
+
+    def changes_since(self, version):
+        """
+        The cells whose occupancy changed since the grid was at version.
+
+        :param int version: An earlier value of Grid._version.
+        :returns: The changed (y, x) positions, or None if the
+                  changes are no longer logged.
+        :rtype: list
+        """
+        changed = []
+        for (v, pos) in reversed(self._changes):
+            if v <= version:
+                return changed
+            changed.append(pos)
+        if version + len(changed) == self._version:
+            return changed
+        return None
+
+    @property
+    def wall_token(self):
+        """
+        The token returned by grid[pos] for walls loaded
+        from a map. All such walls share this token.
+        """
+        if self._wall_token is None:
+            self._wall_token = Token(name="wall", icon='#')
+        return self._wall_token
+
+    def rm_wall(self, pos):
+        """
+        Remove a wall loaded from a map.
+
+        :param tuple(int) pos: The (y, x) position of the wall.
+        """
+        if self._walls[pos]:
+            self._walls[pos] = False
+            self._grid[pos] = 0
+            self._static_version += 1
+            self._changed(pos)
+
+    def static_mask(self):
+        """
+        The cells blocked by walls, which do not move during an encounter.
+
+        :returns: Boolean mask of the grid's shape.
+        :rtype: numpy.ndarray
+        """
+        mask = self._walls.copy()
+        for (pos, tok) in self._pos2tok.items():
+            if tok.name == "wall":
+                mask[pos] = True
+        return mask
 
     def clear_tokens(self):
         """
         Remove all non-wall tokens from this grid.
         """
-        for row in range(self._grid.shape[0]):
-            for col in range(self._grid.shape[1]):
-                try:
-                    tok = self._pos2tok[(row, col)]
-                except KeyError:
-                    continue
-                if tok.name != "wall":
-                    self._grid[(row, col)] = 0
-                    del self._pos2tok[(row, col)]
-                    del self._tok2pos[tok.id]
+        for (pos, tok) in list(self._pos2tok.items()):
+            if tok.name != "wall":
+                self._grid[pos] = 0
+                del self._pos2tok[pos]
+                del self._tok2pos[tok]
+                self._changed(pos)
 
     def _set_start_positions(self, pos, team=1):
         """
@@ -95,14 +274,14 @@ class Grid(object):
 
         :param tuple pos: The center of positions area.
         """
-        area = set()
-        for adj1 in self._get_adjacent_indices(pos):
-            if self._is_traversable(adj1):
-                area.add(adj1)
-            for adj2 in self._get_adjacent_indices(adj1):
-                if self._is_traversable(adj2):
-                    area.add(adj2)
-        self._start_positions[team] = list(area)
+        area = np.asarray(pos) + _START_OFFSETS
+        if self._grid.size == 1:
+            # pos has no neighbors, so is not reachable from them.
+            area = area[1:]
+        in_bounds = ((area >= 0) & (area < self._grid.shape)).all(axis=1)
+        area = area[in_bounds]
+        free = self._grid[area[:, 0], area[:, 1]] == 0
+        self._start_positions[team] = [tuple(p) for p in area[free].tolist()]
 
     @property
     def screen_size(self):
@@ -156,7 +335,7 @@ class Grid(object):
         if isinstance(token_or_pos, Token):
             token = token_or_pos
             try:
-                return self._tok2pos[token.id]
+                return self._tok2pos[token]
             except KeyError:
                 msg = f"Token {token} not in grid."
                 raise KeyError(msg)
@@ -169,6 +348,8 @@ class Grid(object):
                 raise KeyError(msg)
             # Yes this will return None. This is desired functionality so that
             # pos is an empty cell, grid[pos] will return None.
+            if self._walls[pos]:
+                return self.wall_token
             return self._pos2tok.get(pos)
         else:
             raise ValueError(f"Unsupported key type {type(token_or_pos)}")
@@ -191,18 +372,19 @@ class Grid(object):
         if not len(pos) == 2 and all([isinstance(p, int) for p in pos]):
             raise ValueError(f"pos must have length 2 and be (int, int).")
         new_pos = self._enforce_boundaries(pos)
-        old_pos = self._tok2pos[token.id]
+        old_pos = self._tok2pos[token]
         # Token didn't actually move after enforcing boundaries.
         if new_pos == old_pos:
             return
         self._grid[old_pos] = 0
         self._grid[new_pos] = 1
-        self._tok2pos[token.id] = new_pos
+        self._changed(old_pos, new_pos)
+        self._tok2pos[token] = new_pos
         self._pos2tok[new_pos] = token
         try:
             del self._pos2tok[old_pos]
         except KeyError:
-            raise KeyError(f"{old_pos},  {token}{token.id}, {token.is_alive}\n{self._pos2tok}\n{self._tok2pos}")  # noqa
+            raise KeyError(f"{old_pos},  {token!r}, {token.is_alive}\n{self._pos2tok}\n{self._tok2pos}")  # noqa
 
     def rm_token(self, token):
         """
@@ -212,10 +394,13 @@ class Grid(object):
         """
         if not isinstance(token, Token):
             raise ValueError(f"token must be of type Token.")
-        pos = self._tok2pos[token.id]
+        pos = self._tok2pos[token]
         self._grid[pos] = 0
-        del self._tok2pos[token.id]
+        self._changed(pos)
+        del self._tok2pos[token]
         del self._pos2tok[pos]
+        if token.name == "wall":
+            self._static_version += 1
 
     # TODO
     def add_team(self, team, pos=None):
@@ -241,31 +426,40 @@ class Grid(object):
         """
         if not isinstance(token, Token):
             raise ValueError(f"token must be of type Token.")
-        # We filled up the grid!
-        if self._grid.sum() == self._grid.ravel().shape[0]:
-            return False
         if pos is None:
             if team is not None and self._start_positions != {}:
                 idxs = [i for i in self._start_positions[team]
                         if self._is_traversable(self._enforce_boundaries(i))]
                 i = 0
                 while idxs == []:
+                    # We filled up the area reachable from the start positions.
+                    if i == len(self._start_positions[team]):
+                        return False
                     search_from = self._start_positions[team][i]
                     adjacents = self._get_adjacent_indices(search_from)
                     idxs = [i for i in adjacents
                             if self._is_traversable(self._enforce_boundaries(i))]  # noqa
                     self._start_positions[team].extend(idxs)
                     i += 1
+                chosen = np.random.choice(len(idxs))
+                pos = idxs[chosen]
             else:
-                idxs = list(zip(*np.where(self._grid == 0)))
-            chosen = np.random.choice(len(idxs))
-            pos = idxs[chosen]
+                idxs = np.flatnonzero(self._grid == 0)
+                # We filled up the grid!
+                if len(idxs) == 0:
+                    return False
+                chosen = np.random.choice(len(idxs))
+                pos = tuple(int(p) for p in
+                            np.unravel_index(idxs[chosen], self.shape))
         pos = self._enforce_boundaries(pos)
         if not self._is_traversable(pos):
             return False
         self._grid[pos] = 1
-        self._tok2pos[token.id] = pos
+        self._changed(pos)
+        self._tok2pos[token] = pos
         self._pos2tok[pos] = token
+        if token.name == "wall":
+            self._static_version += 1
         return True
 
     def _get_adjacent_indices(self, pos):
@@ -294,16 +488,13 @@ class Grid(object):
         return True
 
     def to_adjacency(self):
-        adj = defaultdict(set)
-        for y in range(self._grid.shape[0]):
-            for x in range(self._grid.shape[1]):
-                neighbors = self._get_adjacent_indices((y, x))
-                connections = [n for n in neighbors if self._is_traversable(n)]
-                for cnx in connections:
-                    adj[(y, x)].add(cnx)
-                    if self._is_traversable((y, x)):
-                        adj[cnx].add((y, x))
-        return adj
+        """
+        The traversable neighbors of each position. These are computed
+        when looked up, so the cost does not depend on the grid size.
+
+        :rtype: Adjacency
+        """
+        return Adjacency(self)
 
     def is_adjacent(self, token1, token2):
         """
@@ -315,3 +506,29 @@ class Grid(object):
         if token2_idxs in adj_idxs:
             return True
         return False
+
+
+class Adjacency(Mapping):
+    """
+    A read only view of a Grid as an adjacency list,
+    {(y, x): set((y, x), ...)}, for pathfinding. Positions
+    off the grid have no neighbors.
+
+    :param Grid grid: The grid.
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+
+    def __getitem__(self, pos):
+        if not self.grid._is_valid(pos):
+            return set()
+        return {n for n in self.grid._get_adjacent_indices(pos)
+                if self.grid._grid[n] == 0}
+
+    def __iter__(self):
+        (ny, nx) = self.grid.shape
+        return ((y, x) for y in range(ny) for x in range(nx))
+
+    def __len__(self):
+        return self.grid._grid.size
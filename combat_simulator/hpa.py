@@ -0,0 +1,299 @@
+import heapq
+import hashlib
+import weakref
+import numpy as np
+from collections import defaultdict, deque
+
+from .astar import astar, distance
+
+
+CLUSTER_SIZE = 10
+# Openings at least this wide get an entrance at each end.
+_WIDE_OPENING = 6
+_MAX_CACHED = 8
+
+_graphs = {}  # (walls digest, shape, cluster size): AbstractGraph
+_graph_by_grid = weakref.WeakKeyDictionary()  # Grid: (version, AbstractGraph)
+
+
+class AbstractGraph(object):
+    """
+    The abstraction used by hierarchical pathfinding (HPA*).
+    The map is divided into square clusters, and the cells on either
+    side of each opening in a cluster border become entrance nodes.
+    Entrances of the same cluster are connected by their shortest path
+    through that cluster, which is computed the first time the cluster
+    is searched. Only static walls are considered.
+
+    :param numpy.ndarray walls: Boolean mask of the static walls.
+    :param int cluster_size: The side length of a cluster.
+    """
+
+    def __init__(self, walls, cluster_size=CLUSTER_SIZE):
+        self.walls = np.asarray(walls, dtype=bool)
+        self.shape = self.walls.shape
+        self.cluster_size = cluster_size
+        self._nodes = defaultdict(set)  # cluster: entrance nodes
+        self._inter = defaultdict(dict)  # node: {node: cost}
+        self._intra = {}  # cluster: {node: {node: cost}}
+        self._find_entrances()
+
+    def cluster(self, pos):
+        return (pos[0] // self.cluster_size, pos[1] // self.cluster_size)
+
+    def bounds(self, *positions, margin=0):
+        """
+        The (y0, x0, y1, x1) box covering the clusters of the
+        given positions, grown by margin clusters on each side.
+        """
+        clusters = np.array([self.cluster(pos) for pos in positions])
+        (y0, x0) = (clusters.min(axis=0) - margin) * self.cluster_size
+        (y1, x1) = (clusters.max(axis=0) + 1 + margin) * self.cluster_size
+        return (max(y0, 0), max(x0, 0),
+                min(y1, self.shape[0]), min(x1, self.shape[1]))
+
+    def _find_entrances(self):
+        cs = self.cluster_size
+        (ny, nx) = self.shape
+        # Borders between horizontally adjacent clusters.
+        for x in range(cs - 1, nx - 1, cs):
+            is_open = ~self.walls[:, x] & ~self.walls[:, x + 1]
+            for y in self._transitions(is_open):
+                self._connect((y, x), (y, x + 1))
+        # Borders between vertically adjacent clusters.
+        for y in range(cs - 1, ny - 1, cs):
+            is_open = ~self.walls[y, :] & ~self.walls[y + 1, :]
+            for x in self._transitions(is_open):
+                self._connect((y, x), (y + 1, x))
+
+    def _transitions(self, is_open):
+        """
+        Where to cross a border, given which cells along it are open.
+        """
+        idxs = np.flatnonzero(is_open)
+        if len(idxs) == 0:
+            return []
+        # Openings end at walls and at the corners of clusters.
+        ends = (np.diff(idxs) != 1) | (idxs[1:] % self.cluster_size == 0)
+        transitions = []
+        for opening in np.split(idxs, np.flatnonzero(ends) + 1):
+            (first, last) = (int(opening[0]), int(opening[-1]))
+            if len(opening) >= _WIDE_OPENING:
+                transitions.extend([first, last])
+            else:
+                transitions.append((first + last) // 2)
+        return transitions
+
+    def _connect(self, node1, node2):
+        self._inter[node1][node2] = 1
+        self._inter[node2][node1] = 1
+        self._nodes[self.cluster(node1)].add(node1)
+        self._nodes[self.cluster(node2)].add(node2)
+
+    def _distances(self, start, bounds):
+        """
+        Breadth first distances from start to the cells within bounds.
+        """
+        (y0, x0, y1, x1) = bounds
+        dists = {start: 0}
+        frontier = deque([start])
+        while frontier:
+            current = frontier.popleft()
+            (y, x) = current
+            for n in ((y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)):
+                if n in dists or not (y0 <= n[0] < y1 and x0 <= n[1] < x1):
+                    continue
+                if self.walls[n]:
+                    continue
+                dists[n] = dists[current] + 1
+                frontier.append(n)
+        return dists
+
+    def _cluster_edges(self, cluster):
+        try:
+            return self._intra[cluster]
+        except KeyError:
+            pass
+        nodes = self._nodes[cluster]
+        edges = {}
+        for node in nodes:
+            dists = self._distances(node, self.bounds(node))
+            edges[node] = {n: dists[n] for n in nodes
+                           if n != node and n in dists}
+        self._intra[cluster] = edges
+        return edges
+
+    def _entrance_costs(self, pos):
+        """
+        The distances from pos to the entrances of its cluster
+        and to the other cells of its cluster.
+        """
+        cluster = self.cluster(pos)
+        dists = self._distances(pos, self.bounds(pos))
+        costs = {n: dists[n] for n in self._nodes[cluster]
+                 if n in dists and n != pos}
+        return (costs, dists)
+
+    def neighbors(self, node):
+        """
+        The nodes connected to an entrance node, with their costs.
+
+        :rtype: dict
+        """
+        edges = dict(self._inter.get(node, {}))
+        edges.update(self._cluster_edges(self.cluster(node)).get(node, {}))
+        return edges
+
+    def route(self, start, end):
+        """
+        A coarse route from start to end through the entrances.
+
+        :param tuple start: (y, x) start position.
+        :param tuple end: (y, x) goal position.
+        :returns: The waypoints from start to end, or
+                  None if end cannot be reached.
+        :rtype: list
+        """
+        (start_costs, start_dists) = self._entrance_costs(start)
+        # The distances are symmetric, so these are the costs
+        # from the entrances of the goal's cluster to the goal.
+        (end_costs, _) = self._entrance_costs(end)
+        frontier = [(distance(start, end), 0, start)]
+        came_from = {start: None}
+        costs = {start: 0}
+        while frontier:
+            (_, cost, current) = heapq.heappop(frontier)
+            if current == end:
+                break
+            if cost > costs[current]:
+                continue
+            edges = self.neighbors(current)
+            if current == start:
+                edges.update(start_costs)
+                if end in start_dists:
+                    edges[end] = start_dists[end]
+            if current in end_costs:
+                edges[end] = end_costs[current]
+            for (n, step) in edges.items():
+                new_cost = cost + step
+                if new_cost < costs.get(n, float("inf")):
+                    costs[n] = new_cost
+                    came_from[n] = current
+                    priority = new_cost + distance(n, end)
+                    heapq.heappush(frontier, (priority, new_cost, n))
+        if end not in came_from:
+            return None
+        route = [end]
+        while came_from[route[-1]] is not None:
+            route.append(came_from[route[-1]])
+        return route[::-1]
+
+
+def abstract_graph(grid, cluster_size=CLUSTER_SIZE):
+    """
+    The AbstractGraph of a grid's walls. Graphs are cached, so grids
+    with the same walls, e.g. loaded from the same map, share one.
+
+    :param Grid grid: The grid.
+    :param int cluster_size: The side length of a cluster.
+    :rtype: AbstractGraph
+    """
+    try:
+        (version, graph) = _graph_by_grid[grid]
+        if (version == grid._static_version and
+                graph.cluster_size == cluster_size):
+            return graph
+    except KeyError:
+        pass
+    walls = grid.static_mask()
+    key = (hashlib.sha1(walls.tobytes()).hexdigest(),
+           walls.shape, cluster_size)
+    graph = _graphs.get(key)
+    if graph is None:
+        graph = AbstractGraph(walls, cluster_size=cluster_size)
+        if len(_graphs) >= _MAX_CACHED:
+            del _graphs[next(iter(_graphs))]
+        _graphs[key] = graph
+    _graph_by_grid[grid] = (grid._static_version, graph)
+    return graph
+
+
+def _local_path(start, goal, adj_matrix, bounds, adjacent=False):
+    """
+    A* from start to goal without leaving bounds.
+
+    :param bool adjacent: Stop next to goal rather than on it.
+    :returns: The path, or None if there is none within bounds.
+    """
+    (y0, x0, y1, x1) = bounds
+    frontier = [(distance(start, goal), 0, start)]
+    came_from = {start: None}
+    costs = {start: 0}
+    while frontier:
+        (_, cost, current) = heapq.heappop(frontier)
+        if current == goal or (adjacent and distance(current, goal) == 1):
+            path = [current]
+            while came_from[path[-1]] is not None:
+                path.append(came_from[path[-1]])
+            return path[::-1]
+        if cost > costs[current]:
+            continue
+        for n in adj_matrix[current]:
+            if not (y0 <= n[0] < y1 and x0 <= n[1] < x1):
+                continue
+            if cost + 1 < costs.get(n, float("inf")):
+                costs[n] = cost + 1
+                came_from[n] = current
+                priority = cost + 1 + distance(n, goal)
+                heapq.heappush(frontier, (priority, cost + 1, n))
+    return None
+
+
+def hpa_star(start, end, adj_matrix, moves=-1):
+    """
+    Hierarchical A* pathfinding, with the same interface as
+    astar.astar(). A coarse route is planned through the entrances
+    between clusters of walls, and only the first moves steps of it
+    are refined on the grid, around any tokens in the way. If the
+    tokens block the route, falls back to astar.astar().
+
+    :param tuple start: (y, x) start position.
+    :param tuple end: (y, x) goal position.
+    :param Adjacency adj_matrix: The grid's adjacency, from
+        Grid.to_adjacency(). Plain adjacency dicts are passed
+        on to astar.astar().
+    :param int moves: number of grid spaces to move towards end.
+                      If -1, returns the entire path.
+    :returns: The path from start towards end.
+    :rtype: list
+    """
+    moves = int(moves)
+    grid = getattr(adj_matrix, "grid", None)
+    if grid is None or distance(start, end) <= 1:
+        return astar(start, end, adj_matrix, moves=moves)
+    graph = abstract_graph(grid)
+    route = graph.route(start, end)
+    if route is None:
+        return astar(start, end, adj_matrix, moves=moves)
+
+    path = [start]
+    i = 1
+    while i < len(route) and (moves == -1 or len(path) <= moves):
+        current = path[-1]
+        segment = _local_path(current, route[i], adj_matrix,
+                              graph.bounds(current, route[i]),
+                              adjacent=route[i] == end)
+        if segment is None:
+            # Something is in the way. Look for a way around it
+            # to the next waypoint instead.
+            i = min(i + 1, len(route) - 1)
+            segment = _local_path(current, route[i], adj_matrix,
+                                  graph.bounds(current, route[i], margin=1),
+                                  adjacent=route[i] == end)
+            if segment is None:
+                return astar(start, end, adj_matrix, moves=moves)
+        path.extend(segment[1:])
+        i += 1
+    if moves == -1:
+        return path
+    return path[:min(len(path) - 1, moves) + 1]
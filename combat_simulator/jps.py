@@ -0,0 +1,197 @@
+import heapq
+import numpy as np
+
+from .astar import astar, distance
+
+
+_HORIZONTAL = ((0, -1), (0, 1))
+_VERTICAL = ((-1, 0), (1, 0))
+# Horizontal jumps step this many cells before scanning the rest of
+# the row, which only pays off when there is no obstacle nearby.
+_SHORT_JUMP = 8
+
+
+class JumpPointSearch(object):
+    """
+    Jump Point Search on a 4-connected grid with uniform move costs.
+
+    Of all the shortest paths between two cells, only those that move
+    vertically first are searched: horizontal moves only turn vertical
+    where a wall or token forces them to, and every cell along a
+    vertical move may turn horizontal. The search jumps straight along
+    these moves, and only adds cells where the path may turn (jump
+    points) to the open list, so open areas are crossed without
+    expanding every cell.
+
+    :param Grid grid: The grid. Walls and tokens are obstacles.
+    :param tuple end: (y, x) goal position. Paths end next to it.
+    """
+
+    def __init__(self, grid, end):
+        self.occupied = grid._grid
+        (self.ny, self.nx) = grid.shape
+        self.end = end
+        self.expanded = 0
+
+    def _free(self, pos):
+        (y, x) = pos
+        return (0 <= y < self.ny and 0 <= x < self.nx and
+                self.occupied[pos] == 0)
+
+    def _is_goal(self, pos):
+        return distance(pos, self.end) == 1
+
+    def _jump_horizontal(self, pos, dx):
+        (y, x) = pos
+        for _ in range(_SHORT_JUMP):
+            x += dx
+            if not self._free((y, x)):
+                return None
+            if self._is_goal((y, x)):
+                return (y, x)
+            for dy in (-1, 1):
+                # A forced turn: the way up or down was
+                # blocked one step back but is open here.
+                if (self._free((y + dy, x)) and
+                        not self._free((y + dy, x - dx))):
+                    return (y, x)
+        return self._scan_horizontal((y, x), dx)
+
+    def _scan_horizontal(self, pos, dx):
+        # The same as _jump_horizontal, but scans the rest of the row
+        # with numpy, as every step of a vertical jump scans two rows.
+        (y, x) = pos
+        if dx == 1:
+            ahead = slice(x + 1, self.nx)
+            behind = slice(x, self.nx - 1)
+        else:
+            ahead = slice(x - 1, None, -1) if x > 0 else slice(0, 0)
+            behind = slice(x, 0, -1)
+        blocked = np.flatnonzero(self.occupied[y, ahead])
+        # The number of free cells ahead.
+        free = blocked[0] if len(blocked) > 0 else len(range(self.nx)[ahead])
+        steps = free + 1
+        for dy in (-1, 1):
+            if not 0 <= y + dy < self.ny:
+                continue
+            row = self.occupied[y + dy]
+            forced = np.flatnonzero((row[ahead] == 0) & (row[behind] != 0))
+            if len(forced) > 0:
+                steps = min(steps, forced[0] + 1)
+        (ey, ex) = self.end
+        if abs(ey - y) <= 1:
+            for gx in ([ex - 1, ex + 1] if ey == y else [ex]):
+                if 0 < (gx - x) * dx < steps:
+                    steps = (gx - x) * dx
+        if steps > free:
+            return None
+        return (y, x + dx * int(steps))
+
+    def _jump_vertical(self, pos, dy):
+        (y, x) = pos
+        while True:
+            y += dy
+            if not self._free((y, x)):
+                return None
+            if self._is_goal((y, x)):
+                return (y, x)
+            for dx in (-1, 1):
+                if self._jump_horizontal((y, x), dx) is not None:
+                    return (y, x)
+
+    def _successors(self, pos, direction):
+        """
+        The jump points reachable from pos, having arrived moving
+        in direction, or None for the start position.
+        """
+        if direction is None:
+            directions = _HORIZONTAL + _VERTICAL
+        elif direction[0] == 0:
+            # Horizontal moves continue, or turn where forced.
+            (y, x) = pos
+            dx = direction[1]
+            directions = [direction]
+            for dy in (-1, 1):
+                if (self._free((y + dy, x)) and
+                        not self._free((y + dy, x - dx))):
+                    directions.append((dy, 0))
+        else:
+            directions = [direction] + list(_HORIZONTAL)
+        for (dy, dx) in directions:
+            if dy == 0:
+                jump_point = self._jump_horizontal(pos, dx)
+            else:
+                jump_point = self._jump_vertical(pos, dy)
+            if jump_point is not None:
+                yield (jump_point, (dy, dx))
+
+    def search(self, start):
+        """
+        :param tuple start: (y, x) start position.
+        :returns: The shortest path from start to a cell next to the
+                  goal, or None if there is none.
+        :rtype: list
+        """
+        if self._is_goal(start):
+            return [start]
+        frontier = [(distance(start, self.end), 0, start, None)]
+        came_from = {start: None}
+        costs = {start: 0}
+        while frontier:
+            (_, cost, current, direction) = heapq.heappop(frontier)
+            if cost > costs[current]:
+                continue
+            self.expanded += 1
+            if self._is_goal(current):
+                return self._path(current, came_from)
+            for (n, n_direction) in self._successors(current, direction):
+                new_cost = cost + distance(current, n)
+                if new_cost < costs.get(n, float("inf")):
+                    costs[n] = new_cost
+                    came_from[n] = current
+                    priority = new_cost + distance(n, self.end) - 1
+                    heapq.heappush(frontier,
+                                   (priority, new_cost, n, n_direction))
+        return None
+
+    def _path(self, jump_point, came_from):
+        # Fill in the straight lines between jump points.
+        path = [jump_point]
+        while came_from[jump_point] is not None:
+            previous = came_from[jump_point]
+            (y, x) = jump_point
+            dy = (previous[0] > y) - (previous[0] < y)
+            dx = (previous[1] > x) - (previous[1] < x)
+            while (y, x) != previous:
+                (y, x) = (y + dy, x + dx)
+                path.append((y, x))
+            jump_point = previous
+        return path[::-1]
+
+
+def jps(start, end, adj_matrix, moves=-1):
+    """
+    Jump Point Search pathfinding, with the same interface as
+    astar.astar(). Finds a shortest path. If there is no path
+    to end, falls back to astar.astar().
+
+    :param tuple start: (y, x) start position.
+    :param tuple end: (y, x) goal position.
+    :param Adjacency adj_matrix: The grid's adjacency, from
+        Grid.to_adjacency(). Plain adjacency dicts are passed
+        on to astar.astar().
+    :param int moves: number of grid spaces to move towards end.
+                      If -1, returns the entire path.
+    :returns: The path from start towards end.
+    :rtype: list
+    """
+    moves = int(moves)
+    grid = getattr(adj_matrix, "grid", None)
+    if grid is None:
+        return astar(start, end, adj_matrix, moves=moves)
+    path = JumpPointSearch(grid, end).search(start)
+    if path is None:
+        return astar(start, end, adj_matrix, moves=moves)
+    if moves == -1:
+        return path
+    return path[:min(len(path) - 1, moves) + 1]
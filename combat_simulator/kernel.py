@@ -0,0 +1,316 @@
+"""
+A combat kernel over flat arrays, for running many encounters quickly.
+The turn loop is the same as Encounter.run_combat(), but characters
+walk down a breadth first distance field from their target rather than
+use a pathfinder, and hold position rather than retarget when it can't
+be reached. Results agree with the Engine statistically, not roll for
+roll.
+
+Backends:
+  * numba: The whole turn loop compiled with Numba, if it is installed.
+  * numpy: The turn loop in Python, with NumPy distance fields and
+           target selection.
+  * python: The turn loop and helpers in plain Python. This is the
+            code the numba backend compiles.
+"""
+
+import numpy as np
+
+from .results import Results
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+_UNREACHABLE = np.iinfo(np.int64).max
+# Stop encounters in which neither side can reach the other.
+MAX_ROUNDS = 1000
+
+
+def _distance_field(occupied, target, field, stop):
+    """
+    Breadth first search distances from target around the occupied
+    cells, up to the stop cell. Cells further away than stop are
+    left unreachable.
+
+    :param numpy.ndarray occupied: True where cells are blocked.
+    :param numpy.ndarray target: (y, x) position.
+    :param numpy.ndarray field: Filled in with the distances.
+    :param numpy.ndarray stop: (y, x) position.
+    :returns: Whether stop can be reached.
+    :rtype: bool
+    """
+    (ny, nx) = occupied.shape
+    field[:, :] = _UNREACHABLE
+    queue = np.empty(ny * nx, dtype=np.int64)
+    field[target[0], target[1]] = 0
+    queue[0] = target[0] * nx + target[1]
+    (head, tail) = (0, 1)
+    while head < tail:
+        y = queue[head] // nx
+        x = queue[head] % nx
+        head += 1
+        for (dy, dx) in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            (y2, x2) = (y + dy, x + dx)
+            if (0 <= y2 < ny and 0 <= x2 < nx and not occupied[y2, x2] and
+                    field[y2, x2] == _UNREACHABLE):
+                field[y2, x2] = field[y, x] + 1
+                if y2 == stop[0] and x2 == stop[1]:
+                    return True
+                queue[tail] = y2 * nx + x2
+                tail += 1
+    return False
+
+
+def _distance_field_numpy(occupied, target, field, stop):
+    field[:, :] = _UNREACHABLE
+    field[target[0], target[1]] = 0
+    frontier = np.zeros(occupied.shape, dtype=bool)
+    frontier[target[0], target[1]] = True
+    free = ~occupied
+    dist = 0
+    while frontier.any():
+        dist += 1
+        grown = np.zeros_like(frontier)
+        grown[1:, :] |= frontier[:-1, :]
+        grown[:-1, :] |= frontier[1:, :]
+        grown[:, 1:] |= frontier[:, :-1]
+        grown[:, :-1] |= frontier[:, 1:]
+        frontier = grown & free & (field == _UNREACHABLE)
+        field[frontier] = dist
+        if frontier[stop[0], stop[1]]:
+            return True
+    return False
+
+
+def _closest_enemies(pos, team, alive, goals):
+    """
+    The closest living enemy of each character by Manhattan
+    distance, or -1 if it has none. Ties go to the lowest index,
+    as in EntityRegistry.closest_enemies().
+    """
+    n = len(team)
+    for i in range(n):
+        goals[i] = -1
+        best = _UNREACHABLE
+        for j in range(n):
+            if alive[j] and team[j] != team[i]:
+                d = abs(pos[i, 0] - pos[j, 0]) + abs(pos[i, 1] - pos[j, 1])
+                if d < best:
+                    best = d
+                    goals[i] = j
+
+
+def _closest_enemies_numpy(pos, team, alive, goals):
+    dists = np.abs(pos[:, None, :] - pos[None, :, :]).sum(-1)
+    is_enemy = (team[:, None] != team[None, :]) & alive[None, :]
+    dists = np.where(is_enemy, dists, _UNREACHABLE)
+    goals[:] = dists.argmin(axis=1)
+    goals[~is_enemy.any(axis=1)] = -1
+
+
+def _make_kernel(distance_field, closest_enemies, jit=None):
+    """
+    Build the turn loop around the given helpers,
+    compiled with jit if it is not None.
+    """
+
+    def move(i, field, occupied, pos, moves, goal):
+        # Walk down the distance field from the goal towards it.
+        (ny, nx) = occupied.shape
+        for _ in range(moves):
+            (y, x) = (pos[i, 0], pos[i, 1])
+            if abs(y - pos[goal, 0]) + abs(x - pos[goal, 1]) <= 1:
+                return
+            (best, by, bx) = (field[y, x], -1, -1)
+            for (dy, dx) in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+                (y2, x2) = (y + dy, x + dx)
+                if (0 <= y2 < ny and 0 <= x2 < nx and
+                        not occupied[y2, x2] and field[y2, x2] < best):
+                    (best, by, bx) = (field[y2, x2], y2, x2)
+            if by == -1:
+                return
+            occupied[y, x] = False
+            occupied[by, bx] = True
+            pos[i, 0] = by
+            pos[i, 1] = bx
+
+    def attack_damage(i, ac, has_attack, atk_bonus,
+                      dice_n, dice_d, dmg_bonus):
+        # Returns (hit, damage) of one of the attacks of
+        # Encounter._fight().
+        if not has_attack[i]:
+            return (False, 0)
+        roll = np.random.randint(1, 21)
+        if roll != 20 and roll + atk_bonus[i] < ac:
+            return (False, 0)
+        crit = 2 if roll == 20 else 1
+        dmg = dmg_bonus[i]
+        for k in range(dice_n.shape[1]):
+            for _ in range(crit * dice_n[i, k]):
+                dmg += 1 if dice_d[i, k] == 1 else \
+                    np.random.randint(1, dice_d[i, k] + 1)
+        return (True, dmg)
+
+    def combat(occupied, pos, hp, active, team, ac, moves, num_attacks,
+               has_attack, atk_bonus, dice_n, dice_d, dmg_bonus, init_mod,
+               seed, max_rounds):
+        np.random.seed(seed)
+        n = len(hp)
+        field = np.empty(occupied.shape, dtype=np.int64)
+        attacks = np.zeros(n, dtype=np.int64)
+        hits = np.zeros(n, dtype=np.int64)
+        dmg = np.zeros(n, dtype=np.int64)
+        alive = active & (hp > 0)
+        init = np.zeros(n, dtype=np.int64)
+        for i in range(n):
+            init[i] = np.random.randint(1, 21) + init_mod[i]
+        order = np.argsort(-init, kind="mergesort")
+        goals = np.empty(n, dtype=np.int64)
+        closest_enemies(pos, team, alive, goals)
+        winner = -1
+        rounds = 0
+        while winner == -1 and rounds < max_rounds:
+            for i in order:
+                if not alive[i] or goals[i] == -1:
+                    continue
+                g = goals[i]
+                # Hold position if the goal can't be reached.
+                occupied[pos[i, 0], pos[i, 1]] = False
+                reachable = distance_field(occupied, pos[g], field, pos[i])
+                occupied[pos[i, 0], pos[i, 1]] = True
+                if reachable:
+                    move(i, field, occupied, pos, moves[i], g)
+                if abs(pos[i, 0] - pos[g, 0]) + abs(pos[i, 1] - pos[g, 1]) != 1:  # noqa
+                    continue
+                # Attacks after the goal drops are not made.
+                for _ in range(num_attacks[i]):
+                    (hit, d) = attack_damage(i, ac[g], has_attack, atk_bonus,
+                                             dice_n, dice_d, dmg_bonus)
+                    attacks[i] += 1
+                    if hit:
+                        hits[i] += 1
+                        dmg[i] += d
+                        hp[g] -= d
+                    if hp[g] <= 0:
+                        break
+                if hp[g] <= 0:
+                    alive[g] = False
+                    occupied[pos[g, 0], pos[g, 1]] = False
+                    closest_enemies(pos, team, alive, goals)
+                    if goals[i] == -1:
+                        winner = team[i]
+                        break
+            rounds += 1
+        return (winner, rounds, attacks, hits, dmg)
+
+    if jit is not None:
+        (move, attack_damage, combat) = (jit(move), jit(attack_damage),
+                                         jit(combat))
+    return combat
+
+
+_KERNELS = {"python": _make_kernel(_distance_field, _closest_enemies),
+            "numpy": _make_kernel(_distance_field_numpy,
+                                  _closest_enemies_numpy)}
+if numba is not None:
+    _KERNELS["numba"] = _make_kernel(numba.njit(_distance_field),
+                                     numba.njit(_closest_enemies),
+                                     jit=numba.njit)
+
+BACKENDS = sorted(_KERNELS)
+
+
+def default_backend():
+    return "numba" if "numba" in _KERNELS else "numpy"
+
+
+def pack_characters(registry):
+    """
+    The flat arrays of character statistics used by the kernel.
+
+    :param EntityRegistry registry: The characters.
+    :rtype: dict
+    """
+    attacks = [c.get_attack() for c in registry.entities]
+    num_dice = max([len(a.dmg_rolls) for a in attacks if a is not None] +
+                   [1])
+    dice_n = np.zeros((len(registry), num_dice), dtype=np.int64)
+    dice_d = np.ones((len(registry), num_dice), dtype=np.int64)
+    for (i, atk) in enumerate(attacks):
+        for (k, (d, n)) in enumerate(atk.dmg_rolls if atk else []):
+            (dice_n[i, k], dice_d[i, k]) = (n, d)
+    return {
+        "team": registry.team.astype(np.int64),
+        "ac": np.array([c.ac for c in registry.entities], dtype=np.int64),
+        # Minimum 5ft of movement, as in Player._find_best_position().
+        "moves": np.array([max(c.speed // 5, 1) for c in registry.entities],
+                          dtype=np.int64),
+        "num_attacks": np.array([c.num_attacks for c in registry.entities],
+                                dtype=np.int64),
+        "has_attack": np.array([a is not None for a in attacks]),
+        "atk_bonus": np.array([a.atk_bonus if a else 0 for a in attacks],
+                              dtype=np.int64),
+        "dice_n": dice_n,
+        "dice_d": dice_d,
+        "dmg_bonus": np.array([a.dmg_bonus if a else 0 for a in attacks],
+                              dtype=np.int64),
+        "init_mod": np.array([c.ability_modifier["dex"]
+                              for c in registry.entities], dtype=np.int64)}
+
+
+def run(engine, num_encounters=10, backend=None, results=None,
+        max_rounds=MAX_ROUNDS):
+    """
+    Run a number of encounters between the Engine's teams with the
+    combat kernel. Characters are placed, and carry their hit points
+    over between encounters, as in Engine.run().
+
+    :param Engine engine: The engine with the teams and grid.
+    :param int num_encounters: The number of encounters to run.
+    :param str backend: One of BACKENDS. Defaults to numba if it
+                        is installed, otherwise numpy.
+    :param Results results: (Optional) Existing results to add to.
+    :param int max_rounds: Encounters that last longer are stopped,
+                           and counted as draws.
+    :returns: The aggregated results.
+    :rtype: Results
+    """
+    if backend is None:
+        backend = default_backend()
+    if backend not in _KERNELS:
+        raise ValueError(f"Unknown kernel backend '{backend}'. Available backends are {BACKENDS}.")  # noqa
+    kernel = _KERNELS[backend]
+    registry = engine.registry
+    stats = pack_characters(registry)
+    if results is None:
+        results = Results(team_names=[t.name for t in engine.teams])
+    for _ in range(num_encounters):
+        # Places the characters, without starting an Encounter.
+        engine.grid.clear_tokens()
+        for (i, team) in enumerate(engine.teams):
+            for character in team.members():
+                if not character.is_alive:
+                    character.reset()
+                if engine.grid.add_token(character, team=i+1) is False:
+                    team.rm_member(character)
+        active = np.zeros(len(registry), dtype=bool)
+        active[[c.eid for t in engine.teams for c in t.members()]] = True
+        registry.sync(engine.grid)
+        occupied = engine.grid._grid != 0
+        pos = registry.pos.astype(np.int64)
+        hp = registry.hp.astype(np.int64)
+        seed = np.random.randint(2**31)
+        (winner, rounds, attacks, hits, dmg) = kernel(
+            occupied, pos, hp, active, seed=seed,
+            max_rounds=max_rounds, **stats)
+        for eid in np.flatnonzero(active):
+            registry[eid].HP = int(hp[eid])
+        registry.hp[:] = hp
+        registry.pos[:] = pos
+        results.add_counts(engine.teams, registry,
+                           None if winner == -1 else registry.teams[winner],
+                           rounds, (attacks, hits, dmg))
+    return results
@@ -0,0 +1,177 @@
+import json
+import struct
+import numpy as np
+
+
+MAGIC = b"DNDMAP\x00\x00"
+VERSION = 1
+_ALIGN = 64
+
+# Cell codes. Other tokens are stored as the code point
+# of their (printable ASCII) icon.
+FLOOR = 0
+WALL = 1
+START = 16  # START + n is the start position of team n.
+
+_LEGACY_ICONS = {'.': FLOOR, '#': WALL, '1': START + 1, '2': START + 2}
+
+
+# Cell code to icon. Codes without an icon, including the
+# start positions of teams 3 and up, are shown as '?'.
+_ICONS = np.full(256, '?', dtype="<U1")
+_ICONS[32:127] = [chr(code) for code in range(32, 127)]
+for (_icon, _code) in _LEGACY_ICONS.items():
+    _ICONS[_code] = _icon
+
+
+def matrix_to_codes(map_matrix):
+    """
+    Convert a map matrix of icons, as saved by older versions of
+    map_maker.py, to cell codes.
+
+    :param numpy.ndarray map_matrix: Matrix of single character icons.
+    :returns: Matrix of cell codes.
+    :rtype: numpy.ndarray
+    """
+    codes = np.zeros(map_matrix.shape, dtype=np.uint8)
+    for icon in np.unique(map_matrix):
+        try:
+            code = _LEGACY_ICONS[icon]
+        except KeyError:
+            if len(icon) != 1 or not 32 <= ord(icon) < 127:
+                raise ValueError(f"Unsupported map icon '{icon}'.")
+            code = ord(icon)
+        codes[map_matrix == icon] = code
+    return codes
+
+
+def codes_to_matrix(codes):
+    """
+    Convert cell codes to a map matrix of icons.
+
+    :param numpy.ndarray codes: Matrix of cell codes.
+    :returns: Matrix of single character icons.
+    :rtype: numpy.ndarray
+    """
+    return _ICONS[np.asarray(codes)]
+
+
+def grid_to_codes(grid):
+    """
+    The cell codes of a Grid's walls, tokens and start positions.
+
+    :param Grid grid: The grid.
+    :rtype: numpy.ndarray
+    """
+    matrix = np.full(grid.shape, '.', dtype="<U1")
+    matrix[grid._walls] = '#'
+    for (pos, tok) in grid._pos2tok.items():
+        matrix[pos] = tok.icon
+    return matrix_to_codes(matrix)
+
+
+class MapFile(object):
+    """
+    A map loaded with load_map(). The layers are memory mapped,
+    so nothing is read from disk until it is used.
+
+    :param str filename: The map file.
+    :param dict header: The map file's header.
+    """
+
+    def __init__(self, filename, header):
+        self.filename = filename
+        self.version = header["version"]
+        self.shape = tuple(header["shape"])
+        self.layers = {}
+        for (name, layer) in header["layers"].items():
+            self.layers[name] = np.memmap(filename, mode='r',
+                                          dtype=layer["dtype"],
+                                          offset=layer["offset"],
+                                          shape=tuple(layer["shape"]))
+
+    @property
+    def cells(self):
+        """
+        The uint8 cell code layer.
+        """
+        return self.layers["cells"]
+
+
+def save_map(filename, codes, layers=None):
+    """
+    Save a map in the binary map format: a fixed size preamble, a JSON
+    header describing each layer, then the layers, each aligned to 64 bytes.
+
+    :param str filename: Where to save the map.
+    :param numpy.ndarray codes: Matrix of uint8 cell codes.
+    :param dict layers: (Optional) Additional precomputed arrays to save,
+                        e.g. distance fields. Keyed by layer name.
+    """
+    codes = np.asarray(codes)
+    if codes.dtype != np.uint8:
+        raise ValueError("codes must have dtype uint8.")
+    all_layers = {"cells": codes}
+    all_layers.update(layers or {})
+
+    def _header(offset):
+        layer_info = {}
+        for (name, array) in all_layers.items():
+            offset = -(-offset // _ALIGN) * _ALIGN
+            layer_info[name] = {"offset": offset, "dtype": array.dtype.str,
+                                "shape": list(array.shape)}
+            offset += array.nbytes
+        return {"version": VERSION, "shape": list(codes.shape),
+                "layers": layer_info}
+
+    # The layer offsets depend on the header size, which depends on
+    # the offsets. Reserve space for the header, padded generously.
+    preamble_size = len(MAGIC) + 4
+    header_size = len(json.dumps(_header(0)).encode("utf-8")) + 64
+    header = _header(preamble_size + header_size)
+    encoded = json.dumps(header).encode("utf-8").ljust(header_size)
+    with open(filename, "wb") as outF:
+        outF.write(MAGIC + struct.pack("<I", header_size) + encoded)
+        for (name, info) in header["layers"].items():
+            outF.write(b'\x00' * (info["offset"] - outF.tell()))
+            outF.write(np.ascontiguousarray(all_layers[name]).tobytes())
+
+
+def is_map_file(filename):
+    """
+    Whether filename is in the binary map format.
+    """
+    with open(filename, "rb") as inF:
+        return inF.read(len(MAGIC)) == MAGIC
+
+
+def load_map(filename):
+    """
+    Load a map saved with save_map(). Only the header is read;
+    the layers are memory mapped.
+
+    :param str filename: The map file.
+    :rtype: MapFile
+    """
+    with open(filename, "rb") as inF:
+        if inF.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{filename} is not a map file.")
+        (header_size,) = struct.unpack("<I", inF.read(4))
+        header = json.loads(inF.read(header_size).decode("utf-8"))
+    if header["version"] > VERSION:
+        raise ValueError(f"Unsupported map version {header['version']}.")
+    return MapFile(filename, header)
+
+
+def convert_npy(infile, outfile):
+    """
+    Convert between the older .npy icon matrices and the
+    binary map format, depending on the format of infile.
+
+    :param str infile: The map to convert.
+    :param str outfile: Where to save the converted map.
+    """
+    if is_map_file(infile):
+        np.save(outfile, codes_to_matrix(load_map(infile).cells))
+    else:
+        save_map(outfile, matrix_to_codes(np.load(infile)))
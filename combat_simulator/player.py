@@ -1,5 +1,15 @@
-from .dice import roll_die
+import numpy as np
+
+from .dice import roll_die, roll_dice, roll_dice_sums
 from .astar import astar
+from .hpa import hpa_star
+from .jps import jps
+from .dstar import dstar_lite
+
+
+# Pathfinders by name, for command line options.
+PATHFINDERS = {"astar": astar, "hpa": hpa_star, "jps": jps,
+               "dstar": dstar_lite}
 
 
 class Player(object):
@@ -9,10 +19,13 @@ class Player(object):
     e.g. their movement and position, rolls, attacking, etc.
 
     :param Character character: This player's character.
+    :param function pathfinder: (Optional) Finds paths on the grid.
+        Takes the same arguments as astar.astar(), which is the default.
     """
 
-    def __init__(self, name="Default"):
+    def __init__(self, name="Default", pathfinder=astar):
         self.name = name
+        self.pathfinder = pathfinder
 
     def __str__(self):
         return self.name
@@ -84,6 +97,48 @@ class Player(object):
             total_roll += roll_die(d=d, n=n)
         return (total_roll, atk.dmg_bonus)
 
+    def roll_attacks(self, character, attack=None, num_attacks=None,
+                     advantage=0):
+        """
+        All the attack rolls of a turn at once.
+
+        :param Character character: The character to control.
+        :param (Attack, str) attack: The attack to use. If None,
+                                     use the default attack.
+        :param int num_attacks: The number of attacks. If None,
+                                use the character's num_attacks.
+        :param int advantage: 1=advantage, -1=disadvantage, 0=neither.
+        :returns: The attack rolls and the attack bonus.
+        :rtype: (numpy.ndarray, int)
+        """
+        if num_attacks is None:
+            num_attacks = character.num_attacks
+        atk = character.get_attack(attack)
+        if atk is None:
+            return (np.zeros(num_attacks, dtype=np.int64), 0)
+        rolls = roll_dice(d=20, num=num_attacks, advantage=advantage)
+        return (rolls, atk.atk_bonus)
+
+    def roll_damages(self, character, attack=None, crits=()):
+        """
+        The damage rolls of several hits at once.
+
+        :param Character character: The character to control.
+        :param (Attack, str) attack: The attack to use. If None,
+                                     use the default attack.
+        :param list crits: Whether each hit is a critical hit.
+        :returns: The damage roll of each hit and the damage bonus.
+        :rtype: (numpy.ndarray, int)
+        """
+        crits = np.asarray(crits, dtype=bool)
+        atk = character.get_attack(attack)
+        total_rolls = np.zeros(len(crits), dtype=np.int64)
+        if atk is None:
+            return (total_rolls, 0)
+        for (d, n) in atk.dmg_rolls:
+            total_rolls += roll_dice_sums(d, np.where(crits, 2 * n, n))
+        return (total_rolls, atk.dmg_bonus)
+
     def choose_attack(self, character, target=None):
         """
         Choose the best attack for the given target.
@@ -108,12 +163,16 @@ class Player(object):
         """
         pos = grid[character]
         goal_pos = grid[character.goal]
+        # Hold position rather than search for a way to
+        # a goal that can't be reached.
+        if not grid.reachable(pos, goal_pos):
+            return pos
         adj = grid.to_adjacency()
         num_moves = character.speed // 5
         # Minimum 5ft of movement.
         if num_moves == 0:
             num_moves = 1
-        path = astar(pos, goal_pos, adj, moves=num_moves)
+        path = self.pathfinder(pos, goal_pos, adj, moves=num_moves)
         new_pos = path[-1]
         return new_pos
 
@@ -0,0 +1,81 @@
+import numpy as np
+
+
+class EntityRegistry(object):
+    """
+    Dense integer ids for the characters of an engine or encounter,
+    given in team order. The team, hit points and position of each
+    character are kept in numpy arrays indexed by id, and each
+    character's id is stored as its eid attribute.
+
+    :param list teams: A list of Team instances.
+    """
+
+    def __init__(self, teams):
+        self.teams = list(teams)
+        self.entities = [c for team in self.teams for c in team.members()]
+        self.names = [c.name for c in self.entities]
+        self.team = np.array([t for (t, team) in enumerate(self.teams)
+                              for _ in team.members()], dtype=np.int32)
+        self.hp = np.zeros(len(self.entities), dtype=np.int32)
+        self.pos = np.full((len(self.entities), 2), -1, dtype=np.int32)
+        self.claim()
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __getitem__(self, eid):
+        return self.entities[eid]
+
+    def claim(self):
+        """
+        Set the eid attribute of each character to its id
+        in this registry, in case another registry set it.
+        """
+        for (eid, character) in enumerate(self.entities):
+            character.eid = eid
+
+    def ids(self, name):
+        """
+        The ids of the characters with the given name.
+
+        :param str name: The character name.
+        :rtype: list(int)
+        """
+        return [eid for (eid, n) in enumerate(self.names) if n == name]
+
+    def get_team(self, character):
+        """
+        :param Character character: A registered character.
+        :rtype: Team
+        """
+        return self.teams[self.team[character.eid]]
+
+    def sync(self, grid):
+        """
+        Copy the characters' hit points and positions into the arrays.
+        Characters that are not on the grid get position (-1, -1).
+
+        :param Grid grid: The grid the characters are on.
+        """
+        self.hp[:] = [c.HP for c in self.entities]
+        self.pos[:] = [grid._tok2pos.get(c, (-1, -1))
+                       for c in self.entities]
+
+    def closest_enemies(self, active):
+        """
+        The closest living enemy of each character,
+        by Manhattan distance. Ties go to the lowest id.
+
+        :param numpy.ndarray active: Which characters take part.
+        :returns: The id of each character's closest enemy,
+                  or -1 if it has none.
+        :rtype: numpy.ndarray
+        """
+        alive = active & (self.hp > 0)
+        dists = np.abs(self.pos[:, None, :] - self.pos[None, :, :]).sum(-1)
+        is_enemy = (self.team[:, None] != self.team[None, :]) & alive[None, :]
+        dists = np.where(is_enemy, dists, np.iinfo(np.int32).max)
+        closest = dists.argmin(axis=1)
+        closest[~is_enemy.any(axis=1)] = -1
+        return closest
@@ -0,0 +1,216 @@
+import struct
+import numpy as np
+
+
+MAGIC = b"DNDREPLAY"
+VERSION = 1
+
+# Event type: (code, struct format of the fixed size part)
+_EVENTS = {"grid": (b'G', "<HHI"),         # ny, nx, number of static tokens
+           "start": (b'S', "<IH"),         # encounter number, tokens
+           "initiative": (b'I', "<Hh"),    # token, initiative
+           "move": (b'M', "<HHH"),         # token, y, x
+           "attack": (b'A', "<HHBH"),      # attacker, victim, flags, dmg
+           "death": (b'D', "<H"),          # token
+           "round": (b'R', "<I"),          # rounds so far
+           "end": (b'E', "<B")}            # winning team number
+_CODES = {code: (name, struct.Struct(fmt))
+          for (name, (code, fmt)) in _EVENTS.items()}
+_HIT = 1
+_CRIT = 2
+
+
+def _pack_str(string):
+    data = string.encode("utf-8")[:255]
+    return struct.pack("<B", len(data)) + data
+
+
+def _read_str(inF):
+    (length,) = struct.unpack("<B", inF.read(1))
+    return inF.read(length).decode("utf-8")
+
+
+class ReplayRecorder(object):
+    """
+    Writes the events of encounters to a compact binary file.
+    Tokens are referred to by their index in the encounter's combatants.
+    Pass an instance to Encounter.run_combat() to record an encounter.
+
+    :param str outfile: Where to save the replay.
+    """
+
+    def __init__(self, outfile):
+        self._outF = open(outfile, "wb")
+        self._outF.write(MAGIC + struct.pack("<H", VERSION))
+        self._num_encounters = 0
+        self._grid_written = False
+        self._index = {}
+
+    def _write(self, event, *values):
+        (code, fmt) = _EVENTS[event]
+        self._outF.write(code + struct.pack(fmt, *values))
+
+    def _write_grid(self, grid, combatants):
+        # Walls and other tokens that are not combatants never
+        # move, so they are written once per file.
+        static = [(pos, tok.icon) for (pos, tok) in grid._pos2tok.items()
+                  if tok not in combatants]
+        static.extend((tuple(pos), '#')
+                      for pos in np.argwhere(grid._walls).tolist())
+        self._write("grid", grid.shape[0], grid.shape[1], len(static))
+        for ((y, x), icon) in static:
+            self._outF.write(struct.pack("<HH", y, x) + _pack_str(icon))
+        self._grid_written = True
+
+    def start(self, encounter):
+        """
+        Record the start of an encounter: the combatants,
+        their positions and initiative.
+        """
+        combatants = encounter.combatants
+        self._index = {c: i for (i, c) in enumerate(combatants)}
+        if self._grid_written is False:
+            self._write_grid(encounter.grid, self._index)
+        self._write("start", self._num_encounters, len(combatants))
+        self._num_encounters += 1
+        for character in combatants:
+            team = encounter.teams.index(encounter.get_team(character)) + 1
+            (y, x) = encounter.grid[character]
+            self._outF.write(struct.pack("<BHH", team, y, x) +
+                             _pack_str(character.icon) +
+                             _pack_str(character.name))
+        for (character, initiative) in encounter.turn_order:
+            self._write("initiative", self._index[character],
+                        int(initiative))
+
+    def move(self, character, pos):
+        self._write("move", self._index[character], *pos)
+
+    def attack(self, attacker, victim, hit, crit, dmg):
+        flags = (_HIT if hit else 0) | (_CRIT if crit else 0)
+        self._write("attack", self._index[attacker],
+                    self._index[victim], flags, int(dmg))
+
+    def death(self, character):
+        self._write("death", self._index[character])
+
+    def end_round(self, rounds):
+        self._write("round", rounds)
+
+    def end(self, encounter):
+        self._write("end", encounter.teams.index(encounter.winner) + 1)
+
+    def close(self):
+        self._outF.close()
+
+
+def read_events(infile):
+    """
+    Read the events of a replay file.
+
+    :param str infile: A file written by ReplayRecorder.
+    :returns: Generator over events. Each event is a tuple whose
+              first element is the event name.
+    """
+    with open(infile, "rb") as inF:
+        if inF.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{infile} is not a replay file.")
+        (version,) = struct.unpack("<H", inF.read(2))
+        if version != VERSION:
+            raise ValueError(f"Unsupported replay version {version}.")
+        while True:
+            code = inF.read(1)
+            if code == b'':
+                break
+            (name, fmt) = _CODES[code]
+            values = fmt.unpack(inF.read(fmt.size))
+            if name == "grid":
+                (ny, nx, num_static) = values
+                static = {}
+                for _ in range(num_static):
+                    pos = struct.unpack("<HH", inF.read(4))
+                    static[pos] = _read_str(inF)
+                yield ("grid", (ny, nx), static)
+            elif name == "start":
+                (encounter_num, num_tokens) = values
+                tokens = []
+                for _ in range(num_tokens):
+                    (team, y, x) = struct.unpack("<BHH", inF.read(5))
+                    icon = _read_str(inF)
+                    tok_name = _read_str(inF)
+                    tokens.append({"team": team, "pos": (y, x),
+                                   "icon": icon, "name": tok_name})
+                yield ("start", encounter_num, tokens)
+            elif name == "attack":
+                (attacker, victim, flags, dmg) = values
+                yield ("attack", attacker, victim,
+                       bool(flags & _HIT), bool(flags & _CRIT), dmg)
+            else:
+                yield (name, *values)
+
+
+class ReplayPlayer(object):
+    """
+    Reconstructs the grid from a replay file, without re-simulating.
+
+    :param str infile: A file written by ReplayRecorder.
+    """
+
+    def __init__(self, infile):
+        self.infile = infile
+        self.shape = None
+        self.static = {}
+
+    def frames(self, encounter_num=0):
+        """
+        The state of the grid after each round of an encounter.
+
+        :param int encounter_num: Which encounter in the file to replay.
+        :returns: Generator over (round, frame, messages), where frame is
+                  the {(y, x): icon} of all tokens on the grid and messages
+                  describe the round's attacks and deaths.
+        """
+        tokens = None
+        positions = {}
+        messages = []
+        for event in read_events(self.infile):
+            name = event[0]
+            if name == "grid":
+                (_, self.shape, self.static) = event
+                continue
+            if name == "start":
+                if tokens is not None:
+                    break
+                if event[1] == encounter_num:
+                    tokens = event[2]
+                    positions = {i: t["pos"] for (i, t) in enumerate(tokens)}
+                    yield (0, self._frame(tokens, positions), [])
+                continue
+            if tokens is None:
+                continue
+            if name == "move":
+                (_, tok, y, x) = event
+                positions[tok] = (y, x)
+            elif name == "attack":
+                (_, attacker, victim, hit, crit, dmg) = event
+                outcome = "crits" if crit else "hits" if hit else "misses"
+                msg = f"{tokens[attacker]['name']} {outcome} {tokens[victim]['name']}"  # noqa
+                if hit:
+                    msg += f" for {dmg}"
+                messages.append(msg)
+            elif name == "death":
+                messages.append(f"{tokens[event[1]]['name']} dies")
+                del positions[event[1]]
+            elif name == "round":
+                yield (event[1], self._frame(tokens, positions), messages)
+                messages = []
+            elif name == "end":
+                break
+        if tokens is None:
+            raise ValueError(f"No encounter {encounter_num} in replay.")
+
+    def _frame(self, tokens, positions):
+        frame = dict(self.static)
+        for (tok, pos) in positions.items():
+            frame[pos] = tokens[tok]["icon"]
+        return frame
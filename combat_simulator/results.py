@@ -0,0 +1,326 @@
+import numpy as np
+import pandas as pd
+from collections import defaultdict
+
+
+def _grow(array, size):
+    # Double the capacity of a buffer when it runs out.
+    if size <= len(array):
+        return array
+    grown = np.zeros((max(size, 2 * len(array)),) + array.shape[1:],
+                     dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class EncounterTable(object):
+    """
+    The statistics of each encounter, in growing NumPy arrays: the
+    winner and rounds of each encounter, and the attacks, hits and
+    damage of each attacker in it, as sparse (encounter, attacker)
+    entries.
+    """
+
+    def __init__(self):
+        self.num_encounters = 0
+        self.num_entries = 0
+        self.keys = []  # (attacker_name, attacker_id) of each column
+        self._columns = {}  # key: column
+        # Index in team_names, -1 if no team won.
+        self._winners = np.zeros(64, dtype=np.int32)
+        self._rounds = np.zeros(64, dtype=np.int64)
+        # encounter, column, attacks, hits, dmg
+        self._entries = np.zeros((256, 5), dtype=np.int64)
+
+    def __len__(self):
+        return self.num_encounters
+
+    @property
+    def winners(self):
+        return self._winners[:self.num_encounters]
+
+    @property
+    def rounds(self):
+        return self._rounds[:self.num_encounters]
+
+    @property
+    def entries(self):
+        return self._entries[:self.num_entries]
+
+    def columns(self, keys):
+        """
+        The columns of the given attacker keys, added if they are new.
+        """
+        for key in keys:
+            if key not in self._columns:
+                self._columns[key] = len(self.keys)
+                self.keys.append(key)
+        return np.array([self._columns[key] for key in keys], dtype=np.int64)
+
+    def add(self, winners, rounds, entries):
+        """
+        Add encounters.
+
+        :param numpy.ndarray winners: The index of the winning team
+                                      of each encounter.
+        :param numpy.ndarray rounds: The rounds of each encounter.
+        :param numpy.ndarray entries: (encounter, column, attacks, hits,
+            dmg) rows, with encounters counted from 0 for the first of
+            the encounters added.
+        """
+        (n, m) = (len(winners), len(entries))
+        self._winners = _grow(self._winners, self.num_encounters + n)
+        self._rounds = _grow(self._rounds, self.num_encounters + n)
+        self._entries = _grow(self._entries, self.num_entries + m)
+        self._winners[self.num_encounters:self.num_encounters + n] = winners
+        self._rounds[self.num_encounters:self.num_encounters + n] = rounds
+        new = self._entries[self.num_entries:self.num_entries + m]
+        new[:] = entries
+        new[:, 0] += self.num_encounters
+        self.num_encounters += n
+        self.num_entries += m
+
+    def extend(self, other, team_index):
+        """
+        Add the encounters of another table.
+
+        :param EncounterTable other: The table.
+        :param numpy.ndarray team_index: The index in this table's teams
+                                         of each of the other's teams.
+        """
+        entries = other.entries.copy()
+        if len(other.keys) > 0:
+            entries[:, 1] = self.columns(other.keys)[entries[:, 1]]
+        winners = np.where(other.winners >= 0, team_index[other.winners], -1)
+        self.add(winners, other.rounds, entries)
+
+    def dense(self, num_teams):
+        """
+        The table as dense arrays.
+
+        :param int num_teams: The number of teams.
+        :returns: (encounters, teams) wins, and (encounters, attackers)
+                  attacks, hits and damage, with attackers in the
+                  order of keys.
+        :rtype: tuple(numpy.ndarray)
+        """
+        n = self.num_encounters
+        wins = np.zeros((n, num_teams), dtype=np.int64)
+        won = self.winners >= 0
+        wins[np.flatnonzero(won), self.winners[won]] = 1
+        counts = np.zeros((3, n, len(self.keys)), dtype=np.int64)
+        (enc, col) = (self.entries[:, 0], self.entries[:, 1])
+        for i in range(3):
+            np.add.at(counts[i], (enc, col), self.entries[:, 2 + i])
+        return (wins, counts[0], counts[1], counts[2])
+
+    def to_dict(self):
+        return {"keys": [list(key) for key in self.keys],
+                "winners": self.winners.tolist(),
+                "rounds": self.rounds.tolist(),
+                "entries": self.entries.ravel().tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        table = cls()
+        table.columns([tuple(key) for key in data["keys"]])
+        entries = np.array(data["entries"], dtype=np.int64).reshape(-1, 5)
+        table.add(np.array(data["winners"], dtype=np.int32),
+                  np.array(data["rounds"], dtype=np.int64), entries)
+        return table
+
+
+class Results(object):
+    """
+    Aggregated outcome of a number of encounters: wins per team,
+    rounds fought, and per-attacker attack counts. Only sufficient
+    statistics are kept, so results from separate runs can be merged.
+
+    :param list team_names: The names of the teams, in display order.
+    :param bool keep_encounters: Also keep the statistics of each
+        encounter, which stats.confidence_intervals() needs.
+    """
+
+    def __init__(self, team_names=(), keep_encounters=False):
+        self.team_names = list(team_names)
+        self.num_encounters = 0
+        self.rounds = 0
+        self.wins = defaultdict(int)  # team name: wins
+        self.draws = 0  # Encounters that no team won.
+        # (attacker_name, attacker_id): {"team", "attacks", "hits", "dmg"}
+        self.attackers = {}
+        self.encounters = EncounterTable() if keep_encounters is True \
+            else None
+
+    def __str__(self):
+        outstr = ""
+        for (name, cid) in sorted(self.attackers):
+            stats = self.attackers[(name, cid)]
+            dpr = self._dpr(stats)
+            hit_ratio = stats["hits"] / stats["attacks"]
+            outstr += f"{name} ({cid}): DPR ({dpr:.2f}), hit ratio ({hit_ratio:.2f})\n"  # noqa
+        outstr += "Wins\n"
+        for team_name in self.team_names:
+            wins = self.wins[team_name]
+            percentage = wins / max(self.num_encounters, 1)
+            outstr += f"{team_name}: {wins} / {self.num_encounters} ({percentage:.2f})\n"  # noqa
+        if self.draws > 0:
+            percentage = self.draws / self.num_encounters
+            outstr += f"Draws: {self.draws} / {self.num_encounters} ({percentage:.2f})\n"  # noqa
+        return outstr
+
+    @staticmethod
+    def _dpr(stats):
+        # Damage per round is averaged over successful hits.
+        if stats["hits"] == 0:
+            return float("nan")
+        return stats["dmg"] / stats["hits"]
+
+    def add_encounter(self, encounter, rounds=0):
+        """
+        Add the outcome of a finished encounter.
+
+        :param Encounter encounter: The encounter, after run_combat().
+        :param int rounds: The number of rounds the encounter took.
+        """
+        counts = None
+        if encounter.log_level != "none":
+            counts = (encounter._attacks, encounter._hits, encounter._dmg)
+        self.add_counts(encounter.teams, encounter.registry,
+                        encounter.winner, rounds, counts)
+
+    def add_counts(self, teams, registry, winner, rounds, counts=None):
+        """
+        Add the outcome of a finished encounter from its counts, as kept
+        by an Encounter or returned by the combat kernel.
+
+        :param list teams: The Teams of the encounter.
+        :param EntityRegistry registry: The registry of the characters.
+        :param Team winner: The winning team, or None if no team won.
+        :param int rounds: The number of rounds the encounter took.
+        :param tuple counts: (Optional) The attacks, hits and damage
+                             of each character, by eid.
+        """
+        for team in teams:
+            if team.name not in self.team_names:
+                self.team_names.append(team.name)
+        self.num_encounters += 1
+        self.rounds += int(rounds)
+        if winner is None:
+            self.draws += 1
+        else:
+            self.wins[winner.name] += 1
+        eids = []
+        if counts is not None:
+            counts = np.array(counts, dtype=np.int64)
+            eids = np.flatnonzero(counts[0])
+        keys = [(registry.names[eid], int(eid)) for eid in eids]
+        if self.encounters is not None:
+            entries = np.zeros((len(keys), 5), dtype=np.int64)
+            if len(keys) > 0:
+                entries[:, 1] = self.encounters.columns(keys)
+                entries[:, 2:] = counts[:, eids].T
+            winner_index = -1 if winner is None \
+                else self.team_names.index(winner.name)
+            self.encounters.add([winner_index], [rounds], entries)
+        for (key, eid) in zip(keys, eids):
+            try:
+                stats = self.attackers[key]
+            except KeyError:
+                team = registry.teams[registry.team[eid]]
+                stats = {"team": team.name, "attacks": 0, "hits": 0, "dmg": 0}
+                self.attackers[key] = stats
+            stats["attacks"] += int(counts[0, eid])
+            stats["hits"] += int(counts[1, eid])
+            stats["dmg"] += int(counts[2, eid])
+
+    def merge(self, other):
+        """
+        Add the statistics of another Results instance to this one.
+
+        :param Results other: The results to merge in.
+        :returns: self
+        :rtype: Results
+        """
+        for team_name in other.team_names:
+            if team_name not in self.team_names:
+                self.team_names.append(team_name)
+        self.num_encounters += other.num_encounters
+        self.rounds += other.rounds
+        self.draws += other.draws
+        for (team_name, wins) in other.wins.items():
+            self.wins[team_name] += wins
+        for (key, stats) in other.attackers.items():
+            if key not in self.attackers:
+                self.attackers[key] = {"team": stats["team"],
+                                       "attacks": 0, "hits": 0, "dmg": 0}
+            for field in ["attacks", "hits", "dmg"]:
+                self.attackers[key][field] += stats[field]
+        # Per encounter statistics are only kept if both have them.
+        if self.encounters is not None and other.encounters is not None:
+            team_index = np.array([self.team_names.index(name)
+                                   for name in other.team_names],
+                                  dtype=np.int32)
+            self.encounters.extend(other.encounters, team_index)
+        else:
+            self.encounters = None
+        return self
+
+    def to_frame(self):
+        """
+        One row per attacker with its attack statistics and
+        the record of its team.
+
+        :rtype: pandas.DataFrame
+        """
+        rows = []
+        mean_rounds = self.rounds / max(self.num_encounters, 1)
+        for ((name, cid), stats) in sorted(self.attackers.items()):
+            wins = self.wins[stats["team"]]
+            rows.append({"team": stats["team"],
+                         "team_wins": wins,
+                         "win_rate": wins / max(self.num_encounters, 1),
+                         "num_encounters": self.num_encounters,
+                         "mean_rounds": mean_rounds,
+                         "attacker_name": name,
+                         "attacker_id": cid,
+                         "attacks": stats["attacks"],
+                         "hits": stats["hits"],
+                         "dmg": stats["dmg"],
+                         "dpr": self._dpr(stats),
+                         "hit_ratio": stats["hits"] / stats["attacks"]})
+        return pd.DataFrame(rows)
+
+    def to_dict(self):
+        """
+        A JSON serializable representation of these results.
+        """
+        return {"team_names": self.team_names,
+                "num_encounters": self.num_encounters,
+                "rounds": self.rounds,
+                "wins": dict(self.wins),
+                "draws": self.draws,
+                "attackers": [[name, cid, stats] for ((name, cid), stats)
+                              in self.attackers.items()],
+                "encounters": None if self.encounters is None
+                else self.encounters.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Inverse of to_dict().
+
+        :param dict data: Output of Results.to_dict().
+        :rtype: Results
+        """
+        results = cls(team_names=data["team_names"],
+                      keep_encounters=data.get("encounters") is not None)
+        results.num_encounters = data["num_encounters"]
+        results.rounds = data["rounds"]
+        results.wins.update(data["wins"])
+        results.draws = data.get("draws", 0)
+        results.attackers = {(name, cid): dict(stats)
+                             for (name, cid, stats) in data["attackers"]}
+        if results.encounters is not None:
+            results.encounters = EncounterTable.from_dict(data["encounters"])
+        return results
@@ -0,0 +1,86 @@
+import os
+import json
+import numpy as np
+
+from .token import Character
+from .encounter import Team
+from .grid import Grid
+from .mapfile import is_map_file, load_map
+
+
+def load_character_sheets(indir):
+    """
+    Load all the character sheets in a directory.
+
+    :param str indir: Directory containing character sheet JSON files.
+    :returns: Character data keyed by lowercased character name.
+    :rtype: dict
+    """
+    chars_by_name = {}
+    for fname in os.listdir(indir):
+        if fname == "template.json":
+            continue
+        char_data = json.load(open(os.path.join(indir, fname)))
+        chars_by_name[char_data["name"].lower()] = char_data
+    return chars_by_name
+
+
+def load_monsters(infile):
+    """
+    Load the formatted SRD monster data.
+
+    :param str infile: JSONL file with one monster per line.
+    :returns: Monster data keyed by lowercased monster name.
+    :rtype: dict
+    """
+    monsters_data = (json.loads(line) for line in open(infile))
+    monsters_by_name = {m["name"].lower(): m for m in monsters_data}
+    return monsters_by_name
+
+
+def load_grid(map_file=None, grid_shape=(20, 20)):
+    """
+    Build the battle grid, either from a saved map or as an
+    empty grid of the given shape.
+
+    :param str map_file: (Optional) Path to a map saved by map_maker.py,
+                         either in the binary map format or as .npy.
+    :param tuple grid_shape: (y, x) shape used if map_file is None.
+    :rtype: Grid
+    """
+    if map_file is not None:
+        if is_map_file(map_file):
+            return Grid.from_map_codes(load_map(map_file).cells)
+        map_matrix = np.load(map_file)
+        return Grid.from_map_matrix(map_matrix)
+    return Grid(shape=tuple(grid_shape))
+
+
+def build_teams(scenario_data, chars_by_name, monsters_by_name):
+    """
+    Instantiate the teams described by a scenario.
+
+    :param dict scenario_data: The scenario, as loaded from JSON.
+    :param dict chars_by_name: Output of load_character_sheets.
+    :param dict monsters_by_name: Output of load_monsters.
+    :returns: The two teams.
+    :rtype: list(Team)
+    """
+    teams = []
+    for team_id in ["team1", "team2"]:
+        team_data = scenario_data[team_id]
+        team_members = []
+        for char_type, num in team_data["members"]:
+            (source, name) = char_type.split('.')
+            if source == "character":
+                data_dict = chars_by_name
+            elif source == "monster":
+                data_dict = monsters_by_name
+            else:
+                raise ValueError(f"Unsupported character source '{source}'.")
+            for i in range(num):
+                char_data = data_dict[name.lower()]
+                team_members.append(Character(**char_data))
+        team = Team(members=team_members, name=team_data["name"])
+        teams.append(team)
+    return teams
@@ -0,0 +1,85 @@
+import heapq
+import itertools
+
+
+class TurnScheduler(object):
+    """
+    Keeps the living combatants of an encounter in initiative order.
+    Turns are kept in a heap ordered by (round, -initiative, order), so
+    removing a combatant or moving its turn never re-sorts the others.
+    Combatants with the same initiative keep the order they were given in.
+
+    :param list turn_order: [(Character, initiative)] as
+                            returned by Encounter._roll_initiative().
+    """
+
+    def __init__(self, turn_order):
+        self.round = 0
+        self._heap = []
+        self._entries = {}  # Token: heap entry of its next turn
+        self._counter = itertools.count()
+        for (character, initiative) in turn_order:
+            self._push(character, self.round, initiative, next(self._counter))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, character):
+        return character in self._entries
+
+    def _push(self, character, round_num, initiative, order):
+        entry = [round_num, -initiative, order, character]
+        self._entries[character] = entry
+        heapq.heappush(self._heap, entry)
+
+    def remove(self, character):
+        """
+        Remove a combatant, e.g. when it dies. The entry is only marked
+        as removed, and is dropped when it reaches the top of the heap.
+
+        :param Character character: The combatant to remove.
+        """
+        entry = self._entries.pop(character, None)
+        if entry is not None:
+            entry[-1] = None
+
+    def delay(self, character, initiative):
+        """
+        Move a combatant's next turn to a lower initiative, e.g. to delay
+        its turn or to act on a readied action. It keeps the new
+        initiative in later rounds, and goes after any combatants
+        that already have it.
+
+        :param Character character: The combatant.
+        :param int initiative: The new initiative.
+        """
+        (round_num, _, _, _) = self._entries[character]
+        self.remove(character)
+        self._push(character, round_num, initiative, next(self._counter))
+
+    def this_round(self):
+        """
+        The combatants yet to take their turn this round, in initiative
+        order, without starting their turns.
+
+        :rtype: list(Character)
+        """
+        return [entry[-1] for entry in sorted(self._heap)
+                if entry[0] == self.round and entry[-1] is not None]
+
+    def turns(self):
+        """
+        The combatants whose turn it is this round, in initiative order.
+        Each combatant's turn in the next round is scheduled when its
+        turn in this round starts.
+
+        :returns: Generator over Characters.
+        """
+        while self._heap and self._heap[0][0] == self.round:
+            (round_num, neg_initiative, order, character) = \
+                heapq.heappop(self._heap)
+            if character is None:
+                continue
+            self._push(character, round_num + 1, -neg_initiative, order)
+            yield character
+        self.round += 1
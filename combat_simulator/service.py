@@ -0,0 +1,296 @@
+import os
+import copy
+import json
+import asyncio
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from .engine import Engine
+from .player import PATHFINDERS
+from .results import Results
+from .scenario import (load_character_sheets, load_monsters,
+                       load_grid, build_teams)
+
+
+# Populated once per worker process by init_worker.
+_catalog = {}
+
+# Events after which nothing more is sent about a request.
+FINAL_EVENTS = ["result", "cancelled", "error", "cancel_requested", "pong"]
+
+
+def init_worker(char_sheets_dir, monsters_file):
+    """
+    Load the character sheets and monsters once per worker process.
+    """
+    _catalog["characters"] = load_character_sheets(char_sheets_dir)
+    _catalog["monsters"] = load_monsters(monsters_file)
+    _catalog["maps"] = {}
+
+
+def _ping():
+    return {"characters": len(_catalog["characters"]),
+            "monsters": len(_catalog["monsters"]),
+            "maps": len(_catalog["maps"])}
+
+
+def _load_grid(map_file, grid_shape):
+    # Engines add tokens to their grid, so each
+    # chunk gets its own copy of a loaded map.
+    if map_file is None:
+        return load_grid(None, grid_shape)
+    if map_file not in _catalog["maps"]:
+        _catalog["maps"][map_file] = load_grid(map_file)
+    return copy.deepcopy(_catalog["maps"][map_file])
+
+
+def run_chunk(job, num_encounters, state=None):
+    """
+    Run some of a job's encounters using the worker's catalog,
+    continuing from where the previous chunk left off. Survivors keep
+    their hit points from one encounter to the next, so a job's chunks
+    run in sequence, and give the same results whatever their size.
+
+    :param dict job: Output of parse_job().
+    :param int num_encounters: The number of encounters to run.
+    :param dict state: The Engine state returned with the previous
+                       chunk, or None for the first chunk.
+    :returns: The results of this chunk, as Results.to_dict(),
+              and the Engine state to continue from.
+    :rtype: tuple(dict, dict)
+    """
+    teams = build_teams(job["scenario"], _catalog["characters"],
+                        _catalog["monsters"])
+    grid = _load_grid(job["map"], job["grid_shape"])
+    engine = Engine(*teams, grid=grid,
+                    pathfinder=PATHFINDERS[job["pathfinder"]],
+                    log_level="summary")
+    if state is not None:
+        engine.set_state(state)
+    else:
+        # Forked workers start with the same random state.
+        np.random.seed(job["seed"])
+    results = engine.run(num_encounters=num_encounters, progress=False)
+    return (results.to_dict(), engine.get_state())
+
+
+def parse_job(request):
+    """
+    Check a run request and fill in the defaults,
+    which are the same as those of run_scenario.py.
+
+    :param dict request: The request. The scenario is given either as
+        "scenario", in the format of the files in scenarios/, or as
+        a "scenario_file" to read it from.
+    :returns: The job.
+    :rtype: dict
+    """
+    if "scenario" in request:
+        scenario = request["scenario"]
+    elif "scenario_file" in request:
+        with open(request["scenario_file"]) as inF:
+            scenario = json.load(inF)
+    else:
+        raise ValueError("A run request needs a scenario or scenario_file.")
+    for team_id in ["team1", "team2"]:
+        if team_id not in scenario:
+            raise ValueError(f"The scenario has no {team_id}.")
+    pathfinder = request.get("pathfinder", "astar")
+    if pathfinder not in PATHFINDERS:
+        raise ValueError(f"Unknown pathfinder '{pathfinder}'.")
+    num_encounters = int(request.get("num_encounters", 1000))
+    if num_encounters < 1:
+        raise ValueError("num_encounters must be at least 1.")
+    return {"scenario": scenario,
+            "num_encounters": num_encounters,
+            "grid_shape": list(request.get("grid_shape", [20, 20])),
+            "map": request.get("map"),
+            "seed": request.get("seed"),
+            "pathfinder": pathfinder}
+
+
+class SimulationService(object):
+    """
+    A long running simulation service. The character sheets and
+    monsters are loaded once per worker process, and maps once per
+    worker when first used.
+
+    Clients send one JSON request per line and get JSON events back,
+    one per line, each with the "job_id" it is about:
+      {"op": "run", "scenario": {...}, "num_encounters": 1000, ...}
+          Options are as in parse_job(). Replies with "accepted", then
+          "progress" after every chunk of encounters, then "result"
+          with the aggregated results, or "error". The chunks of a job
+          run in sequence, while different jobs run concurrently.
+      {"op": "cancel", "job_id": 3}
+          Replies "cancel_requested". The job stops after its current
+          chunk and sends "cancelled" to the client that started it.
+      {"op": "ping"}
+          Replies "pong" with the sizes of the workers' catalogs, as
+          loaded at start, without waiting for the workers.
+    Jobs started by a client are cancelled when it disconnects.
+
+    :param str char_sheets_dir: Directory of character sheets.
+    :param str monsters_file: Formatted SRD monsters file.
+    :param int processes: Number of workers. Defaults to the CPU count.
+    :param int chunk_size: Encounters between progress events. Jobs
+                           are only cancelled between chunks.
+    """
+
+    def __init__(self, char_sheets_dir, monsters_file, processes=None,
+                 chunk_size=100):
+        self.char_sheets_dir = char_sheets_dir
+        self.monsters_file = monsters_file
+        self.processes = processes or os.cpu_count()
+        self.chunk_size = chunk_size
+        self._pool = None
+        self._catalog_sizes = None  # Output of _ping().
+        self._jobs = {}  # job id: asyncio.Task
+        self._job_ids = itertools.count(1)
+
+    async def start(self):
+        """
+        Start the worker processes and load their catalogs.
+        """
+        self._pool = ProcessPoolExecutor(
+            self.processes, initializer=init_worker,
+            initargs=(self.char_sheets_dir, self.monsters_file))
+        loop = asyncio.get_running_loop()
+        sizes = await asyncio.gather(*[loop.run_in_executor(self._pool, _ping)
+                                       for _ in range(self.processes)])
+        self._catalog_sizes = sizes[0]
+
+    def close(self):
+        for task in list(self._jobs.values()):
+            task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    async def serve(self, path=None, host="127.0.0.1", port=8765):
+        """
+        Serve requests until cancelled, on a Unix socket
+        if path is given and on host:port otherwise.
+        """
+        await self.start()
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path=path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    @staticmethod
+    async def _send(writer, event):
+        if writer.is_closing():
+            return
+        try:
+            writer.write((json.dumps(event) + '\n').encode())
+            await writer.drain()
+        except ConnectionError:
+            # The client is gone. Its jobs are cancelled by handle().
+            pass
+
+    async def handle(self, reader, writer):
+        """
+        Handle the requests of one client connection.
+        """
+        started = []
+        try:
+            async for line in reader:
+                try:
+                    request = json.loads(line)
+                    op = request["op"]
+                except (ValueError, KeyError, TypeError):
+                    await self._send(writer, {"event": "error",
+                                              "message": "Bad request."})
+                    continue
+                if op == "run":
+                    job_id = next(self._job_ids)
+                    self._jobs[job_id] = asyncio.ensure_future(
+                        self._run_job(job_id, request, writer))
+                    started.append(job_id)
+                elif op == "cancel":
+                    task = self._jobs.get(request.get("job_id"))
+                    if task is None:
+                        await self._send(writer, {
+                            "job_id": request.get("job_id"),
+                            "event": "error", "message": "No such job."})
+                    else:
+                        task.cancel()
+                        await self._send(writer, {
+                            "job_id": request["job_id"],
+                            "event": "cancel_requested"})
+                elif op == "ping":
+                    await self._send(writer, {"event": "pong",
+                                              **self._catalog_sizes})
+                else:
+                    await self._send(writer, {
+                        "event": "error", "message": f"Unknown op '{op}'."})
+        finally:
+            # The client disconnected.
+            for job_id in started:
+                if job_id in self._jobs:
+                    self._jobs[job_id].cancel()
+            writer.close()
+
+    async def _run_job(self, job_id, request, writer):
+        loop = asyncio.get_running_loop()
+        done = 0
+        try:
+            job = parse_job(request)
+            total = job["num_encounters"]
+            await self._send(writer, {"job_id": job_id, "event": "accepted",
+                                      "num_encounters": total})
+            results = Results()
+            state = None
+            while done < total:
+                num = min(self.chunk_size, total - done)
+                (chunk, state) = await loop.run_in_executor(
+                    self._pool, run_chunk, job, num, state)
+                results.merge(Results.from_dict(chunk))
+                done += num
+                await self._send(writer, {"job_id": job_id,
+                                          "event": "progress", "done": done,
+                                          "num_encounters": total})
+            await self._send(writer, {"job_id": job_id, "event": "result",
+                                      "results": results.to_dict(),
+                                      "summary": str(results)})
+        except asyncio.CancelledError:
+            await self._send(writer, {"job_id": job_id, "event": "cancelled",
+                                      "done": done})
+        except Exception as e:
+            await self._send(writer, {"job_id": job_id, "event": "error",
+                                      "message": f"{type(e).__name__}: {e}"})
+        finally:
+            self._jobs.pop(job_id, None)
+
+
+async def submit(request, path=None, host="127.0.0.1", port=8765):
+    """
+    Send a request to a running SimulationService
+    and yield its events until the job is finished.
+
+    :param dict request: The request, e.g. {"op": "run", ...}.
+    :param str path: The service's Unix socket. If None,
+                     connect to host:port instead.
+    :returns: Generator over events.
+    """
+    if path is not None:
+        (reader, writer) = await asyncio.open_unix_connection(path)
+    else:
+        (reader, writer) = await asyncio.open_connection(host, port)
+    try:
+        writer.write((json.dumps(request) + '\n').encode())
+        await writer.drain()
+        async for line in reader:
+            event = json.loads(line)
+            yield event
+            if event["event"] in FINAL_EVENTS:
+                break
+    finally:
+        writer.close()
@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+from statistics import NormalDist
+
+
+# Bootstrap resamples are drawn in chunks of at most this many
+# (resample, encounter) counts, to bound memory.
+_MAX_CELLS = 10**7
+
+
+def _z(confidence):
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+def wilson_interval(successes, trials, confidence=0.95, z=None):
+    """
+    Wilson score interval of binomial proportions.
+
+    :param numpy.ndarray successes: Number of successes.
+    :param numpy.ndarray trials: Number of trials.
+    :param float confidence: The confidence level.
+    :param float z: (Optional) Standard normal quantile, used instead
+                    of confidence. 1.96 gives a 95% interval.
+    :returns: The lower and upper bounds, NaN where there are no trials.
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    s = np.asarray(successes, dtype=float)
+    n = np.asarray(trials, dtype=float)
+    if z is None:
+        z = _z(confidence)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = s / n
+        denom = 1 + z**2 / n
+        center = (p + z**2 / (2 * n)) / denom
+        half = z * np.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denom
+    return (np.clip(center - half, 0, 1), np.clip(center + half, 0, 1))
+
+
+def ratio_interval(num, den, confidence=0.95):
+    """
+    Normal interval of ratios of sums over encounters, e.g. damage
+    per hit or hits per attack, by the delta method. Encounters are
+    treated as independent, but the attacks within an encounter
+    need not be.
+
+    :param numpy.ndarray num: (encounters, columns) numerators.
+    :param numpy.ndarray den: (encounters, columns) denominators.
+    :param float confidence: The confidence level.
+    :returns: The ratios, and their lower and upper bounds.
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    num = np.asarray(num, dtype=float)
+    den = np.asarray(den, dtype=float)
+    n = num.shape[0]
+    total = den.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = num.sum(axis=0) / total
+        residuals = num - ratio * den
+        se = np.sqrt(n / (n - 1) * (residuals**2).sum(axis=0)) / total
+    half = _z(confidence) * se
+    return (ratio, ratio - half, ratio + half)
+
+
+def bootstrap_ratio_interval(num, den, confidence=0.95, num_samples=1000,
+                             seed=None):
+    """
+    Percentile bootstrap interval of ratios of sums over encounters.
+    Each resample draws encounters with replacement, as counts of how
+    often each encounter is drawn, so the resampled sums are a single
+    matrix product.
+
+    :param numpy.ndarray num: (encounters, columns) numerators.
+    :param numpy.ndarray den: (encounters, columns) denominators.
+    :param float confidence: The confidence level.
+    :param int num_samples: The number of bootstrap resamples.
+    :param int seed: (Optional) Seed of the resampling, which does not
+                     touch the global random number generator.
+    :returns: The ratios, and their lower and upper bounds.
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    return bootstrap_ratio_intervals([(num, den)], confidence, num_samples,
+                                     seed)[0]
+
+
+def bootstrap_ratio_intervals(pairs, confidence=0.95, num_samples=1000,
+                              seed=None):
+    """
+    bootstrap_ratio_interval() of several ratios over the same
+    encounters, with the same resamples for all of them.
+
+    :param list pairs: (num, den) of each ratio, each with one row
+                       per encounter.
+    :returns: (ratios, lower bounds, upper bounds) of each pair.
+    :rtype: list
+    """
+    pairs = [(np.asarray(num, dtype=float), np.asarray(den, dtype=float))
+             for (num, den) in pairs]
+    n = pairs[0][0].shape[0]
+    rng = np.random.default_rng(seed)
+    chunk = max(1, _MAX_CELLS // max(n, 1))
+    ratios = [[] for _ in pairs]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for start in range(0, num_samples, chunk):
+            size = min(chunk, num_samples - start)
+            counts = rng.multinomial(n, np.full(n, 1 / n), size=size)
+            for ((num, den), samples) in zip(pairs, ratios):
+                samples.append((counts @ num) / (counts @ den))
+    alpha = (1 - confidence) / 2
+    intervals = []
+    for ((num, den), samples) in zip(pairs, ratios):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = num.sum(axis=0) / den.sum(axis=0)
+            (low, high) = np.nanquantile(np.concatenate(samples),
+                                         [alpha, 1 - alpha], axis=0)
+        intervals.append((ratio, low, high))
+    return intervals
+
+
+def encounter_arrays(results):
+    """
+    The per encounter statistics kept by Results as dense arrays.
+
+    :param Results results: Results with keep_encounters=True.
+    :returns: The attacker keys, sorted, and (encounters, attackers)
+              arrays of attacks, hits and damage, and an (encounters,
+              teams) array of wins, in the order of results.team_names.
+    :rtype: tuple
+    """
+    table = results.encounters
+    if table is None or len(table) != results.num_encounters:
+        raise ValueError("Results must be kept with keep_encounters=True.")
+    (wins, attacks, hits, dmg) = table.dense(len(results.team_names))
+    order = sorted(range(len(table.keys)), key=lambda i: table.keys[i])
+    keys = [table.keys[i] for i in order]
+    return (keys, attacks[:, order], hits[:, order], dmg[:, order], wins)
+
+
+def confidence_intervals(results, confidence=0.95, method="analytic",
+                         num_samples=1000, seed=None):
+    """
+    Confidence intervals of the DPR and hit ratio of each attacker
+    and of the win rate of each team, over encounters.
+
+    :param Results results: Results with keep_encounters=True.
+    :param float confidence: The confidence level.
+    :param str method: "analytic" for delta method intervals of DPR and
+        hit ratio and Wilson intervals of win rates, or "bootstrap".
+    :param int num_samples: The number of bootstrap resamples.
+    :param int seed: (Optional) Seed of the bootstrap resampling.
+    :returns: A table of attackers and a table of teams.
+    :rtype: (pandas.DataFrame, pandas.DataFrame)
+    """
+    if method not in ["analytic", "bootstrap"]:
+        raise ValueError(f"Unknown method '{method}'.")
+    (keys, attacks, hits, dmg, wins) = encounter_arrays(results)
+    if method == "analytic":
+        dpr = ratio_interval(dmg, hits, confidence)
+        hit_ratio = ratio_interval(hits, attacks, confidence)
+        win_rate = (wins.mean(axis=0),) + \
+            wilson_interval(wins.sum(axis=0), len(wins), confidence)
+    else:
+        (dpr, hit_ratio, win_rate) = bootstrap_ratio_intervals(
+            [(dmg, hits), (hits, attacks), (wins, np.ones_like(wins))],
+            confidence, num_samples, seed)
+    attackers = pd.DataFrame({
+        "team": [results.attackers[key]["team"] for key in keys],
+        "attacker_name": [name for (name, _) in keys],
+        "attacker_id": [cid for (_, cid) in keys],
+        "dpr": dpr[0], "dpr_low": dpr[1], "dpr_high": dpr[2],
+        "hit_ratio": hit_ratio[0], "hit_ratio_low": hit_ratio[1],
+        "hit_ratio_high": hit_ratio[2]})
+    teams = pd.DataFrame({
+        "team": results.team_names, "wins": wins.sum(axis=0),
+        "win_rate": win_rate[0], "win_rate_low": win_rate[1],
+        "win_rate_high": win_rate[2]})
+    return (attackers, teams)
+
+
+def format_intervals(attackers, teams, confidence=0.95):
+    """
+    Format the output of confidence_intervals() like str(Results).
+    """
+    outstr = ""
+    for row in attackers.itertuples():
+        outstr += f"{row.attacker_name} ({row.attacker_id}): DPR ({row.dpr:.2f} [{row.dpr_low:.2f}, {row.dpr_high:.2f}]), hit ratio ({row.hit_ratio:.2f} [{row.hit_ratio_low:.2f}, {row.hit_ratio_high:.2f}])\n"  # noqa
+    outstr += f"Win rates ({confidence:.0%} confidence)\n"
+    for row in teams.itertuples():
+        outstr += f"{row.team}: {row.win_rate:.2f} [{row.win_rate_low:.2f}, {row.win_rate_high:.2f}]\n"  # noqa
+    return outstr
@@ -0,0 +1,118 @@
+import copy
+import json
+import itertools
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+from .engine import Engine
+from .scenario import (load_character_sheets, load_monsters,
+                       load_grid, build_teams)
+
+
+# Populated once per worker process by init_worker.
+_catalog = {}
+
+
+def expand_sweep(scenario_data, axes):
+    """
+    Expand a scenario template and a set of axes into jobs,
+    one per point of the cartesian product of the axes.
+
+    Supported axes are
+      * "grid_shape": a list of [y, x] shapes.
+      * "map": a list of map files (null for an empty grid).
+      * "<team_id>:<source>.<name>": a list of member counts, e.g.
+        "team2:monster.Zombie": [5, 10, 20].
+
+    :param dict scenario_data: The template scenario.
+    :param dict axes: Axis name to list of values.
+    :returns: Jobs, each with a "params" dict of the axis values for
+              this job and the resulting "scenario".
+    :rtype: list(dict)
+    """
+    names = list(axes.keys())
+    jobs = []
+    for (i, values) in enumerate(itertools.product(*axes.values())):
+        params = dict(zip(names, values))
+        scenario = copy.deepcopy(scenario_data)
+        job = {"job_id": i, "params": params, "scenario": scenario,
+               "grid_shape": [20, 20], "map": None}
+        for (name, value) in params.items():
+            if name in ["grid_shape", "map"]:
+                job[name] = value
+            elif ':' in name:
+                (team_id, char_type) = name.split(':', 1)
+                _set_member_count(scenario[team_id], char_type, value)
+            else:
+                raise ValueError(f"Unsupported sweep axis '{name}'.")
+        jobs.append(job)
+    return jobs
+
+
+def _set_member_count(team_data, char_type, num):
+    for member in team_data["members"]:
+        if member[0].lower() == char_type.lower():
+            member[1] = int(num)
+            return
+    team_data["members"].append([char_type, int(num)])
+
+
+def init_worker(char_sheets_dir, monsters_file):
+    """
+    Load the character sheets and monsters once per worker process.
+    """
+    _catalog["characters"] = load_character_sheets(char_sheets_dir)
+    _catalog["monsters"] = load_monsters(monsters_file)
+
+
+def run_job(job, num_encounters, seed=None):
+    """
+    Run a single sweep job using the worker's catalog.
+
+    :param dict job: A job, as returned by expand_sweep.
+    :param int num_encounters: Number of encounters to run.
+    :param int seed: (Optional) Random seed for this job.
+    :returns: One row per attacker.
+    :rtype: list(dict)
+    """
+    if seed is not None:
+        np.random.seed(seed)
+    teams = build_teams(job["scenario"], _catalog["characters"],
+                        _catalog["monsters"])
+    grid = load_grid(job["map"], job["grid_shape"])
+    engine = Engine(*teams, grid=grid, log_level="summary")
+    results = engine.run(num_encounters=num_encounters, progress=False)
+    rows = results.to_frame().to_dict("records")
+    params = {name: json.dumps(value) if isinstance(value, list) else value
+              for (name, value) in job["params"].items()}
+    return [dict(job_id=job["job_id"], **params, **row) for row in rows]
+
+
+def _run_job_star(args):
+    return run_job(*args)
+
+
+def run_sweep(jobs, char_sheets_dir, monsters_file, num_encounters=100,
+              processes=None, seed=None):
+    """
+    Run all jobs on a pool of worker processes.
+
+    :param list jobs: Output of expand_sweep.
+    :param str char_sheets_dir: Directory of character sheets.
+    :param str monsters_file: Formatted SRD monsters file.
+    :param int num_encounters: Encounters per job.
+    :param int processes: Number of workers. Defaults to the CPU count.
+    :param int seed: (Optional) Base random seed. Job i uses seed + i.
+    :returns: The results of all jobs, one row per job and attacker.
+    :rtype: pandas.DataFrame
+    """
+    args = [(job, num_encounters,
+             None if seed is None else seed + job["job_id"])
+            for job in jobs]
+    with multiprocessing.Pool(processes, initializer=init_worker,
+                              initargs=(char_sheets_dir,
+                                        monsters_file)) as pool:
+        rows = [row for job_rows in pool.imap(_run_job_star, args)
+                for row in job_rows]
+    return pd.DataFrame(rows)
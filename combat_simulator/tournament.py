@@ -0,0 +1,130 @@
+import re
+import itertools
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+from .token import Character
+from .encounter import Team
+from .grid import Grid
+from .engine import Engine
+
+
+# Populated once per worker process by init_worker.
+_compiled = {}
+
+
+def select_monsters(monsters_by_name, names=None, pattern=None):
+    """
+    Choose the monsters taking part in a tournament.
+    Monsters without any attacks can never win and are left out.
+
+    :param dict monsters_by_name: Output of load_monsters.
+    :param list names: (Optional) Only use these monsters.
+    :param str pattern: (Optional) Only use monsters whose name
+                        matches this regular expression.
+    :returns: The names of the selected monsters, sorted.
+    :rtype: list(str)
+    """
+    if names is not None:
+        selected = [name.lower() for name in names]
+        unknown = [name for name in selected if name not in monsters_by_name]
+        if unknown != []:
+            raise ValueError(f"Unknown monsters {unknown}.")
+    else:
+        selected = list(monsters_by_name.keys())
+    if pattern is not None:
+        regex = re.compile(pattern, re.IGNORECASE)
+        selected = [name for name in selected if regex.search(name)]
+    selected = [name for name in selected
+                if monsters_by_name[name]["attacks"] != []]
+    return sorted(set(selected))
+
+
+def init_worker(monster_data, grid_shape):
+    """
+    Build each monster and the grid once per worker process.
+    They are reused for every matchup the worker runs.
+    """
+    _compiled["monsters"] = [Character(**data) for data in monster_data]
+    _compiled["grid"] = Grid(shape=tuple(grid_shape))
+
+
+def run_matchups(pairs, num_encounters, seed=None):
+    """
+    Run head-to-head matchups between pairs of compiled monsters.
+
+    :param list pairs: (i, j) indices into the worker's monsters.
+    :param int num_encounters: Number of encounters per matchup.
+    :param int seed: (Optional) Random seed.
+    :returns: (i, j, wins of i, wins of j) for each pair.
+    :rtype: list(tuple)
+    """
+    if seed is not None:
+        np.random.seed(seed)
+    monsters = _compiled["monsters"]
+    grid = _compiled["grid"]
+    out = []
+    for (i, j) in pairs:
+        for monster in [monsters[i], monsters[j]]:
+            monster.HP = monster._hp_max
+        team1 = Team(members=[monsters[i]], name=str(i))
+        team2 = Team(members=[monsters[j]], name=str(j))
+        engine = Engine(team1, team2, grid=grid, log_level="none")
+        results = engine.run(num_encounters=num_encounters, progress=False)
+        out.append((i, j, results.wins[team1.name], results.wins[team2.name]))
+    return out
+
+
+def _run_matchups_star(args):
+    return run_matchups(*args)
+
+
+def run_tournament(monster_data, num_encounters=10, grid_shape=(10, 10),
+                   processes=None, chunk_size=100, seed=None):
+    """
+    Run every monster against every other monster. Each unordered
+    pair is only played once.
+
+    :param list monster_data: Character data of the monsters.
+    :param int num_encounters: Number of encounters per matchup.
+    :param tuple grid_shape: Shape of the battle grid.
+    :param int processes: Number of workers. Defaults to the CPU count.
+    :param int chunk_size: Number of matchups per task.
+    :param int seed: (Optional) Base random seed. Task i uses seed + i.
+    :returns: wins[i, j] is the number of times monster i beat monster j.
+    :rtype: numpy.ndarray
+    """
+    n = len(monster_data)
+    pairs = list(itertools.combinations(range(n), 2))
+    chunks = [pairs[i:i+chunk_size] for i in range(0, len(pairs), chunk_size)]
+    args = [(chunk, num_encounters, None if seed is None else seed + i)
+            for (i, chunk) in enumerate(chunks)]
+    wins = np.zeros((n, n), dtype=np.int32)
+    with multiprocessing.Pool(processes, initializer=init_worker,
+                              initargs=(monster_data, grid_shape)) as pool:
+        for matchups in pool.imap_unordered(_run_matchups_star, args):
+            for (i, j, wins_i, wins_j) in matchups:
+                wins[i, j] = wins_i
+                wins[j, i] = wins_j
+    return wins
+
+
+def save_tournament(outfile, names, wins, num_encounters):
+    """
+    Save the tournament results. Files ending in .csv get the
+    win rate matrix with monster names as row and column labels.
+    Otherwise the names and win counts are saved with numpy.savez_compressed.
+
+    :param str outfile: Where to save the results.
+    :param list names: Monster names, in matrix order.
+    :param numpy.ndarray wins: Output of run_tournament.
+    :param int num_encounters: Number of encounters per matchup.
+    """
+    if outfile.endswith(".csv"):
+        win_rates = pd.DataFrame(wins / num_encounters,
+                                 index=names, columns=names)
+        win_rates.to_csv(outfile, float_format="%.3f")
+    else:
+        np.savez_compressed(outfile, names=np.array(names), wins=wins,
+                            num_encounters=num_encounters)
@@ -1,9 +1,9 @@
 import argparse
 import curses
 import time
-import numpy as np
 
-from combat_simulator import Grid, Token
+from combat_simulator import Grid, Token, mapfile
+from combat_simulator.scenario import load_grid
 
 
 def parse_args():
@@ -47,7 +47,7 @@ def main(stdscr, grid=None):
         msg_win.addstr("Name your map: ")
         map_name = msg_win.getstr()
         map_name = map_name.decode("utf-8").strip()
-        map_path = f"maps/{map_name}.npy"
+        map_path = f"maps/{map_name}.map"
         curses.noecho()
         save_map(map_path, grid)
         msg_win.addstr(f"\nSaved to {map_path}")
@@ -58,11 +58,7 @@ def main(stdscr, grid=None):
 
 
 def save_map(filename, grid):
-    grid_copy = np.zeros(shape=grid.shape, dtype=str)
-    grid_copy[grid._grid == 0] = '.'
-    for (pos, tok) in grid._pos2tok.items():
-        grid_copy[pos] = tok.icon
-    np.save(filename, grid_copy)
+    mapfile.save_map(filename, mapfile.grid_to_codes(grid))
 
 
 def set_grid_shape(grid, main_win, msg_win):
@@ -152,7 +148,10 @@ def add_walls(grid, main_win, msg_win):
         elif key == 'd':
             if grid[pos] is None:
                 continue
-            grid.rm_token(grid[pos])
+            elif grid[pos] is grid.wall_token:
+                grid.rm_wall(pos)
+            else:
+                grid.rm_token(grid[pos])
         elif key == 'j':
             new_pos = (pos[0] + 1, pos[1])
         elif key == 'k':
@@ -228,6 +227,5 @@ if __name__ == "__main__":
     args = parse_args()
     grid = None
     if args.load_map is not None:
-        map_matrix = np.load(args.load_map)
-        grid = Grid.from_map_matrix(map_matrix)
+        grid = load_grid(args.load_map)
     curses.wrapper(main, grid=grid)
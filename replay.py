@@ -0,0 +1,47 @@
+import argparse
+import curses
+import time
+
+from combat_simulator import Grid
+from combat_simulator.engine import GameWindow, MessageWindow
+from combat_simulator.replay import ReplayPlayer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replay_file", type=str, required=True,
+                        help="""Replay file saved with
+                                run_scenario.py --record_file.""")
+    parser.add_argument("--encounter", type=int, default=0,
+                        help="""Which encounter in the file to replay.""")
+    parser.add_argument("--speed", type=float, default=0.4,
+                        help="""How many seconds to show each round.""")
+    return parser.parse_args()
+
+
+def main(stdscr, replay_file, encounter_num, speed):
+    curses.curs_set(0)
+    player = ReplayPlayer(replay_file)
+    frames = player.frames(encounter_num)
+    # The first frame is read before the grid shape is known.
+    (rounds, frame, messages) = next(frames)
+    grid = Grid(player.shape)
+    for (pos, icon) in player.static.items():
+        if icon == '#':
+            grid._walls[pos] = True
+    viewport = GameWindow.fit_viewport(player.shape)
+    gamewin = GameWindow(grid, pos=(0, 0), viewport=viewport)
+    msgwin = MessageWindow(size=(30, 50), pos=(gamewin.shape[0] + 2, 0))
+    gamewin.redraw(frame)
+    msgwin.redraw(f"Encounter {encounter_num}")
+    msgwin.getch()
+    for (rounds, frame, messages) in frames:
+        gamewin.redraw(frame)
+        msgwin.redraw(f"Round {rounds}\n" + '\n'.join(messages))
+        time.sleep(speed)
+    msgwin.getch()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    curses.wrapper(main, args.replay_file, args.encounter, args.speed)
@@ -1,48 +1,118 @@
 import argparse
 import os
+import sys
 import json
 import numpy as np
+import pandas as pd
 
-from combat_simulator import Character, Team, Engine, Grid
+from combat_simulator import Engine
+from combat_simulator.engine import LOG_LEVELS
+from combat_simulator.player import PATHFINDERS
+from combat_simulator.scenario import (load_character_sheets, load_monsters,
+                                       load_grid, build_teams)
+from combat_simulator.replay import ReplayRecorder
+from combat_simulator.cache import ResultCache, make_key, cached_run
+from combat_simulator.batch import find_scenarios, run_batch
+from combat_simulator.exact import win_probabilities, format_exact
 from combat_simulator.logger import log
 
 
 def parse_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--scenario_file", type=str, required=True,
-                        help="""Path to JSON file specifying
-                                the scenario to run.""")
+    scenarios = parser.add_mutually_exclusive_group(required=True)
+    scenarios.add_argument("--scenario_file", type=str,
+                           help="""Path to JSON file specifying
+                                   the scenario to run.""")
+    scenarios.add_argument("--batch", type=str,
+                           help="""Run every scenario in this directory, or
+                                   matching this glob pattern, and write
+                                   one JSON line of results per scenario
+                                   as soon as it finishes.""")
+    parser.add_argument("--outfile", type=str, default=None,
+                        help="""Where to write the results of --batch.
+                                Defaults to stdout.""")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="""Number of worker processes for --batch.
+                                Defaults to the number of CPUs.""")
     parser.add_argument("--visual", action="store_true", default=False,
                         help="""Visualize a single combat encounter.""")
     parser.add_argument("--num_encounters", type=int, default=1000,
                         help="""The number of encounters to run.""")
     parser.add_argument("--speed", type=float, default=0.4,
-                        help="""How many second to wait between refreshing the
-                                visualization.""")
+                        help="""How many seconds to wait between rounds of the
+                                visualization. 0 runs at full speed.""")
+    parser.add_argument("--fps", type=int, default=30,
+                        help="""Frame rate of the visualization.""")
     parser.add_argument("--grid_shape", nargs=2, type=int, default=[20, 20],
                         help="""Width and height of the battle grid.""")
     parser.add_argument("--map", type=str, default=None,
                         help="""Path to saved map file.""")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="""Random seed.""")
+    parser.add_argument("--checkpoint_file", type=str, default=None,
+                        help="""Periodically save progress to this file.""")
+    parser.add_argument("--checkpoint_every", type=int, default=1000,
+                        help="""Number of encounters between checkpoints.""")
+    parser.add_argument("--resume", action="store_true", default=False,
+                        help="""Continue from the last checkpoint saved to
+                                --checkpoint_file.""")
+    parser.add_argument("--record_file", type=str, default=None,
+                        help="""Record every encounter to this replay file.
+                                Play it back with replay.py.""")
+    parser.add_argument("--cache_dir", type=str, default=None,
+                        help="""Directory in which to cache results. Reruns
+                                with the same inputs are read from the cache
+                                and extended if more encounters are asked
+                                for. Only runs with --seed are cached.""")
+    parser.add_argument("--cache_size", type=int, default=100,
+                        help="""Maximum size of the cache in MB.""")
+    parser.add_argument("--pathfinder", type=str, default="astar",
+                        choices=sorted(PATHFINDERS),
+                        help="""How characters find their way to their
+                                targets. 'jps' finds shortest paths quickly
+                                on open maps, 'hpa' is faster on large
+                                walled maps, and 'dstar' repairs each
+                                character's last path rather than
+                                replanning in crowded melees.""")
+    parser.add_argument("--log_level", type=str, default="summary",
+                        choices=LOG_LEVELS,
+                        help="""How much of each encounter to log. 'none'
+                                only counts wins and rounds, 'summary' also
+                                keeps attack statistics per attacker,
+                                'sampled' also logs every attack of one in
+                                --log_every encounters, and 'full' logs
+                                every attack.""")
+    parser.add_argument("--log_every", type=int, default=100,
+                        help="""Log one in this many encounters with
+                                --log_level sampled.""")
+    parser.add_argument("--exact", action="store_true", default=False,
+                        help="""Compute the exact win probabilities of a
+                                small melee, as if everyone starts next
+                                to their target, rather than simulate
+                                encounters.""")
+    parser.add_argument("--fast_forward", action="store_true", default=False,
+                        help="""Once every character is next to its target,
+                                roll the rounds until someone drops at
+                                once rather than turn by turn.""")
+    parser.add_argument("--confidence", type=float, default=None,
+                        help="""Also report confidence intervals of DPR,
+                                hit ratio and win rates at this level,
+                                e.g. 0.95.""")
+    parser.add_argument("--ci_method", type=str, default="analytic",
+                        choices=["analytic", "bootstrap"],
+                        help="""How to compute --confidence intervals.""")
+    parser.add_argument("--log_file", type=str, default=None,
+                        help="""Save the attacks logged with --log_level
+                                sampled or full to this CSV file.""")
     return parser.parse_args()
 
 
-def load_character_sheets(indir):
-    chars_by_name = {}
-    for fname in os.listdir(indir):
-        if fname == "template.json":
-            continue
-        char_data = json.load(open(os.path.join(indir, fname)))
-        chars_by_name[char_data["name"].lower()] = char_data
-    return chars_by_name
-
-
-def load_monsters(infile):
-    monsters_data = (json.loads(line) for line in open(infile))
-    monsters_by_name = {m["name"].lower(): m for m in monsters_data}
-    return monsters_by_name
-
-
-def run(scenario_file, num_encounters, visual, speed, grid):
+def run(scenario_file, num_encounters, visual, speed, grid, seed=None,
+        cache_dir=None, cache_size=100, checkpoint_file=None,
+        checkpoint_every=1000, resume=False, fps=30, record_file=None,
+        pathfinder="astar", log_level="summary", log_every=100, log_file=None,
+        confidence=None, ci_method="analytic", fast_forward=False,
+        exact=False):
     curdir = os.path.dirname(__file__)
     char_sheets_dir = os.path.join(curdir, "assets/character_sheets")
     chars_by_name = load_character_sheets(char_sheets_dir)
@@ -51,38 +121,106 @@ def run(scenario_file, num_encounters, visual, speed, grid):
     monsters_by_name = load_monsters(monsters_file)
 
     scenario_data = json.load(open(scenario_file))
-
-    teams = []
-    for team_id in ["team1", "team2"]:
-        team_data = scenario_data[team_id]
-        team_members = []
-        for char_type, num in team_data["members"]:
-            (source, name) = char_type.split('.')
-            if source == "character":
-                data_dict = chars_by_name
-            elif source == "monster":
-                data_dict = monsters_by_name
-            else:
-                raise ValueError(f"Unsupported character source '{source}'.")
-            for i in range(num):
-                char_data = data_dict[name.lower()]
-                team_members.append(Character(**char_data))
-        team = Team(members=team_members, name=team_data["name"])
-        teams.append(team)
+    teams = build_teams(scenario_data, chars_by_name, monsters_by_name)
+    if exact is True:
+        try:
+            solution = win_probabilities(teams)
+        except ValueError as e:
+            print(f"{e} Run without --exact to simulate instead.",
+                  file=sys.stderr)
+            sys.exit(1)
+        print(format_exact(solution))
+        return
 
     log.debug(" vs. ".join([str(t) for t in teams]))
-    engine = Engine(*teams, grid=grid)
-    summary = engine.gameloop(num_encounters=num_encounters,
-                              visual=visual, speed=speed)
+    engine = Engine(*teams, grid=grid, pathfinder=PATHFINDERS[pathfinder],
+                    log_level=log_level, log_every=log_every,
+                    fast_forward=fast_forward)
+    recorder = None
+    if record_file is not None and visual is False:
+        recorder = ReplayRecorder(record_file)
+    # Recorded and unseeded runs are never read from the cache.
+    if cache_dir is not None and visual is False and recorder is None \
+            and seed is not None:
+        key = make_key(scenario_data, chars_by_name, monsters_by_name,
+                       grid, seed=seed, pathfinder=pathfinder,
+                       attacker_stats=log_level != "none",
+                       fast_forward=fast_forward)
+        cache = ResultCache(cache_dir, max_bytes=cache_size * 2**20)
+        summary = str(cached_run(engine, cache, key, num_encounters, seed))
+    else:
+        if seed is not None:
+            np.random.seed(seed)
+        summary = engine.gameloop(num_encounters=num_encounters,
+                                  visual=visual, speed=speed, fps=fps,
+                                  checkpoint_file=checkpoint_file,
+                                  checkpoint_every=checkpoint_every,
+                                  resume=resume, recorder=recorder,
+                                  confidence=confidence, ci_method=ci_method)
+    if recorder is not None:
+        recorder.close()
+    if log_file is not None and engine.logs != []:
+        pd.concat(engine.logs).to_csv(log_file, index=False)
     print(summary)
 
 
+def batch(pattern, outfile=None, num_encounters=1000, grid_shape=(20, 20),
+          map_file=None, seed=None, pathfinder="astar", processes=None):
+    curdir = os.path.dirname(__file__)
+    char_sheets_dir = os.path.join(curdir, "assets/character_sheets")
+    monsters_file = os.path.join(curdir,
+                                 "assets/5e_SRD_monsters_formatted.jsonl")
+    scenario_files = find_scenarios(pattern)
+    log.debug(f"Running batch of {len(scenario_files)} scenarios")
+    outF = sys.stdout if outfile is None else open(outfile, 'w')
+    try:
+        num_errors = run_batch(scenario_files, outF, char_sheets_dir,
+                               monsters_file, processes=processes, seed=seed,
+                               num_encounters=num_encounters,
+                               grid_shape=list(grid_shape), map=map_file,
+                               pathfinder=pathfinder)
+    finally:
+        if outfile is not None:
+            outF.close()
+    if num_errors > 0:
+        print(f"{num_errors} of {len(scenario_files)} scenarios failed.",
+              file=sys.stderr)
+
+
 if __name__ == "__main__":
     args = parse_args()
-    if args.map is not None:
-        map_matrix = np.load(args.map, allow_pickle=True)
-        grid = Grid.from_map_matrix(map_matrix)
-    else:
-        grid = Grid(shape=args.grid_shape)
+    if args.exact is True and (args.batch is not None or args.visual):
+        raise ValueError("--exact does not support --batch or --visual.")
+    if args.batch is not None:
+        if args.visual or args.record_file or args.checkpoint_file:
+            raise ValueError("--batch does not support --visual, --record_file or --checkpoint_file.")  # noqa
+        if args.log_level != "summary" or args.log_file or \
+                args.fast_forward or args.cache_dir or \
+                args.confidence is not None:
+            raise ValueError("--batch does not support --log_level, --log_file, --fast_forward, --cache_dir or --confidence.")  # noqa
+        batch(args.batch, args.outfile, args.num_encounters, args.grid_shape,
+              args.map, seed=args.seed, pathfinder=args.pathfinder,
+              processes=args.processes)
+        sys.exit()
+    if args.log_file is not None and \
+            args.log_level not in ["sampled", "full"]:
+        raise ValueError("--log_file requires --log_level sampled or full.")
+    if args.resume is True and args.checkpoint_file is None:
+        raise ValueError("--resume requires --checkpoint_file.")
+    if args.cache_dir is not None and \
+            (args.checkpoint_file is not None or args.resume is True):
+        raise ValueError("--checkpoint_file and --resume are not supported with --cache_dir.")  # noqa
+    if args.confidence is not None and args.cache_dir is not None:
+        raise ValueError("--confidence is not supported with --cache_dir.")  # noqa
+    if args.confidence is not None and args.checkpoint_file is not None:
+        raise ValueError("--confidence is not supported with --checkpoint_file.")  # noqa
+    grid = load_grid(args.map, args.grid_shape)
     run(args.scenario_file, args.num_encounters, args.visual,
-        args.speed, grid)
+        args.speed, grid, seed=args.seed, cache_dir=args.cache_dir,
+        cache_size=args.cache_size, checkpoint_file=args.checkpoint_file,
+        checkpoint_every=args.checkpoint_every, resume=args.resume,
+        fps=args.fps, record_file=args.record_file,
+        pathfinder=args.pathfinder, log_level=args.log_level,
+        log_every=args.log_every, log_file=args.log_file,
+        confidence=args.confidence, ci_method=args.ci_method,
+        fast_forward=args.fast_forward, exact=args.exact)
@@ -0,0 +1,47 @@
+import argparse
+import os
+import asyncio
+
+from combat_simulator.service import SimulationService
+from combat_simulator.logger import log
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", type=str, default=None,
+                        help="""Listen on this Unix socket. If not given,
+                                listen on localhost:--port.""")
+    parser.add_argument("--port", type=int, default=8765,
+                        help="""Port to listen on if --socket is not given.""")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="""Number of worker processes.
+                                Defaults to the number of CPUs.""")
+    parser.add_argument("--chunk_size", type=int, default=100,
+                        help="""Number of encounters between progress
+                                updates. Jobs are cancelled between
+                                chunks.""")
+    return parser.parse_args()
+
+
+def run(socket=None, port=8765, processes=None, chunk_size=100):
+    curdir = os.path.dirname(__file__)
+    char_sheets_dir = os.path.join(curdir, "assets/character_sheets")
+    monsters_file = os.path.join(curdir,
+                                 "assets/5e_SRD_monsters_formatted.jsonl")
+    service = SimulationService(char_sheets_dir, monsters_file,
+                                processes=processes, chunk_size=chunk_size)
+    where = socket if socket is not None else f"localhost:{port}"
+    log.debug(f"Serving simulations on {where}")
+    print(f"Serving simulations on {where}")
+    try:
+        asyncio.run(service.serve(path=socket, port=port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if socket is not None and os.path.exists(socket):
+            os.remove(socket)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.socket, args.port, args.processes, args.chunk_size)
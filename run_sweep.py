@@ -0,0 +1,58 @@
+import argparse
+import os
+import json
+
+from combat_simulator.sweep import expand_sweep, run_sweep
+from combat_simulator.logger import log
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sweep_file", type=str, required=True,
+                        help="""Path to JSON file specifying the scenario
+                                template and the axes to sweep over. Paths
+                                in it are relative to the sweep file.""")
+    parser.add_argument("--outfile", type=str, required=True,
+                        help="""Where to save the results table (CSV).""")
+    parser.add_argument("--num_encounters", type=int, default=None,
+                        help="""The number of encounters to run per job.
+                                Overrides the sweep file.""")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="""Number of worker processes.
+                                Defaults to the number of CPUs.""")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="""Base random seed.""")
+    return parser.parse_args()
+
+
+def run(sweep_file, outfile, num_encounters=None, processes=None, seed=None):
+    curdir = os.path.dirname(__file__)
+    char_sheets_dir = os.path.join(curdir, "assets/character_sheets")
+    monsters_file = os.path.join(curdir,
+                                 "assets/5e_SRD_monsters_formatted.jsonl")
+
+    sweep_data = json.load(open(sweep_file))
+    # Relative paths in the sweep file are relative to it.
+    sweep_dir = os.path.dirname(sweep_file)
+    scenario_file = os.path.join(sweep_dir, sweep_data["scenario_file"])
+    scenario_data = json.load(open(scenario_file))
+    if num_encounters is None:
+        num_encounters = sweep_data.get("num_encounters", 100)
+    axes = dict(sweep_data["axes"])
+    if "map" in axes:
+        axes["map"] = [None if map_file is None
+                       else os.path.join(sweep_dir, map_file)
+                       for map_file in axes["map"]]
+    jobs = expand_sweep(scenario_data, axes)
+    log.debug(f"Running sweep of {len(jobs)} jobs from {sweep_file}")
+    results = run_sweep(jobs, char_sheets_dir, monsters_file,
+                        num_encounters=num_encounters,
+                        processes=processes, seed=seed)
+    results.to_csv(outfile, index=False)
+    print(f"Saved {len(jobs)} jobs to {outfile}")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.sweep_file, args.outfile, args.num_encounters,
+        args.processes, args.seed)
@@ -0,0 +1,55 @@
+import argparse
+import os
+
+from combat_simulator.scenario import load_monsters
+from combat_simulator.tournament import (select_monsters, run_tournament,
+                                         save_tournament)
+from combat_simulator.logger import log
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--outfile", type=str, required=True,
+                        help="""Where to save the win matrix. Use a .csv
+                                extension for a CSV of win rates, otherwise
+                                a compressed .npz of win counts is saved.""")
+    parser.add_argument("--monsters", type=str, nargs='+', default=None,
+                        help="""Only use these monsters.""")
+    parser.add_argument("--filter", type=str, default=None,
+                        help="""Only use monsters whose name matches this
+                                regular expression.""")
+    parser.add_argument("--num_encounters", type=int, default=10,
+                        help="""The number of encounters per matchup.""")
+    parser.add_argument("--grid_shape", nargs=2, type=int, default=[10, 10],
+                        help="""Width and height of the battle grid.""")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="""Number of worker processes.
+                                Defaults to the number of CPUs.""")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="""Base random seed.""")
+    return parser.parse_args()
+
+
+def run(outfile, monsters=None, pattern=None, num_encounters=10,
+        grid_shape=(10, 10), processes=None, seed=None):
+    curdir = os.path.dirname(__file__)
+    monsters_file = os.path.join(curdir,
+                                 "assets/5e_SRD_monsters_formatted.jsonl")
+    monsters_by_name = load_monsters(monsters_file)
+    names = select_monsters(monsters_by_name, names=monsters, pattern=pattern)
+    monster_data = [monsters_by_name[name] for name in names]
+    num_pairs = len(names) * (len(names) - 1) // 2
+    log.debug(f"Tournament of {len(names)} monsters, {num_pairs} matchups")
+    print(f"Running {num_pairs} matchups between {len(names)} monsters.")
+    wins = run_tournament(monster_data, num_encounters=num_encounters,
+                          grid_shape=grid_shape, processes=processes,
+                          seed=seed)
+    display_names = [data["name"] for data in monster_data]
+    save_tournament(outfile, display_names, wins, num_encounters)
+    print(f"Saved to {outfile}")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.outfile, args.monsters, args.filter, args.num_encounters,
+        args.grid_shape, args.processes, args.seed)
@@ -5,7 +5,7 @@ with open("README.md", "r") as fh:
 
 setuptools.setup(
     name="5e-combat-simulator-jvasilakes",
-    version="0.0.1",
+    version="0.0.2",
     author="Jake Vasilakes",
     author_email="jvasilakes@gmail.com",
     description="A combat simulator for Dungeons and Dragons 5e",
@@ -0,0 +1,44 @@
+import numpy as np
+from pytest import raises
+
+from .context import combat_simulator  # noqa
+from combat_simulator import balance
+
+
+def _simulated_batch(win_rates):
+    rng = np.random.RandomState(0)
+    calls = []
+
+    def run_batch(count, n):
+        calls.append((count, n))
+        return rng.binomial(n, win_rates[count])
+    return run_batch, calls
+
+
+def test_search_decreasing():
+    # The win rate halves with every extra enemy.
+    win_rates = {c: 0.95 * 0.5**c for c in range(0, 11)}
+    win_rates[1] = 0.6
+    win_rates[2] = 0.45
+    run_batch, calls = _simulated_batch(win_rates)
+    balancer = balance.Balancer(run_batch, target=0.5, tolerance=0.02,
+                                batch_size=50, max_encounters=5000)
+    (count, p, (low, high)) = balancer.search(0, 10)
+    assert count in [1, 2]
+    assert low <= p <= high
+    # Counts far from the target are decided with few encounters.
+    assert balancer.evaluations[5][1] <= 100
+
+
+def test_search_increasing():
+    win_rates = {c: min(1.0, 0.1 * c) for c in range(0, 11)}
+    run_batch, calls = _simulated_batch(win_rates)
+    balancer = balance.Balancer(run_batch, target=0.5, tolerance=0.02,
+                                increasing=True, batch_size=50)
+    (count, p, interval) = balancer.search(0, 10)
+    assert count == 5
+
+    with raises(ValueError):
+        balancer.search(3, 2)
+    with raises(ValueError):
+        balance.Balancer(run_batch, target=1.5)
@@ -0,0 +1,49 @@
+import io
+import os
+import json
+import shutil
+from pytest import raises
+
+from .context import combat_simulator  # noqa
+from combat_simulator import batch
+
+curdir = os.path.dirname(__file__)
+assets_dir = os.path.join(curdir, "../assets")
+scenarios_dir = os.path.join(curdir, "../scenarios")
+
+
+def test_find_scenarios(tmp_path):
+    files = batch.find_scenarios(scenarios_dir)
+    assert len(files) == len(os.listdir(scenarios_dir))
+    assert batch.find_scenarios(os.path.join(scenarios_dir, "zombie*")) == \
+        [os.path.join(scenarios_dir, "zombie_apocalypse.json")]
+    with raises(ValueError):
+        batch.find_scenarios(str(tmp_path))
+
+
+def test_run_batch(tmp_path):
+    shutil.copy(os.path.join(scenarios_dir, "zombie_apocalypse.json"),
+                tmp_path)
+    with open(tmp_path / "bad.json", 'w') as outF:
+        json.dump({"team1": {"name": "one",
+                             "members": [["monster.Nobody", 1]]},
+                   "team2": {"name": "two",
+                             "members": [["monster.Zombie", 1]]}}, outF)
+    outF = io.StringIO()
+    num_errors = batch.run_batch(
+        batch.find_scenarios(str(tmp_path)), outF,
+        os.path.join(assets_dir, "character_sheets"),
+        os.path.join(assets_dir, "5e_SRD_monsters_formatted.jsonl"),
+        processes=2, seed=0, num_encounters=3, grid_shape=[6, 6])
+    assert num_errors == 1
+    lines = {os.path.basename(line["scenario_file"]): line for line
+             in map(json.loads, outF.getvalue().splitlines())}
+    assert set(lines) == {"bad.json", "zombie_apocalypse.json"}
+    assert "error" in lines["bad.json"]
+    line = lines["zombie_apocalypse.json"]
+    assert line["num_encounters"] == 3
+    assert sum(line["wins"].values()) == 3
+    assert line["seconds"] > 0
+    for attacker in line["attackers"]:
+        assert 0 <= attacker["hit_ratio"] <= 1
+        assert attacker["team"] in line["wins"]
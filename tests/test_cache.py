@@ -0,0 +1,112 @@
+import os
+import json
+
+from .context import combat_simulator
+from combat_simulator import cache, scenario
+
+
+Character = combat_simulator.token.Character
+Team = combat_simulator.encounter.Team
+Grid = combat_simulator.grid.Grid
+Engine = combat_simulator.engine.Engine
+
+curdir = os.path.dirname(__file__)
+
+
+def _make_engine():
+    test_data_dir = os.path.join(curdir, "test_data")
+    char_fpath = os.path.join(test_data_dir, "test_character_good.json")
+    char_data = json.load(open(char_fpath))
+    team1 = Team([Character(**char_data) for _ in range(2)], name="one")
+    team2 = Team([Character(**char_data) for _ in range(2)], name="two")
+    return Engine(team1, team2, grid=Grid((5, 5)))
+
+
+def _stats(results):
+    # Attacker ids differ between engines, so compare without them.
+    return (dict(results.wins), results.rounds,
+            sorted((name, s["attacks"], s["hits"], s["dmg"])
+                   for ((name, _), s) in results.attackers.items()))
+
+
+def test_make_key():
+    scenario_file = os.path.join(curdir, "../scenarios/unfair_fight.json")
+    scenario_data = json.load(open(scenario_file))
+    chars = {"jake": {"name": "Jake", "hp": 20}}
+    monsters = {"bugbear": {"name": "Bugbear", "hp": 27}}
+    key = cache.make_key(scenario_data, chars, monsters, Grid((5, 5)), seed=1)
+    assert key == cache.make_key(scenario_data, chars, monsters,
+                                 Grid((5, 5)), seed=1)
+    assert key != cache.make_key(scenario_data, chars, monsters,
+                                 Grid((5, 5)), seed=2)
+    assert key != cache.make_key(scenario_data, chars, monsters,
+                                 Grid((5, 6)), seed=1)
+    monsters["bugbear"]["hp"] = 30
+    assert key != cache.make_key(scenario_data, chars, monsters,
+                                 Grid((5, 5)), seed=1)
+    # Unused characters don't change the key.
+    monsters["bugbear"]["hp"] = 27
+    monsters["zombie"] = {"name": "Zombie"}
+    assert key == cache.make_key(scenario_data, chars, monsters,
+                                 Grid((5, 5)), seed=1)
+    assert len(cache.source_hash()) == 64
+
+
+def test_cached_run(tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path))
+    engine = _make_engine()
+    results = cache.cached_run(engine, result_cache, "key", 3, seed=0)
+    assert results.num_encounters == 3
+    hit = cache.cached_run(engine, result_cache, "key", 3, seed=0)
+    assert _stats(hit) == _stats(results)
+
+    # Extending the cached run matches running everything at once.
+    extended = cache.cached_run(engine, result_cache, "key", 8, seed=0)
+    assert extended.num_encounters == 8
+    uncached = cache.cached_run(_make_engine(), cache.ResultCache(
+        str(tmp_path / "other")), "key", 8, seed=0)
+    assert _stats(extended) == _stats(uncached)
+
+
+def _map_engine():
+    # Ten zombies fill their start area on this map, so it grows.
+    assets_dir = os.path.join(curdir, "../assets")
+    chars = scenario.load_character_sheets(
+        os.path.join(assets_dir, "character_sheets"))
+    monsters = scenario.load_monsters(
+        os.path.join(assets_dir, "5e_SRD_monsters_formatted.jsonl"))
+    scenario_file = os.path.join(curdir, "../scenarios/zombie_apocalypse.json")
+    teams = scenario.build_teams(json.load(open(scenario_file)), chars,
+                                 monsters)
+    grid = scenario.load_grid(os.path.join(curdir, "../maps/the_gate.npy"))
+    return Engine(*teams, grid=grid)
+
+
+def test_cached_run_on_map(tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path))
+    cache.cached_run(_map_engine(), result_cache, "key", 10, seed=1)
+    extended = cache.cached_run(_map_engine(), result_cache, "key", 20,
+                                seed=1)
+    uncached = cache.cached_run(_map_engine(), cache.ResultCache(
+        str(tmp_path / "other")), "key", 20, seed=1)
+    assert str(extended) == str(uncached)
+    assert extended.attackers == uncached.attackers
+
+
+def test_unseeded_run(tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path))
+    results = cache.cached_run(_make_engine(), result_cache, "key", 3)
+    assert results.num_encounters == 3
+    # Unseeded runs can't be reproduced, so they are not cached.
+    assert result_cache.get("key") is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_eviction(tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path), max_bytes=0)
+    engine = _make_engine()
+    cache.cached_run(engine, result_cache, "key1", 1, seed=0)
+    cache.cached_run(engine, result_cache, "key2", 1, seed=0)
+    # Only the most recent entry is kept.
+    assert result_cache.get("key1") is None
+    assert result_cache.get("key2") is not None
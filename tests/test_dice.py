@@ -23,3 +23,25 @@ def test_roll():
     assert isinstance(reg, np.int64)
     assert isinstance(adv, np.int64)
     assert isinstance(dis, np.int64)
+
+
+def test_roll_dice():
+    np.random.seed(0)
+    rolls = dice.roll_dice(d=20, num=1000)
+    assert rolls.shape == (1000,)
+    assert rolls.min() == 1 and rolls.max() == 20
+    adv = dice.roll_dice(d=20, num=1000, advantage=1)
+    dis = dice.roll_dice(d=20, num=1000, advantage=-1)
+    assert dis.mean() < rolls.mean() < adv.mean()
+
+
+def test_roll_dice_sums():
+    np.random.seed(0)
+    sums = dice.roll_dice_sums(6, [0, 1, 3])
+    assert sums[0] == 0
+    assert 1 <= sums[1] <= 6
+    assert 3 <= sums[2] <= 18
+    np.random.seed(0)
+    single = dice.roll_die(d=8, n=2)
+    np.random.seed(0)
+    assert dice.roll_dice_sums(8, [2])[0] == single
@@ -0,0 +1,87 @@
+import gc
+import weakref
+import numpy as np
+from collections import deque
+
+from .context import combat_simulator
+from combat_simulator import dstar  # noqa
+
+
+Token = combat_simulator.token.Token
+Grid = combat_simulator.grid.Grid
+distance = combat_simulator.astar.distance
+
+
+def shortest(start, end, adj):
+    dists = {start: 0}
+    frontier = deque([start])
+    while frontier:
+        current = frontier.popleft()
+        if distance(current, end) == 1:
+            return dists[current]
+        for n in adj[current]:
+            if n not in dists:
+                dists[n] = dists[current] + 1
+                frontier.append(n)
+    return None
+
+
+def test_dstar_shortest():
+    np.random.seed(0)
+    g = Grid((15, 15))
+    tokens = [Token(name="tok") for _ in range(40)]
+    for t in tokens:
+        g.add_token(t)
+    (pursuer, target, others) = (tokens[0], tokens[1], tokens[2:])
+    for _ in range(20):
+        adj = g.to_adjacency()
+        (start, end) = (g[pursuer], g[target])
+        path = dstar.dstar_lite(start, end, adj)
+        length = shortest(start, end, adj)
+        if length is not None:
+            assert len(path) - 1 == length
+            for (a, b) in zip(path, path[1:]):
+                assert b in adj[a]
+            g[pursuer] = path[min(2, len(path) - 1)]
+        # Shuffle some of the other tokens.
+        for t in others[:3]:
+            free = [n for n in g._get_adjacent_indices(g[t])
+                    if g._is_traversable(n)]
+            if free != []:
+                g[t] = free[np.random.choice(len(free))]
+
+
+def test_dstar_repair():
+    g = Grid((30, 30))
+    (pursuer, target, ally) = (Token(), Token(), Token())
+    g.add_token(pursuer, pos=(0, 0))
+    g.add_token(target, pos=(29, 29))
+    g.add_token(ally, pos=(20, 20))
+    planner = dstar.DStarLite(g, (0, 0), (29, 29))
+    path = planner.path()
+    assert len(path) - 1 == 57
+    initial = planner.expanded
+    g[ally] = (20, 21)
+    assert planner.replan((0, 0)) is True
+    planner.expanded = 0
+    assert len(planner.path()) - 1 == 57
+    assert planner.expanded < initial / 10
+    # Too many changes to repair.
+    for i in range(dstar._MAX_REPAIR + 1):
+        g.add_token(Token(), pos=(10 + i // 30, i % 30))
+    assert planner.replan((0, 0)) is False
+
+
+def test_planners_freed_with_grid():
+    refs = []
+    for _ in range(5):
+        g = Grid((10, 10))
+        (pursuer, target) = (Token(), Token())
+        g.add_token(pursuer, pos=(0, 0))
+        g.add_token(target, pos=(9, 9))
+        dstar.dstar_lite((0, 0), (9, 9), g.to_adjacency(), moves=3)
+        assert pursuer in g._planners
+        refs.append(weakref.ref(g))
+        del g
+    gc.collect()
+    assert all(ref() is None for ref in refs)
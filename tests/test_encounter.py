@@ -1,5 +1,6 @@
 import os
 import json
+import numpy as np
 import pandas as pd
 from pytest import raises
 
@@ -78,8 +79,8 @@ def test_create_encounter():
     encounter = Encounter(teams=[team1, team2], grid=grid, player=player)
     assert encounter is not None
 
-    assert encounter._team_lookup[team1_chars[0].id] == team1
-    assert encounter._team_lookup[team2_chars[2].id] == team2
+    assert encounter.get_team(team1_chars[0]) == team1
+    assert encounter.get_team(team2_chars[2]) == team2
     assert encounter._enemy_lookup[team1.name] == team2_chars
     assert encounter._enemy_lookup[team2.name] == team1_chars
 
@@ -122,7 +123,9 @@ def test_fight():
     seen = set()
     while True:
         start_hp = team2_chars[0].HP
-        hit, crit, dmg = encounter._fight(team1_chars[0], team2_chars[0])
+        hits, crits, dmgs = encounter._fight(team1_chars[0], team2_chars[0])
+        assert len(hits) == len(crits) == len(dmgs) == 1
+        (hit, crit, dmg) = (hits[0], crits[0], dmgs[0])
         seen.add((hit, crit))
         assert isinstance(hit, bool)
         assert isinstance(crit, bool)
@@ -132,6 +135,39 @@ def test_fight():
             break
 
 
+def test_fight_multiattack():
+    test_data_dir = os.path.join(curdir, "test_data")
+    good_char_fpath = os.path.join(test_data_dir, "test_character_good.json")
+    good_char_data = json.load(open(good_char_fpath))
+    attacker = Character(**dict(good_char_data, num_attacks=3))
+    victim = Character(**dict(good_char_data, hp=1000))
+    team1 = Team([attacker], name="team1")
+    team2 = Team([victim], name="team2")
+    grid = Grid((5, 5))
+    for c in [attacker, victim]:
+        grid.add_token(c)
+    encounter = Encounter(teams=[team1, team2], grid=grid,
+                          player=Player(name="test_player"))
+    encounter.init_combat()
+
+    np.random.seed(0)
+    for _ in range(20):
+        start_hp = victim.HP
+        hits, crits, dmgs = encounter._fight(attacker, victim)
+        assert len(hits) == 3
+        for (hit, crit, dmg) in zip(hits, crits, dmgs):
+            assert hit or not crit
+            assert (dmg > 0) == hit
+        assert victim.HP == start_hp - sum(dmgs)
+
+    # No attacks are made after the victim drops.
+    victim.HP = 1
+    while victim.is_alive:
+        hits, crits, dmgs = encounter._fight(attacker, victim)
+    assert hits[-1] is True
+    assert sum(hits) == 1
+
+
 def test_run_combat():
     test_data_dir = os.path.join(curdir, "test_data")
     good_char_fpath = os.path.join(test_data_dir, "test_character_good.json")
@@ -153,3 +189,6 @@ def test_run_combat():
 
     assert isinstance(encounter.log, pd.DataFrame)
     assert encounter.log.shape[0] >= len(rounds)
+    log = encounter.log
+    assert set(log["attacker_id"]) <= {c.eid for c in team1_chars + team2_chars}  # noqa
+    assert (log["attacker_name"] == good_char_data["name"]).all()
@@ -1,10 +1,11 @@
 import os
+import asyncio
 import json
 import numpy as np
-import pytest
 from pytest import raises
 
 from .context import combat_simulator
+from combat_simulator import scenario
 
 
 Character = combat_simulator.token.Character
@@ -85,7 +86,6 @@ def test_initialize_encounter_visual():
         assert char.speed == 5
 
 
-@pytest.mark.xfail
 def test_gameloop():
     test_data_dir = os.path.join(curdir, "test_data")
     char_fpath = os.path.join(test_data_dir, "test_character_good.json")
@@ -99,3 +99,172 @@ def test_gameloop():
     summary = engine.gameloop(visual=False, num_encounters=10)
     assert isinstance(summary, str)
     assert len(summary) > 0
+    with raises(ValueError):
+        engine.gameloop(visual=False, num_encounters=10, confidence=0.95,
+                        checkpoint_file="checkpoint.json")
+
+
+def test_checkpoint_resume(tmp_path):
+    test_data_dir = os.path.join(curdir, "test_data")
+    char_fpath = os.path.join(test_data_dir, "test_character_good.json")
+    char_data = json.load(open(char_fpath))
+    team1 = Team([Character(**char_data) for _ in range(2)], name="one")
+    team2 = Team([Character(**char_data) for _ in range(2)], name="two")
+    engine = Engine(team1, team2, grid=Grid((5, 5)))
+    checkpoint_file = str(tmp_path / "checkpoint.json")
+
+    np.random.seed(0)
+    initial_state = engine.get_state()
+    uninterrupted = engine.run(num_encounters=10, progress=False)
+
+    engine.set_state(initial_state)
+    engine.run(num_encounters=7, progress=False,
+               checkpoint_file=checkpoint_file, checkpoint_every=3)
+    # Scramble the state the checkpoint should restore.
+    np.random.randint(100, size=10)
+    for character in team1.members():
+        character.HP = 1
+    resumed = engine.load_checkpoint(checkpoint_file)
+    assert resumed.num_encounters == 7
+    resumed = engine.run(num_encounters=3, results=resumed, progress=False)
+    assert str(resumed) == str(uninterrupted)
+    assert resumed.attackers == uninterrupted.attackers
+
+
+def _map_engine():
+    # Ten zombies fill their start area on this map, so it grows.
+    assets_dir = os.path.join(curdir, "../assets")
+    chars = scenario.load_character_sheets(
+        os.path.join(assets_dir, "character_sheets"))
+    monsters = scenario.load_monsters(
+        os.path.join(assets_dir, "5e_SRD_monsters_formatted.jsonl"))
+    scenario_file = os.path.join(curdir, "../scenarios/zombie_apocalypse.json")
+    teams = scenario.build_teams(json.load(open(scenario_file)), chars,
+                                 monsters)
+    grid = scenario.load_grid(os.path.join(curdir, "../maps/the_gate.npy"))
+    return Engine(*teams, grid=grid)
+
+
+def test_checkpoint_resume_on_map(tmp_path):
+    checkpoint_file = str(tmp_path / "checkpoint.json")
+    np.random.seed(1)
+    uninterrupted = _map_engine().run(num_encounters=20, progress=False)
+
+    np.random.seed(1)
+    engine = _map_engine()
+    start_sizes = {team: len(positions) for (team, positions)
+                   in engine.grid._start_positions.items()}
+    engine.run(num_encounters=10, progress=False,
+               checkpoint_file=checkpoint_file, checkpoint_every=10)
+    assert {team: len(positions) for (team, positions)
+            in engine.grid._start_positions.items()} != start_sizes
+    resumed_engine = _map_engine()
+    resumed = resumed_engine.load_checkpoint(checkpoint_file)
+    resumed = resumed_engine.run(num_encounters=10, results=resumed,
+                                 progress=False)
+    assert str(resumed) == str(uninterrupted)
+    assert resumed.attackers == uninterrupted.attackers
+
+
+def test_resume_sampled_logs():
+    test_data_dir = os.path.join(curdir, "test_data")
+    char_fpath = os.path.join(test_data_dir, "test_character_good.json")
+    char_data = json.load(open(char_fpath))
+
+    def make_engine():
+        team1 = Team([Character(**char_data) for _ in range(2)], name="one")
+        team2 = Team([Character(**char_data) for _ in range(2)], name="two")
+        return Engine(team1, team2, grid=Grid((5, 5)), log_level="sampled",
+                      log_every=4)
+
+    np.random.seed(0)
+    engine = make_engine()
+    engine.run(num_encounters=5, progress=False)
+    state = json.loads(json.dumps(engine.get_state()))
+    resumed = make_engine()
+    resumed.set_state(state)
+    resumed.run(num_encounters=5, progress=False)
+    # Only encounter 8 of encounters 5 to 9 is sampled.
+    assert len(resumed.logs) == 1
+
+
+def test_log_levels():
+    test_data_dir = os.path.join(curdir, "test_data")
+    char_fpath = os.path.join(test_data_dir, "test_character_good.json")
+    char_data = json.load(open(char_fpath))
+    with raises(ValueError):
+        Engine(grid=Grid((5, 5)), log_level="verbose")
+
+    results = {}
+    for log_level in ["none", "summary", "sampled", "full"]:
+        team1 = Team([Character(**char_data) for _ in range(2)], name="one")
+        team2 = Team([Character(**char_data) for _ in range(2)], name="two")
+        engine = Engine(team1, team2, grid=Grid((5, 5)),
+                        log_level=log_level, log_every=4)
+        np.random.seed(0)
+        results[log_level] = engine.run(num_encounters=10, progress=False)
+        if log_level == "sampled":
+            # Encounters 0, 4 and 8.
+            assert len(engine.logs) == 3
+        elif log_level == "full":
+            assert len(engine.logs) == 10
+        else:
+            assert engine.logs == []
+    for log_level in ["none", "summary", "sampled"]:
+        assert results[log_level].wins == results["full"].wins
+        assert results[log_level].rounds == results["full"].rounds
+    assert results["none"].attackers == {}
+    assert results["summary"].attackers == results["full"].attackers
+    assert results["sampled"].attackers == results["full"].attackers
+
+
+def test_diff_frames():
+    diff_frames = combat_simulator.engine.diff_frames
+    old = {(0, 0): 'J', (1, 1): 'Z', (2, 2): '#'}
+    new = {(0, 1): 'J', (1, 1): 'Z', (2, 2): '#', (3, 3): 'Z'}
+    changed = dict(diff_frames(old, new))
+    assert changed == {(0, 1): 'J', (3, 3): 'Z', (0, 0): '·'}
+    assert diff_frames(new, new) == []
+
+
+def test_visual_controls():
+    controls = combat_simulator.engine.VisualControls(delay=0.1)
+    controls.handle_key('p')
+    assert not controls.running.is_set()
+    controls.handle_key('n')
+    assert controls.running.is_set() and controls.stepping is True
+    controls.handle_key('+')
+    assert controls.delay == 0.05
+    controls.delay = 0.001
+    controls.handle_key('+')
+    assert controls.delay == 0
+    controls.handle_key('-')
+    assert controls.delay == 0.001
+    controls.handle_key('q')
+    assert controls.quit is True
+
+
+def test_simulate():
+    test_data_dir = os.path.join(curdir, "test_data")
+    char_fpath = os.path.join(test_data_dir, "test_character_good.json")
+    char_data = json.load(open(char_fpath))
+    team1 = Team([Character(**char_data) for _ in range(2)], name="one")
+    team2 = Team([Character(**char_data) for _ in range(2)], name="two")
+    engine = Engine(team1, team2, grid=Grid((5, 5)))
+    enc = engine.initialize_encounter(visual=True)
+
+    async def simulate():
+        controls = combat_simulator.engine.VisualControls(delay=0)
+        frames = asyncio.Queue(maxsize=2)
+        rounds = await engine._simulate(enc, frames, controls)
+        return rounds, frames
+
+    rounds, frames = asyncio.run(simulate())
+    assert enc.winner is not None
+    assert rounds > 0
+    # Old frames were dropped rather than blocking the simulation.
+    assert frames.qsize() <= 2
+    last = None
+    while not frames.empty():
+        last = frames.get_nowait()
+    assert last == engine.grid.frame()
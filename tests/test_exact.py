@@ -0,0 +1,87 @@
+import os
+import json
+import numpy as np
+import pytest
+
+from .context import combat_simulator
+from combat_simulator import exact  # noqa
+
+Character = combat_simulator.token.Character
+Team = combat_simulator.encounter.Team
+Grid = combat_simulator.grid.Grid
+Engine = combat_simulator.engine.Engine
+
+curdir = os.path.dirname(__file__)
+
+
+def _char_data(**kwargs):
+    test_data_dir = os.path.join(curdir, "test_data")
+    char_fpath = os.path.join(test_data_dir, "test_character_good.json")
+    return dict(json.load(open(char_fpath)), **kwargs)
+
+
+def _teams(data1, data2):
+    return [Team([Character(**data1)], name="one"),
+            Team([Character(**data2)], name="two")]
+
+
+def test_turn_damage_pmf():
+    attack = Character(**_char_data()).get_attack()
+    pmf = exact.turn_damage_pmf(attack, ac=10)
+    assert np.isclose(pmf.sum(), 1)
+    # Punch is 1d4 + 1 at +1 to hit: rolls of 9 to 19 hit, 20 crits.
+    mean = 11 / 20 * 3.5 + 1 / 20 * 6
+    assert np.isclose(pmf @ np.arange(len(pmf)), mean)
+    assert np.isclose(pmf[0], 8 / 20)
+    assert len(pmf) == 10
+    pmf = exact.turn_damage_pmf(attack, ac=10, num_attacks=2)
+    assert np.isclose(pmf @ np.arange(len(pmf)), 2 * mean)
+    assert np.allclose(exact.turn_damage_pmf(None, ac=10), [1])
+
+
+def test_initiative_orders():
+    (c1, c2) = [Character(**_char_data()) for _ in range(2)]
+    orders = exact.initiative_orders([c1, c2])
+    # Ties go to the first combatant.
+    assert np.isclose(orders[(0, 1)], 210 / 400)
+    assert np.isclose(orders[(1, 0)], 190 / 400)
+
+
+def test_one_hit_duel():
+    teams = _teams(_char_data(hp=1), _char_data(hp=1))
+    solution = exact.win_probabilities(teams)
+    # Either drops the other with a hit, which has a chance of 0.6.
+    (p, first) = (0.6, 210 / 400)
+    p_first_wins = p / (1 - (1 - p)**2)
+    expected = first * p_first_wins + (1 - first) * (1 - p_first_wins)
+    assert np.isclose(solution["wins"]["one"], expected)
+    assert np.isclose(sum(solution["wins"].values()), 1)
+    assert np.isclose(solution["rounds"], 1 / (1 - (1 - p)**2))
+
+
+def test_agrees_with_engine():
+    data1 = _char_data(hp=14, num_attacks=2)
+    data2 = _char_data(hp=25, ac=12)
+    solution = exact.win_probabilities(_teams(data1, data2))
+    teams = _teams(data1, data2)
+    # Everyone is in melee from the first turn on a small grid.
+    engine = Engine(*teams, grid=Grid((2, 2)), log_level="none")
+    np.random.seed(0)
+    num_encounters = 1000
+    results = None
+    for _ in range(num_encounters):
+        for team in teams:
+            for c in team.members():
+                c.reset()
+        results = engine.run(1, results=results, progress=False)
+    win_rate = results.wins["one"] / num_encounters
+    p = solution["wins"]["one"]
+    assert abs(win_rate - p) < 4 * np.sqrt(p * (1 - p) / num_encounters)
+    rounds = results.rounds / num_encounters
+    assert abs(rounds - solution["rounds"]) < 0.05 * solution["rounds"]
+
+
+def test_max_states():
+    teams = _teams(_char_data(hp=100), _char_data(hp=100))
+    with pytest.raises(ValueError):
+        exact.win_probabilities(teams, max_states=1000)
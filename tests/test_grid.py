@@ -6,6 +6,7 @@ from .context import combat_simulator
 
 Grid = combat_simulator.grid.Grid
 Token = combat_simulator.token.Token
+components = combat_simulator.components
 
 
 def test_screen_size():
@@ -216,3 +217,160 @@ def test_is_adjacent():
     assert g.is_adjacent(t1, t2) is True
     assert g.is_adjacent(t1, t3) is False
     assert g.is_adjacent(t2, t3) is False
+
+
+def test_frame():
+    g = Grid((3, 3))
+    t = Token(name="tok", icon='T')
+    g.add_token(t, pos=(1, 1))
+    g.add_token(Token(name="wall", icon='#'), pos=(0, 0))
+    assert g.frame() == {(1, 1): 'T', (0, 0): '#'}
+    g[t] = (2, 1)
+    assert g.frame() == {(2, 1): 'T', (0, 0): '#'}
+
+
+def test_from_map_matrix_walls():
+    mat = np.full((4, 5), '.')
+    mat[:, 2] = '#'
+    mat[(3, 2)] = '.'
+    mat[(0, 0)] = '2'
+    g = Grid.from_map_matrix(mat)
+    assert g._pos2tok == {}
+    assert g[(0, 2)] is g[(1, 2)]
+    assert g[(0, 2)].name == "wall"
+    assert g[(3, 2)] is None
+    assert g._is_traversable((0, 2)) is False
+    assert set(g._start_positions[2]) == {(0, 0), (0, 1), (1, 0),
+                                          (1, 1), (2, 0)}
+    t = Token(name="tok")
+    g.add_token(t, pos=(3, 3))
+    g.clear_tokens()
+    assert g[(2, 2)].name == "wall"
+    assert g._grid.sum() == 3
+    g.rm_wall((1, 2))
+    assert g[(1, 2)] is None
+    assert g._is_traversable((1, 2)) is True
+
+
+def test_from_map_codes():
+    mat = np.full((3, 3), '.')
+    mat[(1, 1)] = '#'
+    mat[(0, 0)] = 'u'
+    mat[(0, 2)] = '1'
+    codes = combat_simulator.mapfile.matrix_to_codes(mat)
+    g1 = Grid.from_map_matrix(mat)
+    g2 = Grid.from_map_codes(codes)
+    assert str(g1) == str(g2)
+    assert set(g1._start_positions[1]) == set(g2._start_positions[1])
+    # Start positions are not tokens, so are not saved back.
+    codes[(0, 2)] = combat_simulator.mapfile.FLOOR
+    assert (combat_simulator.mapfile.grid_to_codes(g2) == codes).all()
+
+
+def test_render_viewport():
+    gold = """┏━━━┓
+┃# ·┃
+┃T ·┃
+┗━━━┛"""
+    mat = np.full((4, 4), '.')
+    mat[(1, 1)] = '#'
+    g = Grid.from_map_matrix(mat)
+    t = Token(name="tok", icon='T')
+    g.add_token(t, pos=(2, 1))
+    g.add_token(Token(name="tok", icon='U'), pos=(0, 0))
+    assert g.render(origin=(1, 1), shape=(2, 2)) == gold
+    assert g.render() == str(g)
+    assert g.frame(origin=(1, 1), shape=(2, 2)) == {(2, 1): 'T'}
+
+
+def test_large_grid():
+    g = Grid((2000, 2000))
+    assert g._grid.nbytes == 2000 * 2000
+    t = Token(name="tok")
+    g.add_token(t, pos=(1000, 1000))
+    adj = g.to_adjacency()
+    assert adj[(1000, 999)] == {(999, 999), (1001, 999), (1000, 998)}
+    assert adj[(-1, 0)] == set()
+    g.clear_tokens()
+    assert g._pos2tok == {}
+    assert adj[(1000, 999)] == {(999, 999), (1001, 999),
+                                (1000, 998), (1000, 1000)}
+
+
+def test_changes_since():
+    g = Grid((3, 3))
+    version = g._version
+    t = Token(name="tok")
+    g.add_token(t, pos=(0, 0))
+    g[t] = (0, 1)
+    assert sorted(g.changes_since(version)) == [(0, 0), (0, 0), (0, 1)]
+    assert g.changes_since(g._version) == []
+    g.change_shape((4, 4))
+    assert g.changes_since(version) is None
+
+
+def test_reachable():
+    mat = np.full((5, 5), '.')
+    mat[:, 2] = '#'
+    mat[2, 2] = '.'
+    g = Grid.from_map_matrix(mat)
+    (t1, t2, t3) = (Token(), Token(), Token())
+    g.add_token(t1, pos=(0, 0))
+    g.add_token(t2, pos=(4, 4))
+    assert g.reachable((0, 0), (4, 4)) is True
+    # Block the gap in the wall.
+    g.add_token(t3, pos=(2, 2))
+    assert g.reachable((0, 0), (4, 4)) is False
+    assert g.reachable((0, 0), (2, 2)) is True
+    g[t3] = (1, 1)
+    assert g.reachable((0, 0), (4, 4)) is True
+    # Surrounded.
+    g[t1] = (0, 3)
+    g.add_token(Token(), pos=(0, 4))
+    g.add_token(Token(), pos=(1, 3))
+    assert g.reachable((0, 3), (4, 4)) is False
+    g.rm_token(g[(1, 3)])
+    assert g.reachable((0, 3), (4, 4)) is True
+
+
+def test_label_components():
+    occupied = np.zeros((5, 7), dtype=int)
+    # A corridor that winds back and forth.
+    occupied[1, :6] = 1
+    occupied[3, 1:] = 1
+    labels = components.label_components(occupied)
+    assert (labels[(occupied == 0).ravel()] == 0).all()
+    occupied[1, 6] = 1
+    labels = components.label_components(occupied).reshape(occupied.shape)
+    assert labels[0, 0] == 0
+    assert (labels[2:, :][occupied[2:, :] == 0] == 14).all()
+
+
+def test_components_split():
+    occupied = np.zeros((30, 30), dtype=int)
+    comps = components.Components(occupied)
+    for pos in [(0, 1), (1, 0)]:
+        occupied[pos] = 1
+        comps.occupied_cell(pos)
+    # Only the corner that was cut off is filled and labelled again.
+    assert comps._dirty is False
+    assert comps.component((0, 0)) != comps.component((5, 5))
+    assert comps.component((2, 0)) == comps.component((29, 29))
+
+    rng = np.random.RandomState(0)
+    occupied = (rng.rand(12, 15) < 0.3).astype(int)
+    comps = components.Components(occupied)
+    for _ in range(300):
+        pos = (rng.randint(12), rng.randint(15))
+        occupied[pos] = 1 - occupied[pos]
+        if occupied[pos] == 0:
+            comps.freed(pos)
+        else:
+            comps.occupied_cell(pos)
+        labels = components.label_components(occupied)
+        free = np.argwhere(occupied == 0)
+        pairs = {(comps.component(tuple(p)), labels[p[0] * 15 + p[1]])
+                 for p in free}
+        # The same partition of the free cells.
+        assert len(pairs) == len({a for (a, _) in pairs}) == \
+            len({b for (_, b) in pairs})
@@ -0,0 +1,89 @@
+import numpy as np
+from collections import deque
+
+from .context import combat_simulator
+from combat_simulator import hpa  # noqa
+
+
+Token = combat_simulator.token.Token
+Grid = combat_simulator.grid.Grid
+astar = combat_simulator.astar.astar
+distance = combat_simulator.astar.distance
+
+
+def make_grid():
+    # Rows of walls, each with a single gap at alternating ends.
+    mat = np.full((40, 40), '.')
+    for y in range(5, 40, 6):
+        mat[y, :] = '#'
+        mat[y, 0 if (y // 6) % 2 == 0 else 39] = '.'
+    return Grid.from_map_matrix(mat)
+
+
+def shortest(start, end, adj):
+    dists = {start: 0}
+    frontier = deque([start])
+    while frontier:
+        current = frontier.popleft()
+        if distance(current, end) == 1:
+            return dists[current]
+        for n in adj[current]:
+            if n not in dists:
+                dists[n] = dists[current] + 1
+                frontier.append(n)
+    return None
+
+
+def check_path(path, start, end, adj):
+    assert path[0] == start
+    assert distance(path[-1], end) == 1
+    for (a, b) in zip(path, path[1:]):
+        assert b in adj[a]
+
+
+def test_hpa_path():
+    g = make_grid()
+    start = (0, 20)
+    end = (39, 20)
+    g.add_token(Token(name="start"), pos=start)
+    g.add_token(Token(name="end"), pos=end)
+    adj = g.to_adjacency()
+    path = hpa.hpa_star(start, end, adj)
+    check_path(path, start, end, adj)
+    # HPA* paths are near optimal.
+    assert len(path) - 1 <= 1.1 * shortest(start, end, adj)
+    assert hpa.hpa_star(start, end, adj, moves=4) == path[:5]
+
+
+def test_hpa_blocked():
+    g = make_grid()
+    start = (0, 20)
+    end = (39, 20)
+    g.add_token(Token(name="start"), pos=start)
+    g.add_token(Token(name="end"), pos=end)
+    adj = g.to_adjacency()
+    path = hpa.hpa_star(start, end, adj)
+    # Block the path a few steps ahead.
+    g.add_token(Token(name="blocker"), pos=path[3])
+    new_path = hpa.hpa_star(start, end, adj)
+    check_path(new_path, start, end, adj)
+    assert path[3] not in new_path
+
+
+def test_hpa_adjacent_and_fallback():
+    g = make_grid()
+    g.add_token(Token(name="a"), pos=(0, 0))
+    g.add_token(Token(name="b"), pos=(0, 1))
+    assert hpa.hpa_star((0, 0), (0, 1), g.to_adjacency()) == [(0, 0)]
+    adj = {(0, 0): {(0, 1)}, (0, 1): {(0, 0), (0, 2)}, (0, 2): {(0, 1)}}
+    assert hpa.hpa_star((0, 0), (0, 3), adj) == astar((0, 0), (0, 3), adj)
+
+
+def test_abstract_graph_cache():
+    g1 = make_grid()
+    g2 = make_grid()
+    graph = hpa.abstract_graph(g1)
+    assert hpa.abstract_graph(g2) is graph
+    g2.rm_wall((5, 20))
+    assert hpa.abstract_graph(g2) is not graph
+    assert hpa.abstract_graph(g1) is graph
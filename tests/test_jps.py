@@ -0,0 +1,77 @@
+import numpy as np
+from collections import deque
+
+from .context import combat_simulator
+from combat_simulator import jps  # noqa
+
+
+Token = combat_simulator.token.Token
+Grid = combat_simulator.grid.Grid
+astar = combat_simulator.astar.astar
+distance = combat_simulator.astar.distance
+
+
+def shortest(start, end, adj):
+    dists = {start: 0}
+    frontier = deque([start])
+    while frontier:
+        current = frontier.popleft()
+        if distance(current, end) == 1:
+            return dists[current]
+        for n in adj[current]:
+            if n not in dists:
+                dists[n] = dists[current] + 1
+                frontier.append(n)
+    return None
+
+
+def test_jps_shortest():
+    np.random.seed(0)
+    for clutter in [0.0, 0.1, 0.3]:
+        for _ in range(20):
+            g = Grid((30, 30))
+            g._grid[np.random.rand(30, 30) < clutter] = 1
+            free = np.argwhere(g._grid == 0).tolist()
+            (i, j) = np.random.choice(len(free), size=2, replace=False)
+            (start, end) = (tuple(free[i]), tuple(free[j]))
+            g._grid[start] = 1
+            g._grid[end] = 1
+            adj = g.to_adjacency()
+            length = shortest(start, end, adj)
+            path = jps.jps(start, end, adj)
+            if length is None:
+                # Falls back to astar when end can't be reached.
+                assert path == astar(start, end, adj)
+                continue
+            assert len(path) - 1 == length
+            assert path[0] == start
+            assert distance(path[-1], end) == 1
+            for (a, b) in zip(path, path[1:]):
+                assert b in adj[a]
+
+
+def test_jps_moves():
+    g = Grid((5, 3))
+    for pos in [(1, 1), (2, 0), (2, 1), (3, 1)]:
+        g.add_token(Token(name="obs", icon='#'), pos=pos)
+    start = (0, 2)
+    end = (4, 0)
+    g.add_token(Token(name="start", icon='S'), pos=start)
+    g.add_token(Token(name="end", icon='E'), pos=end)
+    adj = g.to_adjacency()
+    gold_path = [(0, 2), (1, 2), (2, 2), (3, 2), (4, 2), (4, 1)]
+    assert jps.jps(start, end, adj) == gold_path
+    assert jps.jps(start, end, adj, moves=3) == gold_path[:4]
+    assert jps.jps((4, 1), end, adj) == [(4, 1)]
+
+
+def test_jps_open_expansions():
+    g = Grid((50, 50))
+    (start, end) = ((0, 0), (49, 49))
+    g._grid[start] = 1
+    g._grid[end] = 1
+    search = jps.JumpPointSearch(g, end)
+    path = search.search(start)
+    assert len(path) - 1 == 97
+    # A* would expand most of the grid.
+    assert search.expanded < 10
@@ -0,0 +1,115 @@
+import os
+import json
+import numpy as np
+import pytest
+
+from .context import combat_simulator
+from combat_simulator import kernel  # noqa
+
+
+Character = combat_simulator.token.Character
+Team = combat_simulator.encounter.Team
+Grid = combat_simulator.grid.Grid
+Engine = combat_simulator.engine.Engine
+Results = combat_simulator.results.Results
+stats = combat_simulator.stats
+
+curdir = os.path.dirname(__file__)
+
+
+def make_engine(sizes=(3, 2), shape=(8, 8), num_attacks=(1, 1)):
+    test_data_dir = os.path.join(curdir, "test_data")
+    char_fpath = os.path.join(test_data_dir, "test_character_good.json")
+    char_data = json.load(open(char_fpath))
+    teams = [Team([Character(**dict(char_data, num_attacks=num))
+                   for _ in range(size)], name=name)
+             for (size, num, name) in zip(sizes, num_attacks, ["one", "two"])]
+    return Engine(*teams, grid=Grid(shape))
+
+
+def summarize(results):
+    attacks = sum(s["attacks"] for s in results.attackers.values())
+    hits = sum(s["hits"] for s in results.attackers.values())
+    return (results.wins["one"] / results.num_encounters,
+            results.rounds / results.num_encounters,
+            hits / attacks)
+
+
+def test_backends():
+    assert {"python", "numpy"} <= set(kernel.BACKENDS)
+    assert kernel.default_backend() in kernel.BACKENDS
+    with pytest.raises(ValueError):
+        kernel.run(make_engine(), 1, backend="fortran")
+
+
+def test_python_numpy_agree():
+    # Both use the global random number generator the same way.
+    summaries = []
+    for backend in ["python", "numpy"]:
+        np.random.seed(0)
+        results = kernel.run(make_engine(), 20, backend=backend)
+        summaries.append(summarize(results))
+    assert summaries[0] == summaries[1]
+
+
+def test_keep_encounters():
+    engine = make_engine()
+    np.random.seed(0)
+    results = Results(team_names=["one", "two"], keep_encounters=True)
+    results = kernel.run(engine, 50, backend="numpy", results=results)
+    # Some encounters are stopped, and counted as draws.
+    results = kernel.run(engine, 10, backend="numpy", results=results,
+                         max_rounds=1)
+    assert results.draws > 0
+    assert sum(results.wins.values()) + results.draws == 60
+    assert len(results.encounters) == 60
+    (attackers, teams) = stats.confidence_intervals(results)
+    assert teams["wins"].sum() + results.draws == 60
+    for row in attackers.itertuples():
+        counts = results.attackers[(row.attacker_name, row.attacker_id)]
+        assert np.isclose(row.dpr, counts["dmg"] / counts["hits"])
+    assert "Draws" in str(results)
+    data = json.loads(json.dumps(results.to_dict()))
+    assert Results.from_dict(data).draws == results.draws
+
+
+def test_hp_carries_over():
+    engine = make_engine()
+    np.random.seed(0)
+    results = kernel.run(engine, 1, backend="numpy")
+    winner = [t for t in engine.teams if t.name in results.wins][0]
+    assert len(winner.members(alive_only=True)) > 0
+    for team in engine.teams:
+        for c in team.members():
+            assert engine.registry.hp[c.eid] == c.HP
+
+
+@pytest.mark.parametrize("backend", kernel.BACKENDS)
+def test_agrees_with_engine(backend):
+    num_encounters = 300
+    np.random.seed(0)
+    expected = summarize(make_engine().run(num_encounters, progress=False))
+    np.random.seed(1)
+    observed = summarize(kernel.run(make_engine(), num_encounters,
+                                    backend=backend))
+    win_rate = (expected[0] + observed[0]) / 2
+    stderr = np.sqrt(2 * win_rate * (1 - win_rate) / num_encounters)
+    assert abs(expected[0] - observed[0]) < 4 * stderr
+    assert abs(expected[1] - observed[1]) < 0.25 * expected[1]
+    assert abs(expected[2] - observed[2]) < 0.05
+
+
+def test_multiattack_agrees_with_engine():
+    num_encounters = 300
+    kwargs = {"sizes": (1, 3), "num_attacks": (3, 1)}
+    np.random.seed(0)
+    expected = summarize(make_engine(**kwargs).run(num_encounters,
+                                                   progress=False))
+    np.random.seed(1)
+    observed = summarize(kernel.run(make_engine(**kwargs), num_encounters,
+                                    backend="numpy"))
+    win_rate = (expected[0] + observed[0]) / 2
+    stderr = np.sqrt(2 * win_rate * (1 - win_rate) / num_encounters)
+    assert 0.1 < expected[0] < 0.9
+    assert abs(expected[0] - observed[0]) < 4 * stderr
+    assert abs(expected[1] - observed[1]) < 0.25 * expected[1]
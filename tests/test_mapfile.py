@@ -0,0 +1,76 @@
+import os
+import numpy as np
+from pytest import raises
+
+from .context import combat_simulator
+from combat_simulator import mapfile
+
+
+Grid = combat_simulator.grid.Grid
+Token = combat_simulator.token.Token
+
+curdir = os.path.dirname(__file__)
+maps_dir = os.path.join(curdir, "../maps")
+
+
+def test_matrix_codes_roundtrip():
+    matrix = np.load(os.path.join(maps_dir, "the_gate.npy"))
+    codes = mapfile.matrix_to_codes(matrix)
+    assert codes.dtype == np.uint8
+    assert (codes[matrix == '#'] == mapfile.WALL).all()
+    assert (codes[matrix == '.'] == mapfile.FLOOR).all()
+    assert (codes[matrix == '2'] == mapfile.START + 2).all()
+    assert (mapfile.codes_to_matrix(codes) == matrix).all()
+
+    matrix[0, 0] = 'u'
+    codes = mapfile.matrix_to_codes(matrix)
+    assert codes[0, 0] == ord('u')
+    assert mapfile.codes_to_matrix(codes)[0, 0] == 'u'
+    matrix = matrix.astype("<U2")
+    matrix[0, 0] = 'uu'
+    with raises(ValueError):
+        mapfile.matrix_to_codes(matrix)
+
+
+def test_save_load(tmp_path):
+    map_file = str(tmp_path / "the_gate.map")
+    matrix = np.load(os.path.join(maps_dir, "the_gate.npy"))
+    codes = mapfile.matrix_to_codes(matrix)
+    distances = np.arange(codes.size, dtype=np.float32).reshape(codes.shape)
+    mapfile.save_map(map_file, codes, layers={"distances": distances})
+    assert mapfile.is_map_file(map_file)
+    loaded = mapfile.load_map(map_file)
+    assert loaded.shape == codes.shape
+    assert isinstance(loaded.cells, np.memmap)
+    assert (loaded.cells == codes).all()
+    assert (loaded.layers["distances"] == distances).all()
+    for layer in loaded.layers.values():
+        assert layer.offset % 64 == 0
+
+    with raises(ValueError):
+        mapfile.save_map(map_file, codes.astype(int))
+    with raises(ValueError):
+        mapfile.load_map(os.path.join(maps_dir, "the_gate.npy"))
+
+
+def test_grid_from_map_codes(tmp_path):
+    npy_file = os.path.join(maps_dir, "the_gate.npy")
+    map_file = str(tmp_path / "the_gate.map")
+    mapfile.convert_npy(npy_file, map_file)
+    grid = Grid.from_map_codes(mapfile.load_map(map_file).cells)
+    gold = Grid.from_map_matrix(np.load(npy_file))
+    assert str(grid) == str(gold)
+    assert grid._start_positions.keys() == gold._start_positions.keys()
+
+    back_file = str(tmp_path / "the_gate.npy")
+    mapfile.convert_npy(map_file, back_file)
+    assert (np.load(back_file) == np.load(npy_file)).all()
+
+
+def test_grid_to_codes():
+    g = Grid((2, 3))
+    g.add_token(Token(name="wall", icon='#'), pos=(0, 1))
+    g.add_token(Token(name="start_pos", icon='1'), pos=(1, 2))
+    codes = mapfile.grid_to_codes(g)
+    assert codes.tolist() == [[0, mapfile.WALL, 0],
+                              [0, 0, mapfile.START + 1]]
@@ -0,0 +1,94 @@
+import os
+import json
+import numpy as np
+
+from .context import combat_simulator
+from combat_simulator import melee  # noqa
+
+Character = combat_simulator.token.Character
+Team = combat_simulator.encounter.Team
+Grid = combat_simulator.grid.Grid
+Engine = combat_simulator.engine.Engine
+
+curdir = os.path.dirname(__file__)
+
+
+def _char_data(**kwargs):
+    test_data_dir = os.path.join(curdir, "test_data")
+    char_fpath = os.path.join(test_data_dir, "test_character_good.json")
+    return dict(json.load(open(char_fpath)), **kwargs)
+
+
+def test_roll_swings():
+    attack = Character(**_char_data()).get_attack()
+    np.random.seed(0)
+    (hits, dmg) = melee.roll_swings([(attack, 10), (attack, 30),
+                                     (None, 0)], 1000)
+    assert hits.shape == dmg.shape == (1000, 3)
+    assert ((dmg > 0) == hits).all()
+    # Punch is 1d4 + 1 at +1 to hit.
+    assert dmg[hits].min() == 2 and dmg[hits].max() == 9
+    assert abs(hits[:, 0].mean() - 0.6) < 0.05
+    # Only natural 20s hit.
+    assert abs(hits[:, 1].mean() - 0.05) < 0.02
+    assert dmg[hits[:, 1], 1].mean() > dmg[hits[:, 0], 0].mean()
+    assert not hits[:, 2].any()
+
+
+def test_first_drop():
+    dmg = np.array([[1, 2, 3],
+                    [1, 2, 3]])
+    victims = np.array([0, 1, 0])
+    hp = np.array([5, 3])
+    # Victim 0 drops at the fourth attack, victim 1 at the fifth.
+    assert melee.first_drop(victims, dmg, hp) == 3
+    hp = np.array([9, 3])
+    assert melee.first_drop(victims, dmg, hp) == 4
+    hp = np.array([9, 9])
+    assert melee.first_drop(victims, dmg, hp) == dmg.size
+
+
+def _duel(fast_forward, num_encounters):
+    team1 = Team([Character(**_char_data(hp=60))], name="one")
+    team2 = Team([Character(**_char_data(hp=50, ac=12, num_attacks=2))],
+                 name="two")
+    return Engine(team1, team2, grid=Grid((5, 5)), log_level="summary",
+                  fast_forward=fast_forward)
+
+
+def test_fast_forward_agrees():
+    num_encounters = 400
+    np.random.seed(0)
+    expected = _duel(False, num_encounters).run(num_encounters,
+                                                progress=False)
+    np.random.seed(1)
+    observed = _duel(True, num_encounters).run(num_encounters,
+                                               progress=False)
+    win_rate = (expected.wins["one"] + observed.wins["one"]) / \
+        (2 * num_encounters)
+    stderr = np.sqrt(2 * win_rate * (1 - win_rate) / num_encounters)
+    assert abs(expected.wins["one"] - observed.wins["one"]) / \
+        num_encounters < 4 * stderr
+    assert abs(expected.rounds - observed.rounds) < 0.1 * expected.rounds
+    for key in expected.attackers:
+        (e, o) = (expected.attackers[key], observed.attackers[key])
+        assert abs(e["hits"] / e["attacks"] - o["hits"] / o["attacks"]) < 0.02
+
+
+def test_fast_forward_log():
+    engine = _duel(True, 1)
+    engine.log_level = "full"
+    np.random.seed(0)
+    enc = engine.initialize_encounter()
+    for rounds in enc.run_combat():
+        pass
+    log = enc.log
+    assert len(log) == sum(enc._attacks)
+    for c in enc.combatants:
+        assert log[log["victim_id"] == c.eid]["dmg"].sum() == \
+            c._hp_max - c.HP
+        assert enc.registry.hp[c.eid] == c.HP
+    loser = [c for c in enc.combatants if not c.is_alive][0]
+    # Nobody attacks after the last attack drops the loser.
+    assert log.iloc[-1]["victim_id"] == loser.eid
+    assert log.iloc[-1]["hit"]
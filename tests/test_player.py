@@ -1,5 +1,6 @@
 import os
 import json
+import numpy as np
 from .context import combat_simulator
 
 
@@ -48,6 +49,31 @@ def test_roll_damage():
     assert roll[0] > 0
 
 
+def test_batched_rolls():
+    player = Player(name="Test")
+    test_data_dir = os.path.join(curdir, "test_data")
+    good_char_fpath = os.path.join(test_data_dir, "test_character_good.json")
+    good_char_data = json.load(open(good_char_fpath))
+    good_char = Character(**dict(good_char_data, num_attacks=3))
+    (rolls, bonus) = player.roll_attacks(good_char)
+    assert rolls.shape == (3,)
+    assert ((rolls >= 1) & (rolls <= 20)).all()
+    assert bonus == good_char.get_attack().atk_bonus
+    (rolls, bonus) = player.roll_damages(good_char, crits=[False, True])
+    assert rolls.shape == (2,)
+    assert (rolls > 0).all()
+    # A single attack is the same roll as roll_attack and roll_damage.
+    for crit in [False, True]:
+        np.random.seed(0)
+        single = (player.roll_attack(good_char),
+                  player.roll_damage(good_char, crit=crit))
+        np.random.seed(0)
+        (rolls, bonus) = player.roll_attacks(good_char, num_attacks=1)
+        (dmg_rolls, dmg_bonus) = player.roll_damages(good_char,
+                                                     crits=[crit])
+        assert single == ((rolls[0], bonus), (dmg_rolls[0], dmg_bonus))
+
+
 def test_saving_throw():
     player = Player(name="Test")
     test_data_dir = os.path.join(curdir, "test_data")
@@ -110,3 +136,21 @@ def test_move_character():
     # Return None if the character doesn't move.
     new_pos = player.move_character(good_char, grid, pos=grid[good_char])
     assert new_pos is None
+
+
+def test_find_best_position_unreachable():
+    player = Player(name="Test")
+    test_data_dir = os.path.join(curdir, "test_data")
+    good_char_fpath = os.path.join(test_data_dir, "test_character_good.json")
+    good_char_data = json.load(open(good_char_fpath))
+    good_char = Character(**good_char_data)
+    good_char2 = Character(**good_char_data)
+
+    mat = np.full((6, 6), '.')
+    mat[:, 3] = '#'
+    grid = Grid.from_map_matrix(mat)
+    grid.add_token(good_char, pos=(0, 0))
+    grid.add_token(good_char2, pos=(0, 5))
+    good_char.goal = good_char2
+    # Walled off, so hold position.
+    assert player._find_best_position(good_char, grid) == (0, 0)
@@ -0,0 +1,51 @@
+import os
+import json
+import numpy as np
+
+from .context import combat_simulator
+
+Character = combat_simulator.token.Character
+Team = combat_simulator.encounter.Team
+Grid = combat_simulator.grid.Grid
+EntityRegistry = combat_simulator.registry.EntityRegistry
+
+curdir = os.path.dirname(__file__)
+
+
+def make_teams():
+    test_data_dir = os.path.join(curdir, "test_data")
+    good_char_fpath = os.path.join(test_data_dir, "test_character_good.json")
+    good_char_data = json.load(open(good_char_fpath))
+    team1 = Team([Character(**good_char_data) for _ in range(2)], name="team1")
+    team2 = Team([Character(**good_char_data) for _ in range(3)], name="team2")
+    return (team1, team2)
+
+
+def test_ids():
+    (team1, team2) = make_teams()
+    registry = EntityRegistry([team1, team2])
+    assert len(registry) == 5
+    for (eid, c) in enumerate(team1.members() + team2.members()):
+        assert c.eid == eid
+        assert registry[eid] is c
+    assert registry.team.tolist() == [0, 0, 1, 1, 1]
+    assert registry.get_team(team2.members()[0]) is team2
+    assert registry.ids(team1.members()[0].name) == [0, 1, 2, 3, 4]
+
+
+def test_closest_enemies():
+    (team1, team2) = make_teams()
+    registry = EntityRegistry([team1, team2])
+    grid = Grid((5, 5))
+    positions = [(0, 0), (4, 4), (0, 3), (4, 1), (3, 4)]
+    for (c, pos) in zip(registry.entities, positions):
+        grid.add_token(c, pos=pos)
+    registry.sync(grid)
+    assert registry.pos.tolist() == [list(p) for p in positions]
+    active = np.ones(5, dtype=bool)
+    assert registry.closest_enemies(active).tolist() == [2, 4, 0, 1, 1]
+    # Dead and inactive characters are not targeted.
+    team2.members()[2].HP = 0
+    active[3] = False
+    registry.sync(grid)
+    assert registry.closest_enemies(active).tolist() == [2, 2, 0, 1, 1]
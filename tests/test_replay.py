@@ -0,0 +1,72 @@
+import os
+import json
+from pytest import raises
+
+from .context import combat_simulator
+from combat_simulator import replay
+
+
+Character = combat_simulator.token.Character
+Token = combat_simulator.token.Token
+Team = combat_simulator.encounter.Team
+Grid = combat_simulator.grid.Grid
+Engine = combat_simulator.engine.Engine
+
+curdir = os.path.dirname(__file__)
+
+
+def _make_engine():
+    test_data_dir = os.path.join(curdir, "test_data")
+    char_fpath = os.path.join(test_data_dir, "test_character_good.json")
+    char_data = json.load(open(char_fpath))
+    team1 = Team([Character(**char_data) for _ in range(2)], name="one")
+    team2 = Team([Character(**char_data) for _ in range(2)], name="two")
+    grid = Grid((5, 5))
+    grid.add_token(Token(name="wall", icon='#'), pos=(2, 2))
+    return Engine(team1, team2, grid=grid)
+
+
+def test_record_and_read(tmp_path):
+    replay_file = str(tmp_path / "replay.bin")
+    engine = _make_engine()
+    recorder = replay.ReplayRecorder(replay_file)
+    results = engine.run(num_encounters=3, progress=False, recorder=recorder)
+    recorder.close()
+
+    events = list(replay.read_events(replay_file))
+    assert events[0] == ("grid", (5, 5), {(2, 2): '#'})
+    assert [e[0] for e in events].count("start") == 3
+    assert [e[0] for e in events].count("end") == 3
+    attacks = [e for e in events if e[0] == "attack"]
+    total_attacks = sum(s["attacks"] for s in results.attackers.values())
+    assert len(attacks) == total_attacks
+    hits = sum(s["hits"] for s in results.attackers.values())
+    assert sum(e[3] for e in attacks) == hits
+    assert results.rounds == [e[0] for e in events].count("round")
+
+
+def test_player_frames(tmp_path):
+    replay_file = str(tmp_path / "replay.bin")
+    engine = _make_engine()
+    recorder = replay.ReplayRecorder(replay_file)
+    enc = engine.initialize_encounter()
+    rounds = list(enc.run_combat(recorder=recorder))
+    recorder.close()
+
+    player = replay.ReplayPlayer(replay_file)
+    frames = list(player.frames(0))
+    assert player.shape == (5, 5)
+    assert [f[0] for f in frames] == [0] + rounds
+    # The last frame matches the grid at the end of the encounter.
+    assert frames[-1][1] == engine.grid.frame()
+
+    with raises(ValueError):
+        list(player.frames(1))
+
+
+def test_bad_file(tmp_path):
+    bad_file = str(tmp_path / "bad.bin")
+    with open(bad_file, "wb") as outF:
+        outF.write(b"not a replay")
+    with raises(ValueError):
+        list(replay.read_events(bad_file))
@@ -0,0 +1,64 @@
+import os
+import json
+
+from .context import combat_simulator
+
+Character = combat_simulator.token.Character
+Team = combat_simulator.encounter.Team
+Grid = combat_simulator.grid.Grid
+Engine = combat_simulator.engine.Engine
+Results = combat_simulator.results.Results
+
+curdir = os.path.dirname(__file__)
+
+
+def _make_engine():
+    test_data_dir = os.path.join(curdir, "test_data")
+    char_fpath = os.path.join(test_data_dir, "test_character_good.json")
+    char_data = json.load(open(char_fpath))
+    team1 = Team([Character(**char_data) for _ in range(2)], name="one")
+    team2 = Team([Character(**char_data) for _ in range(2)], name="two")
+    return Engine(team1, team2, grid=Grid((5, 5)))
+
+
+def test_add_encounter():
+    engine = _make_engine()
+    results = engine.run(num_encounters=5, progress=False)
+    assert results.num_encounters == 5
+    assert sum(results.wins.values()) == 5
+    assert results.rounds >= 5
+    assert len(results.attackers) == 4
+    for stats in results.attackers.values():
+        assert stats["hits"] <= stats["attacks"]
+        assert stats["team"] in ["one", "two"]
+
+
+def test_merge():
+    engine = _make_engine()
+    results1 = engine.run(num_encounters=3, progress=False)
+    results2 = engine.run(num_encounters=4, progress=False)
+    attacks = {k: s["attacks"] + results2.attackers[k]["attacks"]
+               for (k, s) in results1.attackers.items()}
+    results1.merge(results2)
+    assert results1.num_encounters == 7
+    assert sum(results1.wins.values()) == 7
+    for (k, s) in results1.attackers.items():
+        assert s["attacks"] == attacks[k]
+
+
+def test_dict_roundtrip():
+    engine = _make_engine()
+    results = engine.run(num_encounters=3, progress=False)
+    data = json.loads(json.dumps(results.to_dict()))
+    loaded = Results.from_dict(data)
+    assert str(loaded) == str(results)
+    assert loaded.attackers == results.attackers
+
+
+def test_to_frame():
+    engine = _make_engine()
+    results = engine.run(num_encounters=3, progress=False)
+    df = results.to_frame()
+    assert df.shape[0] == 4
+    assert (df["num_encounters"] == 3).all()
+    assert set(df["team"]) == {"one", "two"}
@@ -0,0 +1,46 @@
+import os
+import json
+from pytest import raises
+
+from .context import combat_simulator  # noqa
+from combat_simulator import scenario
+
+Grid = combat_simulator.grid.Grid
+
+curdir = os.path.dirname(__file__)
+assets_dir = os.path.join(curdir, "../assets")
+
+
+def test_load_catalogs():
+    chars = scenario.load_character_sheets(
+        os.path.join(assets_dir, "character_sheets"))
+    assert "jake" in chars
+    assert "template" not in chars
+    monsters = scenario.load_monsters(
+        os.path.join(assets_dir, "5e_SRD_monsters_formatted.jsonl"))
+    assert "zombie" in monsters
+
+
+def test_build_teams():
+    chars = scenario.load_character_sheets(
+        os.path.join(assets_dir, "character_sheets"))
+    monsters = scenario.load_monsters(
+        os.path.join(assets_dir, "5e_SRD_monsters_formatted.jsonl"))
+    scenario_file = os.path.join(curdir, "../scenarios/zombie_apocalypse.json")
+    scenario_data = json.load(open(scenario_file))
+    teams = scenario.build_teams(scenario_data, chars, monsters)
+    assert len(teams) == 2
+    assert len(teams[0]) == 2
+    assert len(teams[1]) == 10
+
+    scenario_data["team1"]["members"] = [["npc.Jake", 1]]
+    with raises(ValueError):
+        scenario.build_teams(scenario_data, chars, monsters)
+
+
+def test_load_grid():
+    grid = scenario.load_grid(None, [4, 6])
+    assert grid.shape == (4, 6)
+    map_file = os.path.join(curdir, "../maps/the_gate.npy")
+    grid = scenario.load_grid(map_file)
+    assert isinstance(grid, Grid)
@@ -0,0 +1,53 @@
+from .context import combat_simulator
+from combat_simulator import scheduler  # noqa
+
+
+Token = combat_simulator.token.Token
+
+
+def test_initiative_order():
+    (a, b, c) = [Token(name=n) for n in "abc"]
+    s = scheduler.TurnScheduler([(b, 15), (a, 15), (c, 3)])
+    assert list(s.turns()) == [b, a, c]
+    assert list(s.turns()) == [b, a, c]
+    assert len(s) == 3
+
+
+def test_remove():
+    (a, b, c) = [Token(name=n) for n in "abc"]
+    s = scheduler.TurnScheduler([(a, 20), (b, 10), (c, 5)])
+    turns = []
+    for t in s.turns():
+        turns.append(t)
+        if t is a:
+            s.remove(b)
+    assert turns == [a, c]
+    assert list(s.turns()) == [a, c]
+    assert len(s) == 2
+    assert b not in s
+
+
+def test_delay():
+    (a, b, c) = [Token(name=n) for n in "abc"]
+    s = scheduler.TurnScheduler([(a, 20), (b, 10), (c, 5)])
+    turns = []
+    for t in s.turns():
+        turns.append(t)
+        if t is b:
+            s.delay(a, 5)
+    # a's turn this round has already started, so it moves from the next.
+    assert turns == [a, b, c]
+    s.delay(b, 1)
+    assert list(s.turns()) == [c, a, b]
+
+
+def test_this_round():
+    (a, b, c) = [Token(name=n) for n in "abc"]
+    s = scheduler.TurnScheduler([(a, 20), (b, 10), (c, 5)])
+    s.remove(b)
+    assert s.this_round() == [a, c]
+    turns = s.turns()
+    assert next(turns) is a
+    assert s.this_round() == [c]
+    list(turns)
+    assert s.this_round() == [a, c]
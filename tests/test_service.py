@@ -0,0 +1,98 @@
+import os
+import json
+import asyncio
+from pytest import raises
+
+from .context import combat_simulator  # noqa
+from combat_simulator import service
+
+curdir = os.path.dirname(__file__)
+assets_dir = os.path.join(curdir, "../assets")
+scenario_file = os.path.join(curdir, "../scenarios/zombie_apocalypse.json")
+
+
+def _service(chunk_size):
+    return service.SimulationService(
+        os.path.join(assets_dir, "character_sheets"),
+        os.path.join(assets_dir, "5e_SRD_monsters_formatted.jsonl"),
+        processes=1, chunk_size=chunk_size)
+
+
+async def _collect(request, path):
+    return [event async for event in service.submit(request, path=path)]
+
+
+def test_parse_job():
+    job = service.parse_job({"scenario_file": scenario_file})
+    assert job["scenario"] == json.load(open(scenario_file))
+    assert job["num_encounters"] == 1000
+    assert job["pathfinder"] == "astar"
+    with raises(ValueError):
+        service.parse_job({})
+    with raises(ValueError):
+        service.parse_job({"scenario_file": scenario_file,
+                           "pathfinder": "dijkstra"})
+
+
+def test_run_chunk():
+    service.init_worker(os.path.join(assets_dir, "character_sheets"),
+                        os.path.join(assets_dir,
+                                     "5e_SRD_monsters_formatted.jsonl"))
+    job = service.parse_job({"scenario_file": scenario_file, "seed": 0,
+                             "grid_shape": [8, 8]})
+    (whole, _) = service.run_chunk(job, 6)
+    # Chunks carry the Engine state over, so their size doesn't matter.
+    merged = combat_simulator.Results()
+    state = None
+    for num in [2, 3, 1]:
+        (chunk, state) = service.run_chunk(job, num, state)
+        merged.merge(combat_simulator.Results.from_dict(chunk))
+    whole = combat_simulator.Results.from_dict(whole)
+    assert str(merged) == str(whole)
+    assert merged.attackers == whole.attackers
+
+
+def test_run_and_cancel(tmp_path):
+    path = str(tmp_path / "service.sock")
+    scenario = json.load(open(scenario_file))
+
+    async def main():
+        server = _service(chunk_size=2)
+        task = asyncio.ensure_future(server.serve(path=path))
+        while not os.path.exists(path):
+            await asyncio.sleep(0.05)
+
+        pong = await _collect({"op": "ping"}, path)
+        assert pong[0]["monsters"] > 0
+
+        events = await _collect({"op": "run", "scenario": scenario,
+                                 "num_encounters": 5, "grid_shape": [8, 8],
+                                 "seed": 0}, path)
+        assert [e["event"] for e in events] == \
+            ["accepted"] + ["progress"] * 3 + ["result"]
+        assert [e["done"] for e in events[1:-1]] == [2, 4, 5]
+        results = combat_simulator.Results.from_dict(events[-1]["results"])
+        assert results.num_encounters == 5
+
+        bad = await _collect({"op": "run", "scenario": {"team1": {}}}, path)
+        assert bad[-1]["event"] == "error"
+
+        cancelled = []
+        async for event in service.submit(
+                {"op": "run", "scenario": scenario,
+                 "num_encounters": 1000, "grid_shape": [8, 8]}, path=path):
+            cancelled.append(event)
+            if event["event"] == "progress":
+                reply = await _collect({"op": "cancel",
+                                        "job_id": event["job_id"]}, path)
+                assert reply[0]["event"] == "cancel_requested"
+        assert cancelled[-1]["event"] == "cancelled"
+        assert cancelled[-1]["done"] < 1000
+
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+import os
+import json
+import numpy as np
+import pytest
+
+from .context import combat_simulator
+
+Character = combat_simulator.token.Character
+Team = combat_simulator.encounter.Team
+Grid = combat_simulator.grid.Grid
+Engine = combat_simulator.engine.Engine
+Results = combat_simulator.results.Results
+stats = combat_simulator.stats
+
+curdir = os.path.dirname(__file__)
+
+
+def _make_engine():
+    test_data_dir = os.path.join(curdir, "test_data")
+    char_fpath = os.path.join(test_data_dir, "test_character_good.json")
+    char_data = json.load(open(char_fpath))
+    team1 = Team([Character(**char_data) for _ in range(2)], name="one")
+    team2 = Team([Character(**char_data) for _ in range(2)], name="two")
+    return Engine(team1, team2, grid=Grid((5, 5)), log_level="summary")
+
+
+def _run(engine, num_encounters):
+    results = Results(team_names=[t.name for t in engine.teams],
+                      keep_encounters=True)
+    return engine.run(num_encounters=num_encounters, results=results,
+                      progress=False)
+
+
+def test_wilson_interval():
+    (low, high) = stats.wilson_interval(np.array([0, 5, 10]),
+                                        np.array([10, 10, 10]))
+    assert np.allclose(low, [0.0, 0.2366, 0.7225], atol=1e-4)
+    assert np.allclose(high, [0.2775, 0.7634, 1.0], atol=1e-4)
+    (low, high) = stats.wilson_interval(0, 0)
+    assert np.isnan(low) and np.isnan(high)
+    (low, high) = stats.wilson_interval(50, 100, z=1.96)
+    assert low < 0.5 < high
+    assert np.isclose(0.5 - low, high - 0.5)
+    (low, high) = stats.wilson_interval(0, 10, z=1.96)
+    assert low == 0.0 and high < 0.5
+
+
+def test_ratio_interval():
+    num = np.array([[1.0], [2.0], [3.0], [6.0]])
+    den = np.array([[1.0], [1.0], [1.0], [2.0]])
+    (ratio, low, high) = stats.ratio_interval(num, den)
+    assert np.allclose(ratio, 12 / 5)
+    assert low[0] < ratio[0] < high[0]
+    # Constant ratios have no spread.
+    (ratio, low, high) = stats.ratio_interval(2 * den, den)
+    assert np.allclose([ratio, low, high], 2.0)
+
+
+def test_keep_encounters():
+    engine = _make_engine()
+    np.random.seed(0)
+    results1 = _run(engine, 3)
+    results2 = _run(engine, 4)
+    table = results1.encounters
+    assert len(table) == 3
+    assert set(table.winners) <= {0, 1}
+    assert table.rounds.sum() == results1.rounds
+    attacks = np.bincount(table.entries[:, 0], weights=table.entries[:, 2])
+    assert len(attacks) == 3 and (attacks > 0).all()
+    data = json.loads(json.dumps(results1.to_dict()))
+    restored = Results.from_dict(data).encounters
+    assert restored.keys == table.keys
+    assert (restored.entries == table.entries).all()
+    assert (restored.winners == table.winners).all()
+    results1.merge(results2)
+    assert len(results1.encounters) == 7
+    assert results1.encounters.rounds.sum() == results1.rounds
+    (_, attacks, hits, dmg, wins) = stats.encounter_arrays(results1)
+    assert wins.sum() == 7
+    for (i, key) in enumerate(sorted(results1.attackers)):
+        assert attacks[:, i].sum() == results1.attackers[key]["attacks"]
+        assert dmg[:, i].sum() == results1.attackers[key]["dmg"]
+    # Encounters are only kept if both sides kept them.
+    results1.merge(engine.run(num_encounters=2, progress=False))
+    assert results1.encounters is None
+
+
+def test_confidence_intervals():
+    engine = _make_engine()
+    np.random.seed(0)
+    results = _run(engine, 200)
+    (attackers, teams) = stats.confidence_intervals(results)
+    assert len(attackers) == len(results.attackers)
+    assert list(teams["team"]) == ["one", "two"]
+    assert teams["wins"].sum() == 200
+    for row in attackers.itertuples():
+        counts = results.attackers[(row.attacker_name, row.attacker_id)]
+        assert np.isclose(row.hit_ratio, counts["hits"] / counts["attacks"])
+        assert row.dpr_low < row.dpr < row.dpr_high
+        assert row.hit_ratio_low < row.hit_ratio < row.hit_ratio_high
+    (boot_attackers, boot_teams) = stats.confidence_intervals(
+        results, method="bootstrap", seed=0)
+    assert np.allclose(boot_attackers["dpr"], attackers["dpr"])
+    # Both methods estimate the same spread.
+    for col in ["dpr", "hit_ratio"]:
+        width = attackers[f"{col}_high"] - attackers[f"{col}_low"]
+        boot_width = boot_attackers[f"{col}_high"] - \
+            boot_attackers[f"{col}_low"]
+        assert np.allclose(boot_width, width, rtol=0.3)
+    assert np.allclose(boot_teams["win_rate_low"], teams["win_rate_low"],
+                       atol=0.03)
+    assert "Win rates (95% confidence)" in \
+        stats.format_intervals(attackers, teams)
+
+
+def test_requires_encounters():
+    engine = _make_engine()
+    results = engine.run(num_encounters=2, progress=False)
+    with pytest.raises(ValueError):
+        stats.confidence_intervals(results)
@@ -0,0 +1,48 @@
+import os
+import json
+from pytest import raises
+
+from .context import combat_simulator  # noqa
+from combat_simulator import sweep
+
+curdir = os.path.dirname(__file__)
+assets_dir = os.path.join(curdir, "../assets")
+
+
+def _scenario():
+    scenario_file = os.path.join(curdir, "../scenarios/zombie_apocalypse.json")
+    return json.load(open(scenario_file))
+
+
+def test_expand_sweep():
+    axes = {"team2:monster.Zombie": [1, 2, 3],
+            "team1:monster.Bugbear": [1],
+            "grid_shape": [[5, 5], [6, 6]]}
+    jobs = sweep.expand_sweep(_scenario(), axes)
+    assert len(jobs) == 6
+    assert [j["job_id"] for j in jobs] == list(range(6))
+    job = jobs[-1]
+    assert job["scenario"]["team2"]["members"] == [["monster.Zombie", 3]]
+    assert job["scenario"]["team1"]["members"] == [["character.Jake", 2],
+                                                   ["monster.Bugbear", 1]]
+    assert job["grid_shape"] == [6, 6]
+    # The template is not modified.
+    assert _scenario()["team2"]["members"] == [["monster.Zombie", 10]]
+
+    with raises(ValueError):
+        sweep.expand_sweep(_scenario(), {"speed": [1]})
+
+
+def test_run_sweep():
+    axes = {"team2:monster.Zombie": [1, 2],
+            "grid_shape": [[5, 5]]}
+    jobs = sweep.expand_sweep(_scenario(), axes)
+    df = sweep.run_sweep(jobs, os.path.join(assets_dir, "character_sheets"),
+                         os.path.join(assets_dir,
+                                      "5e_SRD_monsters_formatted.jsonl"),
+                         num_encounters=3, processes=2, seed=0)
+    # 2 Jakes + 1 zombie, then 2 Jakes + 2 zombies.
+    assert df.shape[0] <= 7
+    assert set(df["job_id"]) == {0, 1}
+    assert (df["num_encounters"] == 3).all()
+    assert "team2:monster.Zombie" in df.columns
@@ -0,0 +1,47 @@
+import os
+import numpy as np
+from pytest import raises
+
+from .context import combat_simulator  # noqa
+from combat_simulator import tournament
+from combat_simulator.scenario import load_monsters
+
+curdir = os.path.dirname(__file__)
+monsters_file = os.path.join(curdir,
+                             "../assets/5e_SRD_monsters_formatted.jsonl")
+
+
+def test_select_monsters():
+    monsters = load_monsters(monsters_file)
+    names = tournament.select_monsters(monsters, pattern="^adult .* dragon$")
+    assert "adult gold dragon" in names
+    assert all(n.startswith("adult") for n in names)
+    names = tournament.select_monsters(monsters, names=["Zombie", "Bugbear"])
+    assert names == ["bugbear", "zombie"]
+    with raises(ValueError):
+        tournament.select_monsters(monsters, names=["Not A Monster"])
+    # Monsters without attacks are never selected.
+    names = tournament.select_monsters(monsters)
+    assert all(monsters[n]["attacks"] != [] for n in names)
+
+
+def test_run_tournament(tmp_path):
+    monsters = load_monsters(monsters_file)
+    names = ["bugbear", "goblin", "zombie"]
+    data = [monsters[n] for n in names]
+    wins = tournament.run_tournament(data, num_encounters=4,
+                                     grid_shape=(5, 5), processes=2,
+                                     chunk_size=1, seed=0)
+    assert wins.shape == (3, 3)
+    assert (np.diag(wins) == 0).all()
+    # Every matchup has exactly one winner per encounter.
+    assert ((wins + wins.T)[~np.eye(3, dtype=bool)] == 4).all()
+
+    npz_file = str(tmp_path / "wins.npz")
+    tournament.save_tournament(npz_file, names, wins, 4)
+    saved = np.load(npz_file)
+    assert list(saved["names"]) == names
+    assert (saved["wins"] == wins).all()
+    csv_file = str(tmp_path / "wins.csv")
+    tournament.save_tournament(csv_file, names, wins, 4)
+    assert os.path.exists(csv_file)